@@ -0,0 +1,256 @@
+"""
+HTTP服务 - 基于asyncio的RAG问答接口
+    POST /ask          JSON问答
+    POST /ask/stream   SSE流式问答
+    GET  /health       健康检查
+    GET  /metrics      Prometheus指标
+启动方式: python main.py serve
+"""
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from aiohttp import web
+from config import Config
+from rag_chain import RAGChain
+from resource_registry import get_vector_store_manager
+from llm_factory import get_connection_stats
+from metrics import CONTENT_TYPE, REGISTRY
+
+
+class Session:
+    """单个会话：RAG链（对话历史）+ 会话内请求串行锁"""
+
+    def __init__(self, rag_chain: RAGChain):
+        self.rag_chain = rag_chain
+        self.lock = asyncio.Lock()
+        self.last_access = time.time()
+
+
+class SessionStore:
+    """按会话ID保存RAG链，超过上限或过期时淘汰最久未使用的会话"""
+
+    def __init__(self, vector_store_manager, max_sessions: int = None, ttl: float = None):
+        self.vector_store_manager = vector_store_manager
+        self.max_sessions = max_sessions or Config.API_MAX_SESSIONS
+        self.ttl = ttl or Config.API_SESSION_TTL
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    # 获取或创建会话 Args:session_id: 会话ID，为空时新建 Returns:(会话ID, 会话)
+    def get(self, session_id: Optional[str]):
+        self._evict_expired()
+
+        if session_id and session_id in self.sessions:
+            session = self.sessions[session_id]
+            self.sessions.move_to_end(session_id)
+        else:
+            session_id = session_id or uuid.uuid4().hex
+            session = Session(RAGChain(self.vector_store_manager))
+            self.sessions[session_id] = session
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+        session.last_access = time.time()
+        return session_id, session
+
+    def _evict_expired(self):
+        now = time.time()
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            if now - oldest.last_access <= self.ttl:
+                break
+            self.sessions.popitem(last=False)
+
+
+# 文档转为可序列化的字典
+def serialize_docs(docs) -> list:
+    return [{"content": doc.page_content, "metadata": doc.metadata} for doc in docs]
+
+
+# SSE事件格式
+def format_sse(event: str, data: Dict[str, Any]) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n".encode("utf-8")
+
+
+# 解析请求体 Returns:(问题, 会话ID, 是否使用历史)
+async def parse_request(request: web.Request):
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text="请求体必须是JSON")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="请求体必须是JSON对象")
+
+    question = body.get("question")
+    question = question.strip() if isinstance(question, str) else ""
+    if not question:
+        raise web.HTTPBadRequest(text="缺少question字段")
+
+    session_id = body.get("session_id")
+    if session_id is not None and not isinstance(session_id, str):
+        raise web.HTTPBadRequest(text="session_id必须是字符串")
+    # "false"等字符串为真值，只接受JSON布尔值
+    use_history = body.get("use_history", True)
+    if not isinstance(use_history, bool):
+        raise web.HTTPBadRequest(text="use_history必须是布尔值")
+
+    return question, session_id, use_history
+
+
+# 在会话锁和全局信号量内把任务提交到线程池 Returns:线程池任务的Future
+# 锁和信号量在任务结束时才释放：超时或客户端断开只放弃等待结果，不会让同一会话的下一个请求与仍在运行的任务并发
+async def submit_locked(app: web.Application, session: Session, func, *args) -> asyncio.Future:
+    await session.lock.acquire()
+    try:
+        await app["semaphore"].acquire()
+    except BaseException:
+        session.lock.release()
+        raise
+
+    def release(_):
+        app["semaphore"].release()
+        session.lock.release()
+
+    try:
+        future = asyncio.get_running_loop().run_in_executor(app["executor"], func, *args)
+    except BaseException:
+        release(None)
+        raise
+    future.add_done_callback(release)
+    return future
+
+
+async def handle_ask(request: web.Request) -> web.Response:
+    app = request.app
+    question, session_id, use_history = await parse_request(request)
+    session_id, session = app["sessions"].get(session_id)
+
+    try:
+        # 超时只作用于本次响应；shield防止取消等待时连带取消任务Future而提前释放锁
+        async with asyncio.timeout(Config.API_REQUEST_TIMEOUT):
+            future = await submit_locked(app, session, session.rag_chain.invoke, question, use_history)
+            response = await asyncio.shield(future)
+    except TimeoutError:
+        raise web.HTTPGatewayTimeout(text="请求超时")
+
+    return web.json_response({
+        "session_id": session_id,
+        "answer": response["answer"],
+        "sources": serialize_docs(response.get("context", [])),
+        "off_domain": response.get("off_domain", False)
+    }, dumps=lambda data: json.dumps(data, ensure_ascii=False, default=str))
+
+
+async def handle_ask_stream(request: web.Request) -> web.StreamResponse:
+    app = request.app
+    question, session_id, use_history = await parse_request(request)
+    session_id, session = app["sessions"].get(session_id)
+    loop = asyncio.get_running_loop()
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    await response.prepare(request)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    cancelled = False
+
+    # 在线程池中运行同步生成器，把片段转发到事件循环
+    def produce():
+        try:
+            for content in session.rag_chain.stream_answer(question, use_history):
+                if cancelled:
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, ("token", content))
+            loop.call_soon_threadsafe(queue.put_nowait, ("done", session.rag_chain.last_timings))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("error", str(e)))
+
+    try:
+        async with asyncio.timeout(Config.API_REQUEST_TIMEOUT):
+            # 锁和信号量由生产线程结束时释放
+            await submit_locked(app, session, produce)
+            try:
+                while True:
+                    kind, payload = await queue.get()
+                    if kind == "token":
+                        await response.write(format_sse("token", {"content": payload}))
+                    elif kind == "done":
+                        await response.write(format_sse("done", {"session_id": session_id, "timings": payload}))
+                        break
+                    else:
+                        await response.write(format_sse("error", {"message": payload}))
+                        break
+            finally:
+                # 超时或客户端断开时通知生产线程在下一个片段处停止
+                cancelled = True
+    except TimeoutError:
+        await response.write(format_sse("error", {"message": "请求超时"}))
+    except ConnectionResetError:
+        return response
+
+    await response.write_eof()
+    return response
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    return web.json_response({
+        "status": "ok",
+        "sessions": len(request.app["sessions"].sessions),
+        "llm_connections": get_connection_stats()
+    })
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(body=REGISTRY.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def on_startup(app: web.Application):
+    vector_store_manager = get_vector_store_manager()
+    if vector_store_manager is None:
+        raise RuntimeError("未找到向量存储，请先运行: python init_kb.py")
+
+    app["sessions"] = SessionStore(vector_store_manager)
+    app["semaphore"] = asyncio.Semaphore(Config.API_MAX_CONCURRENCY)
+    app["executor"] = ThreadPoolExecutor(max_workers=Config.API_MAX_CONCURRENCY, thread_name_prefix="rag")
+
+
+async def on_cleanup(app: web.Application):
+    # 进行中的请求已在关闭超时内处理完，取消排队任务并释放工作线程
+    app["executor"].shutdown(wait=False, cancel_futures=True)
+    print("服务已关闭")
+
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.router.add_post("/ask", handle_ask)
+    app.router.add_post("/ask/stream", handle_ask_stream)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def main(host: str = None, port: int = None):
+    """启动HTTP服务，收到SIGINT/SIGTERM后停止接收新请求并等待进行中的请求完成"""
+    Config.validate()
+    host = host or Config.API_HOST
+    port = port or Config.API_PORT
+    print(f"🌐 RAG HTTP服务启动: http://{host}:{port}")
+    web.run_app(
+        create_app(),
+        host=host,
+        port=port,
+        shutdown_timeout=Config.API_SHUTDOWN_TIMEOUT,
+        print=None
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,13 @@ import os
 import json
 from typing import Optional
 from config import Config
+from metrics import start_metrics_server
+from warmup import start_warmup
+from warmup_widgets import display_warmup_status
 from document_processor import DocumentProcessor
 from vector_store_manager import VectorStoreManager
 from rag_chain import RAGChain
+from resource_registry import get_vector_store_manager, register_vector_store_manager
 
 
 # 页面配置
@@ -309,14 +313,11 @@ def setup_knowledge_base():
             # 验证配置
             Config.validate()
             
-            # 初始化向量存储管理器
-            vector_store_manager = VectorStoreManager()
-            
-            # 尝试加载已有的向量存储
-            vector_store = vector_store_manager.load_vector_store()
+            # 获取进程内共享的向量存储（模型和索引只加载一次，所有会话复用）
+            vector_store_manager = get_vector_store_manager()
             
             # 如果不存在，则创建新的
-            if vector_store is None:
+            if vector_store_manager is None:
                 st.info("未找到已有向量存储，正在创建新的向量数据库...")
                 
                 # 处理PDF文档
@@ -324,8 +325,10 @@ def setup_knowledge_base():
                 splits = doc_processor.process_pdf(Config.KNOWLEDGE_BASE_PATH)
                 
                 # 创建向量存储
+                vector_store_manager = VectorStoreManager()
                 vector_store_manager.create_vector_store(splits)
                 vector_store_manager.save_vector_store()
+                register_vector_store_manager(vector_store_manager)
                 
                 st.success("✅ 向量数据库创建成功！")
             else:
@@ -355,6 +358,11 @@ def display_chat_message(role: str, content: str):
 
 def main():
     """主函数"""
+    # 指标端点在进程内只启动一次（METRICS_PORT=0 时不启动）
+    start_metrics_server()
+    # 后台加载索引和Embedding模型并跑假查询，第一个问题不再承担冷启动开销
+    start_warmup()
+    
     initialize_system()
     
     # 标题区域
@@ -372,6 +380,8 @@ def main():
         # 系统状态
         status = "🟢 运行中" if st.session_state.initialized else "🔴 未初始化"
         st.markdown(f"**系统状态:** {status}")
+        st.markdown("**预热状态:**")
+        display_warmup_status()
         
         st.markdown("---")
         
@@ -5,6 +5,9 @@ import streamlit as st
 import sys
 import platform
 from config import Config
+from metrics import start_metrics_server
+from warmup import start_warmup
+from warmup_widgets import display_warmup_status
 
 # 页面配置
 st.set_page_config(
@@ -267,7 +270,15 @@ st.markdown("""
 
 def display_sidebar():
     """显示侧边栏配置信息"""
+    # 无论从哪个页面进入，进程内都只启动一次后台预热
+    start_warmup()
+    
     with st.sidebar:
+        st.markdown("### 🔥 服务状态")
+        display_warmup_status()
+        
+        st.markdown("---")
+        
         st.markdown("### ⚙️ 系统配置")
         
         # 系统信息
@@ -370,6 +381,9 @@ def display_sidebar():
 
 def main():
     """主页面"""
+    # 指标端点在进程内只启动一次（METRICS_PORT=0 时不启动）
+    start_metrics_server()
+    
     display_sidebar()
     
     # 欢迎区域 - Gemini风格
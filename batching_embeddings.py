@@ -0,0 +1,105 @@
+"""
+查询向量微批处理 - 并发请求的查询在几毫秒的窗口内合并为一次批量前向计算
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+from langchain_core.embeddings import Embeddings
+from config import Config
+
+
+class MicroBatchingEmbeddings(Embeddings):
+    """
+    包装任意Embeddings：embed_query进入队列，后台线程收集最多max_batch_size个请求
+    或等待max_wait_ms后，通过一次embed_documents批量编码，再把结果分发给各调用方。
+    要求底层模型的查询向量与文档向量计算方式相同（本地bge模型满足）。
+    文档向量化（建索引）本身就是批量的，直接透传。
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = None, max_wait_ms: float = None):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size or Config.EMBEDDING_BATCH_MAX_SIZE
+        # 单个请求因等待合批而增加的最大延迟
+        self.max_wait = (Config.EMBEDDING_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.batch_count = 0
+        self.query_count = 0
+
+        self._worker = threading.Thread(target=self._run, daemon=True, name="embedding-batcher")
+        self._worker.start()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    # 后台线程：收集一批查询并批量编码
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+                if len(vectors) != len(batch):
+                    # 数量不一致时zip会静默截断，未分到向量的调用方将永远等待
+                    raise RuntimeError(f"Embedding返回 {len(vectors)} 个向量，期望 {len(batch)} 个")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+            with self._stats_lock:
+                self.batch_count += 1
+                self.query_count += len(batch)
+
+    # 合批统计 Returns:批次数、查询数、平均批大小
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "batches": self.batch_count,
+                "queries": self.query_count,
+                "avg_batch_size": self.query_count / self.batch_count if self.batch_count else 0.0
+            }
+
+
+if __name__ == "__main__":
+    # 简单压测：对比并发查询时逐条编码与微批编码的吞吐量
+    from concurrent.futures import ThreadPoolExecutor
+    from resource_registry import get_embeddings
+
+    # 注册表开启合批时取出底层模型
+    base = get_embeddings()
+    base = getattr(base, "embeddings", base)
+    batched = MicroBatchingEmbeddings(base)
+    queries = [f"如何调节第{i}排座椅的加热档位？" for i in range(256)]
+    base.embed_query("预热")
+
+    for name, embedder in [("逐条编码", base), ("微批编码", batched)]:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            list(executor.map(embedder.embed_query, queries))
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {len(queries) / elapsed:.1f} 查询/秒")
+
+    print(f"微批统计: {batched.stats()}")
@@ -0,0 +1,235 @@
+"""
+知识库构建基准测试 - 分阶段测量 PDF加载、分割、向量化、建索引、保存 的耗时和吞吐
+结果追加写入 JSONL 文件，便于跨版本对比
+使用方式:
+    python benchmark_ingest.py                            # 使用 KNOWLEDGE_BASE_PATH
+    python benchmark_ingest.py --pdf ./other.pdf --chunk-size 512
+    python benchmark_ingest.py --synthetic-pages 500      # 使用合成语料（跳过PDF加载阶段）
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from langchain_core.documents import Document
+from config import Config
+from document_processor import DocumentProcessor
+from vector_store_manager import VectorStoreManager
+
+
+# 合成语料的词汇表（汽车手册风格）
+SYNTHETIC_SUBJECTS = ["驾驶员座椅", "中央显示屏", "空调系统", "智能钥匙", "电动尾门", "陡坡缓降系统",
+                      "自动驻车", "安全气囊", "外后视镜", "能量回收系统", "无钥匙进入", "车道保持辅助"]
+SYNTHETIC_ACTIONS = ["按下", "长按", "轻触", "旋转", "上拨", "下拨", "选择", "开启", "关闭"]
+SYNTHETIC_NOTES = ["请勿在行驶过程中操作。", "如出现故障，请联系授权服务中心。", "该功能仅在车辆静止时可用。",
+                   "使用前请确认周围环境安全。", "系统会在组合仪表上显示相应的提示信息。"]
+
+
+# 生成合成语料 Args:pages: 页数 chars_per_page: 每页大约字数 seed: 随机种子 Returns:按页组织的文档列表
+def generate_synthetic_corpus(pages: int, chars_per_page: int = 1200, seed: int = 42) -> List[Document]:
+    rng = random.Random(seed)
+    documents = []
+    for page in range(pages):
+        paragraphs = []
+        length = 0
+        while length < chars_per_page:
+            subject = rng.choice(SYNTHETIC_SUBJECTS)
+            sentence = (f"{rng.choice(SYNTHETIC_ACTIONS)}{subject}按钮，可以进入{subject}设置界面，"
+                        f"调节档位{rng.randint(1, 5)}。{rng.choice(SYNTHETIC_NOTES)}")
+            paragraphs.append(sentence)
+            length += len(sentence)
+            if rng.random() < 0.2:
+                paragraphs.append("\n\n")
+        documents.append(Document(page_content="".join(paragraphs),
+                                  metadata={"source": "synthetic", "page": page}))
+    return documents
+
+
+class PeakMemoryMonitor:
+    """后台采样进程RSS，记录峰值（优先使用psutil，Unix上退回resource模块）"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        try:
+            import psutil
+            self._process = psutil.Process()
+        except ImportError:
+            self._process = None
+
+    def _current_bytes(self) -> int:
+        if self._process is not None:
+            return self._process.memory_info().rss
+        try:
+            import resource
+            # Linux上ru_maxrss单位为KB，macOS为字节
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return maxrss if platform.system() == "Darwin" else maxrss * 1024
+        except ImportError:
+            return 0
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self._current_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, self._current_bytes())
+
+
+# 目录占用的磁盘空间（字节）
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+# 运行一次基准测试 Returns:结果字典
+def run_benchmark(pdf_path: str = None, synthetic_pages: int = 0, chunk_size: int = None,
+                  chunk_overlap: int = None, store_type: str = None) -> Dict:
+    store_type = store_type or Config.VECTOR_STORE_TYPE
+    persist_directory = tempfile.mkdtemp(prefix="bench_ingest_")
+    stages = {}
+
+    with PeakMemoryMonitor() as memory:
+        # 模型加载单独计时，不计入向量化吞吐
+        start = time.perf_counter()
+        vector_store_manager = VectorStoreManager(store_type=store_type, persist_directory=persist_directory)
+        stages["model_load"] = {"seconds": time.perf_counter() - start}
+
+        doc_processor = DocumentProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+        # 阶段1：加载
+        start = time.perf_counter()
+        if synthetic_pages:
+            pages = generate_synthetic_corpus(synthetic_pages)
+        else:
+            pages = doc_processor.load_pdf(pdf_path)
+        elapsed = time.perf_counter() - start
+        stages["load"] = {"seconds": elapsed, "pages": len(pages), "pages_per_sec": len(pages) / elapsed if elapsed else None}
+
+        # 阶段2：分割
+        start = time.perf_counter()
+        splits = doc_processor.split_documents(pages)
+        elapsed = time.perf_counter() - start
+        stages["split"] = {"seconds": elapsed, "chunks": len(splits), "chunks_per_sec": len(splits) / elapsed if elapsed else None}
+
+        # 阶段3：向量化
+        texts = [doc.page_content for doc in splits]
+        start = time.perf_counter()
+        vectors = vector_store_manager.embeddings.embed_documents(texts)
+        elapsed = time.perf_counter() - start
+        stages["embed"] = {"seconds": elapsed, "embeddings": len(vectors),
+                           "embeddings_per_sec": len(vectors) / elapsed if elapsed else None,
+                           "dimensions": len(vectors[0]) if vectors else 0}
+
+        # 阶段4：建索引（复用上一阶段的向量）
+        start = time.perf_counter()
+        vector_store_manager.create_vector_store_from_embeddings(splits, vectors, compute_centroid=False)
+        stages["index_build"] = {"seconds": time.perf_counter() - start}
+
+        # 阶段5：计算领域中心向量（领域外问题判断用，单独计时以免计入建索引）
+        start = time.perf_counter()
+        vector_store_manager.compute_domain_centroid()
+        stages["centroid"] = {"seconds": time.perf_counter() - start}
+
+        # 阶段6：保存
+        start = time.perf_counter()
+        vector_store_manager.save_vector_store()
+        stages["save"] = {"seconds": time.perf_counter() - start}
+
+    result = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "config": {
+            "corpus": f"synthetic:{synthetic_pages}" if synthetic_pages else pdf_path,
+            "chunk_size": doc_processor.chunk_size,
+            "chunk_overlap": doc_processor.chunk_overlap,
+            "store_type": store_type,
+            "embedding_model": Config.LOCAL_EMBEDDING_MODEL if Config.USE_LOCAL_EMBEDDING else Config.EMBEDDING_MODEL,
+            "embedding_device": Config.EMBEDDING_DEVICE,
+            "python": platform.python_version(),
+            "platform": platform.platform()
+        },
+        "stages": stages,
+        "total_seconds": sum(stage["seconds"] for name, stage in stages.items() if name != "model_load"),
+        "peak_rss_mb": memory.peak_bytes / 1024 / 1024,
+        "disk_size_mb": directory_size(persist_directory) / 1024 / 1024
+    }
+
+    shutil.rmtree(persist_directory, ignore_errors=True)
+    return result
+
+
+def print_result(result: Dict):
+    print("\n" + "=" * 60)
+    print("📊 知识库构建基准测试结果")
+    print("=" * 60)
+    stages = result["stages"]
+    print(f"模型加载:   {stages['model_load']['seconds']:.2f}s")
+    print(f"加载:       {stages['load']['seconds']:.2f}s  ({stages['load']['pages']} 页, {stages['load']['pages_per_sec'] or 0:.1f} 页/秒)")
+    print(f"分割:       {stages['split']['seconds']:.2f}s  ({stages['split']['chunks']} 块, {stages['split']['chunks_per_sec'] or 0:.1f} 块/秒)")
+    print(f"向量化:     {stages['embed']['seconds']:.2f}s  ({stages['embed']['embeddings_per_sec'] or 0:.1f} 条/秒)")
+    print(f"建索引:     {stages['index_build']['seconds']:.2f}s")
+    print(f"领域中心:   {stages['centroid']['seconds']:.2f}s")
+    print(f"保存:       {stages['save']['seconds']:.2f}s")
+    print(f"总计:       {result['total_seconds']:.2f}s")
+    print(f"峰值内存:   {result['peak_rss_mb']:.1f} MB")
+    print(f"磁盘占用:   {result['disk_size_mb']:.2f} MB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="知识库构建基准测试")
+    parser.add_argument("--pdf", default=Config.KNOWLEDGE_BASE_PATH, help="PDF文件路径")
+    parser.add_argument("--synthetic-pages", type=int, default=0, help="使用合成语料的页数（>0时忽略--pdf）")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--chunk-overlap", type=int, default=None)
+    parser.add_argument("--store-type", default=None, help="faiss 或 chroma")
+    parser.add_argument("--output", default="benchmark_results/ingest.jsonl", help="结果文件（追加写入）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run_benchmark(
+        pdf_path=args.pdf,
+        synthetic_pages=args.synthetic_pages,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        store_type=args.store_type
+    )
+    print_result(result)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    print(f"\n✅ 结果已追加到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+检索质量与延迟基准测试 - 基于人工标注的相关页码计算 recall@k、MRR、nDCG@k，并测量每次检索的延迟
+不调用LLM，可以快速对比分块大小、索引类型、自适应检索等配置
+使用方式:
+    python benchmark_retrieval.py                                   # 评估磁盘上已有的索引
+    python benchmark_retrieval.py --chunk-sizes 256,512,1024        # 为每个分块大小临时建索引后评估
+    python benchmark_retrieval.py --adaptive                        # 同时评估自适应k检索
+    python benchmark_retrieval.py --init-labels labels_draft.json   # 为测试问题生成待标注的候选页码
+标注文件格式（retrieval_labels.json）:
+    [{"question": "...", "relevant_pages": ["114", "115"], "status": "verified", "note": "核对依据"}]
+    页码与文档元数据中的 page_label 匹配（没有时使用从1开始的 page + 1）
+    只有 status 为 verified 的标注参与评估；有效标注少于 --min-labels 时不输出指标
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List
+import pandas as pd
+from langchain_core.documents import Document
+from config import Config
+from document_processor import DocumentProcessor
+from vector_store_manager import VectorStoreManager
+from resource_registry import get_vector_store_manager
+
+
+# 输出指标所需的最少有效标注数（标注太少时recall/MRR的方差大到无法区分配置）
+MIN_LABELS = 20
+
+# 文档所在的页码标识
+def page_id(doc: Document) -> str:
+    if "page_label" in doc.metadata:
+        return str(doc.metadata["page_label"])
+    return str(doc.metadata.get("page", -1) + 1)
+
+
+# 计算单个问题的指标 Args:retrieved_pages: 按排名排列的页码 relevant: 相关页码集合 k: 截断位置 Returns:recall@k、nDCG@k
+def metrics_at_k(retrieved_pages: List[str], relevant: set, k: int) -> Dict[str, float]:
+    seen = set()
+    dcg = 0.0
+    for rank, page in enumerate(retrieved_pages[:k], 1):
+        # 同一相关页的多个块只计一次收益
+        if page in relevant and page not in seen:
+            dcg += 1 / math.log2(rank + 1)
+            seen.add(page)
+
+    ideal = sum(1 / math.log2(rank + 1) for rank in range(1, min(len(relevant), k) + 1))
+    return {
+        f"recall@{k}": len(seen) / len(relevant),
+        f"ndcg@{k}": dcg / ideal if ideal else 0.0
+    }
+
+
+def reciprocal_rank(retrieved_pages: List[str], relevant: set) -> float:
+    for rank, page in enumerate(retrieved_pages, 1):
+        if page in relevant:
+            return 1 / rank
+    return 0.0
+
+
+# 评估一个配置 Args:name: 配置名称 manager: 已加载索引的管理器 labels: 标注 ks: 截断位置列表 adaptive: 是否使用自适应k Returns:(汇总, 逐问题结果)
+def evaluate_configuration(name: str, manager: VectorStoreManager, labels: List[Dict],
+                           ks: List[int], adaptive: bool = False):
+    max_k = max(ks)
+    rows = []
+
+    # 预热一次，避免首次调用的初始化开销计入延迟
+    manager.similarity_search_with_scores("预热", k=1)
+
+    for item in labels:
+        relevant = set(str(page) for page in item["relevant_pages"])
+        if not relevant:
+            continue
+
+        start = time.perf_counter()
+        if adaptive:
+            docs = manager.adaptive_search(item["question"], max_k=max_k)
+        else:
+            docs = [doc for doc, _ in manager.similarity_search_with_scores(item["question"], k=max_k)]
+        latency = time.perf_counter() - start
+
+        retrieved_pages = [page_id(doc) for doc in docs]
+        row = {"config": name, "question": item["question"], "latency_ms": latency * 1000,
+               "retrieved_k": len(docs), "mrr": reciprocal_rank(retrieved_pages, relevant)}
+        for k in ks:
+            row.update(metrics_at_k(retrieved_pages, relevant, k))
+        rows.append(row)
+
+    df = pd.DataFrame(rows)
+    summary = {"config": name, "questions": len(df)}
+    if len(df):
+        summary.update(df.drop(columns=["config", "question", "latency_ms"]).mean().round(4).to_dict())
+        summary["latency_p50_ms"] = round(df["latency_ms"].quantile(0.5), 2)
+        summary["latency_p95_ms"] = round(df["latency_ms"].quantile(0.95), 2)
+    return summary, rows
+
+
+# 读取标注，只保留已核对且有相关页码的问题 Args:path: 标注文件 include_unverified: 是否包含未核对的标注 Returns:标注列表
+def load_labels(path: str, include_unverified: bool = False) -> List[Dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+    return [
+        item for item in labels
+        if item.get("relevant_pages") and (include_unverified or item.get("status") == "verified")
+    ]
+
+
+# 为测试问题生成待人工标注的候选页码
+def init_labels(output_path: str, questions_path: str = 'test_question.json', k: int = 5):
+    manager = get_vector_store_manager()
+    if manager is None:
+        print("❌ 请先运行 python init_kb.py 初始化知识库")
+        return
+
+    with open(questions_path, 'r', encoding='utf-8') as f:
+        questions = [q['question'] for q in json.load(f)]
+
+    drafts = []
+    for question in questions:
+        docs = manager.similarity_search(question, k=k, adaptive=False)
+        drafts.append({
+            "question": question,
+            "relevant_pages": [],
+            "status": "draft",
+            "candidates": [{"page": page_id(doc), "preview": doc.page_content[:80]} for doc in docs]
+        })
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(drafts, f, ensure_ascii=False, indent=4)
+    print(f"✅ 已生成待标注文件: {output_path}（请核对并填写 relevant_pages、把 status 改为 verified 后合并到 retrieval_labels.json）")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="检索质量与延迟基准测试（不调用LLM）")
+    parser.add_argument("--labels", default="retrieval_labels.json", help="标注文件")
+    parser.add_argument("--k", default="1,3,5,10", help="评估的截断位置")
+    parser.add_argument("--chunk-sizes", default="", help="逗号分隔的分块大小，为每个大小临时建索引")
+    parser.add_argument("--chunk-overlap", type=int, default=50)
+    parser.add_argument("--adaptive", action="store_true", help="同时评估自适应k检索")
+    parser.add_argument("--init-labels", default=None, help="生成待标注的候选页码文件后退出")
+    parser.add_argument("--min-labels", type=int, default=MIN_LABELS, help="输出指标所需的最少有效标注数")
+    parser.add_argument("--include-unverified", action="store_true", help="同时使用未核对的标注（仅用于调试）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.init_labels:
+        init_labels(args.init_labels)
+        return
+
+    ks = [int(k) for k in args.k.split(",")]
+    labels = load_labels(args.labels, args.include_unverified)
+    if len(labels) < args.min_labels:
+        print(f"❌ 有效标注只有 {len(labels)} 条，少于 {args.min_labels} 条，指标没有统计意义，不输出结果")
+        print("   请用 --init-labels 生成候选页码并人工核对后补充标注（仅做冒烟测试时可加 --include-unverified 并调低 --min-labels）")
+        sys.exit(1)
+
+    # 待评估的配置：(名称, 管理器)
+    configurations = []
+    if args.chunk_sizes:
+        for chunk_size in [int(size) for size in args.chunk_sizes.split(",")]:
+            print(f"\n📏 为 chunk_size={chunk_size} 建立临时索引...")
+            splits = DocumentProcessor(chunk_size=chunk_size, chunk_overlap=args.chunk_overlap).process_pdf(
+                Config.KNOWLEDGE_BASE_PATH)
+            manager = VectorStoreManager(store_type="faiss")
+            manager.create_vector_store(splits)
+            configurations.append((f"faiss_chunk{chunk_size}", manager))
+    else:
+        manager = get_vector_store_manager()
+        if manager is None:
+            print("❌ 请先运行 python init_kb.py 初始化知识库")
+            return
+        configurations.append((f"{manager.store_type}_saved", manager))
+
+    summaries = []
+    all_rows = []
+    for name, manager in configurations:
+        modes = [(name, False)] + ([(f"{name}_adaptive", True)] if args.adaptive else [])
+        for config_name, adaptive in modes:
+            summary, rows = evaluate_configuration(config_name, manager, labels, ks, adaptive=adaptive)
+            summaries.append(summary)
+            all_rows.extend(rows)
+
+    summary_df = pd.DataFrame(summaries)
+    print("\n" + "=" * 60)
+    print("📊 检索基准测试结果")
+    print("=" * 60)
+    print(summary_df.to_string(index=False))
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    summary_df.to_csv(f"benchmark_retrieval_{timestamp}.csv", index=False, encoding='utf-8-sig')
+    pd.DataFrame(all_rows).to_csv(f"benchmark_retrieval_{timestamp}_detail.csv", index=False, encoding='utf-8-sig')
+    print(f"\n✅ 结果已保存到: benchmark_retrieval_{timestamp}.csv")
+
+
+if __name__ == "__main__":
+    main()
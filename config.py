@@ -12,12 +12,34 @@ class Config:
     OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
     
+    # LLM共享连接池配置
+    LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"  # 需要安装h2
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))  # 空闲连接保持时间（秒）
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))  # 单次LLM请求超时（秒）
+    
+    # LLM配额限流（批量实验按服务商配额并发调度）
+    LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+    LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "60000"))
+    EXPERIMENT_CONCURRENCY = int(os.getenv("EXPERIMENT_CONCURRENCY", "4"))  # 批量实验的并发数
+    
     # Embedding模型配置
     USE_LOCAL_EMBEDDING = os.getenv("USE_LOCAL_EMBEDDING", "true").lower() == "true"
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
     LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "BAAI/bge-small-zh-v1.5")
     EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")  # cpu 或 cuda
     
+    # 查询向量微批处理（并发请求合并为一次批量编码）
+    EMBEDDING_MICRO_BATCH = os.getenv("EMBEDDING_MICRO_BATCH", "false").lower() == "true"
+    EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))  # 每批最多查询数
+    EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))  # 合批最长等待（毫秒），即增加的延迟上限
+    
+    # 共享Embedding服务（python embedding_server.py），设置后所有进程通过它向量化，不再各自加载模型
+    # 例如 http://127.0.0.1:8200 或 unix:///tmp/rag_embedding.sock，为空时在进程内加载模型
+    EMBEDDING_SERVER_URL = os.getenv("EMBEDDING_SERVER_URL", "")
+    EMBEDDING_SERVER_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_TIMEOUT", "60"))  # 单次请求超时（秒）
+    
     # 文本分割配置
     CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
     CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
@@ -25,6 +47,24 @@ class Config:
     # 检索配置
     RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))  # 检索文档数量
     
+    # 上下文打包配置（预算为0时使用固定的RETRIEVAL_K）
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0"))  # 上下文Token预算
+    RETRIEVAL_CANDIDATE_K = int(os.getenv("RETRIEVAL_CANDIDATE_K", "10"))  # 打包时的候选文档数量
+    
+    # 自适应k检索配置（RETRIEVAL_K作为上限）
+    ADAPTIVE_RETRIEVAL = os.getenv("ADAPTIVE_RETRIEVAL", "false").lower() == "true"
+    ADAPTIVE_MIN_K = int(os.getenv("ADAPTIVE_MIN_K", "1"))  # 最少返回文档数
+    ADAPTIVE_SCORE_THRESHOLD = float(os.getenv("ADAPTIVE_SCORE_THRESHOLD", "0.5"))  # 相关性分数下限
+    ADAPTIVE_SCORE_DROP = float(os.getenv("ADAPTIVE_SCORE_DROP", "0.15"))  # 相对最高分的最大落差
+    
+    # 领域外问题拦截配置（命中时跳过LLM调用）
+    DOMAIN_GATE = os.getenv("DOMAIN_GATE", "false").lower() == "true"
+    DOMAIN_GATE_SCORE_THRESHOLD = float(os.getenv("DOMAIN_GATE_SCORE_THRESHOLD", "0.45"))  # 最高检索分数下限
+    DOMAIN_CENTROID_THRESHOLD = float(os.getenv("DOMAIN_CENTROID_THRESHOLD", "0"))  # 领域中心相似度下限，0表示不使用
+    
+    # 对话历史配置
+    HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))  # 历史Token预算，超出时折叠进摘要
+    
     # 向量存储配置
     VECTOR_STORE_TYPE = os.getenv("VECTOR_STORE_TYPE", "faiss")  # faiss 或 chroma
     VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "./vector_store")
@@ -32,6 +72,38 @@ class Config:
     # 知识库文件路径
     KNOWLEDGE_BASE_PATH = os.getenv("KNOWLEDGE_BASE_PATH", "./car_corpus.pdf")
     
+    # 实验结果库（逐行写入，重跑时跳过已完成的问题）
+    RESULTS_DB_PATH = os.getenv("RESULTS_DB_PATH", "./experiment_results.db")
+    CHUNK_INDEX_CACHE_SIZE = int(os.getenv("CHUNK_INDEX_CACHE_SIZE", "4"))  # Chunk Size实验页面最多缓存的索引数
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.db")  # 实验建索引的向量缓存（SQLite，按模型+文本哈希）
+    
+    # 分阶段耗时追踪：off（空操作）、memory（只在响应中返回）、jsonl、otel（OTLP JSON）
+    TRACING = os.getenv("TRACING", "memory")
+    TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "./traces/rag_traces.jsonl")
+    
+    # 启动预热：后台加载索引和Embedding模型并跑假查询，可选预先建立LLM连接
+    WARMUP = os.getenv("WARMUP", "true").lower() == "true"
+    WARMUP_LLM = os.getenv("WARMUP_LLM", "false").lower() == "true"
+    
+    # 按需性能剖析：off、cpu（采样剖析，折叠栈输出）、memory（tracemalloc快照）、all
+    PROFILE = os.getenv("PROFILE", "off")
+    PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", "./profiles")
+    PROFILE_MIN_INTERVAL = float(os.getenv("PROFILE_MIN_INTERVAL", "300"))  # 两次请求剖析之间的最小间隔（秒）
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))  # 采样间隔（毫秒）
+    
+    # Prometheus指标端点（Streamlit等非HTTP服务进程使用，0表示不启动；HTTP服务自带 /metrics）
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+    
+    # HTTP服务配置
+    API_HOST = os.getenv("API_HOST", "127.0.0.1")
+    API_PORT = int(os.getenv("API_PORT", "8000"))
+    API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "8"))  # 同时处理的请求数
+    API_REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", "60"))  # 单个请求超时（秒，含排队）
+    API_SHUTDOWN_TIMEOUT = float(os.getenv("API_SHUTDOWN_TIMEOUT", "30"))  # 关闭时等待进行中请求的时间
+    API_MAX_SESSIONS = int(os.getenv("API_MAX_SESSIONS", "1000"))  # 最多保留的会话数
+    API_SESSION_TTL = float(os.getenv("API_SESSION_TTL", "1800"))  # 会话过期时间（秒）
+    
     # 温度参数
     TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
     
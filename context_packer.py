@@ -0,0 +1,96 @@
+"""
+上下文打包 - 按Token预算从候选文档中贪心填充上下文
+"""
+import re
+from typing import List
+from langchain_core.documents import Document
+from config import Config
+from token_counter import count_tokens, count_tokens_batch, get_encoding
+
+
+# 句子边界（中英文句末标点与换行）
+SENTENCE_END_PATTERN = re.compile(r"[。！？!?；;\n]|\.(?=\s|$)")
+
+
+class ContextPacker:
+    # 初始化 token_budget: 上下文Token预算 model_name: 用于计数的模型名称 separator: 文档拼接分隔符
+    def __init__(self,
+                 token_budget: int = None,
+                 model_name: str = None,
+                 separator: str = "\n\n"):
+
+        self.token_budget = token_budget or Config.CONTEXT_TOKEN_BUDGET
+        self.model_name = model_name or Config.OPENAI_MODEL
+        self.separator = separator
+
+        # 使用模型的真实分词器（截断时需要编码/解码），计数走共享缓存
+        self.encoding = get_encoding(self.model_name)
+
+        self.separator_tokens = self.count_tokens(separator)
+
+    # 统计文本Token数 Args:text: 文本 Returns:Token数量
+    def count_tokens(self, text: str) -> int:
+        return count_tokens(text, self.model_name)
+
+    # 在句子边界处截断文本 Args:text: 原始文本 max_tokens: 最大Token数 Returns:截断后的文本，没有完整句子时返回空串
+    def truncate_to_sentence(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+
+        prefix = self.encoding.decode(tokens[:max_tokens])
+
+        # 找到最后一个句子边界
+        last_end = -1
+        for match in SENTENCE_END_PATTERN.finditer(prefix):
+            last_end = match.end()
+
+        if last_end <= 0:
+            return ""
+        return prefix[:last_end].rstrip()
+
+    # 按Token数硬截断（不考虑句子边界） Args:text: 原始文本 max_tokens: 最大Token数 Returns:截断后的文本
+    def truncate_to_tokens(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+
+        tokens = self.encoding.encode(text, disallowed_special=())
+        # 截断位置可能落在多字节字符中间，去掉解码出的替换字符
+        return self.encoding.decode(tokens[:max_tokens]).rstrip("\ufffd")
+
+    # 按相关性顺序贪心填充上下文 Args:documents: 按相关性排序的候选文档 Returns:放入上下文的文档列表（最后一个可能被截断）
+    def pack(self, documents: List[Document]) -> List[Document]:
+        packed = []
+        used_tokens = 0
+        # 一次批量统计所有候选文档，重复检索到的文档直接命中缓存
+        doc_token_counts = count_tokens_batch([doc.page_content for doc in documents], self.model_name)
+
+        for doc, doc_tokens in zip(documents, doc_token_counts):
+            # 除第一个文档外，每个文档都要额外计入分隔符
+            overhead = self.separator_tokens if packed else 0
+            remaining = self.token_budget - used_tokens - overhead
+            if remaining <= 0:
+                break
+
+            if doc_tokens <= remaining:
+                packed.append(doc)
+                used_tokens += doc_tokens + overhead
+                continue
+
+            # 预算不足以放下整个文档：在句子边界截断后放入，然后结束
+            truncated = self.truncate_to_sentence(doc.page_content, remaining)
+            if not truncated and not packed:
+                # 排名第一的文档超出预算且开头没有句子边界（长表格、列表）：按Token硬截断，避免上下文为空
+                truncated = self.truncate_to_tokens(doc.page_content, remaining)
+            if truncated:
+                packed.append(Document(
+                    page_content=truncated,
+                    metadata={**doc.metadata, "truncated": True}
+                ))
+                used_tokens += self.count_tokens(truncated) + overhead
+            break
+
+        return packed
@@ -1,8 +1,9 @@
+import time
 from typing import List
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from config import Config
+from metrics import INGEST_CHUNKS, INGEST_PAGES, INGEST_SECONDS
 
 
 class DocumentProcessor:
@@ -21,13 +22,22 @@ class DocumentProcessor:
     
     # 加载PDF文件 Args:pdf_path: PDF文件路径 Returns:文档列表
     def load_pdf(self, pdf_path: str) -> List[Document]:
+        # 只有构建知识库时才需要PDF解析，延迟导入以加快其他入口的启动
+        from langchain_community.document_loaders import PyPDFLoader
+        
+        start = time.perf_counter()
         loader = PyPDFLoader(pdf_path)
         documents = loader.load()
+        INGEST_SECONDS.observe(time.perf_counter() - start, stage="load")
+        INGEST_PAGES.inc(len(documents))
         return documents
     
     # 文档分割 Args:documents: 原始文档列表 Returns:分割后的文档列表
     def split_documents(self, documents: List[Document]) -> List[Document]: 
+        start = time.perf_counter()
         splits = self.text_splitter.split_documents(documents)
+        INGEST_SECONDS.observe(time.perf_counter() - start, stage="split")
+        INGEST_CHUNKS.inc(len(splits))
         return splits
     
     # 处理PDF文件：加载并分割 Args:pdf_path: PDF文件路径 Returns:分割后的文档列表
@@ -0,0 +1,55 @@
+"""
+领域外问题拦截 - 在调用LLM之前根据检索分数判断问题是否属于知识库领域
+"""
+from typing import Any, Dict, List
+import numpy as np
+from config import Config
+from vector_store_manager import VectorStoreManager
+
+
+# 领域外问题的固定回复，与系统提示词中的拒答话术保持一致
+OFF_DOMAIN_ANSWER = "根据现有资料无法回答这个问题。"
+
+
+class DomainGate:
+    # 初始化 vector_store_manager: 向量存储管理器 score_threshold: 最高检索分数下限 centroid_threshold: 与领域中心向量的相似度下限（0表示不使用）
+    def __init__(self,
+                 vector_store_manager: VectorStoreManager,
+                 score_threshold: float = None,
+                 centroid_threshold: float = None):
+
+        self.vector_store_manager = vector_store_manager
+        self.score_threshold = Config.DOMAIN_GATE_SCORE_THRESHOLD if score_threshold is None else score_threshold
+        self.centroid_threshold = Config.DOMAIN_CENTROID_THRESHOLD if centroid_threshold is None else centroid_threshold
+
+    # 计算问题的领域分数 Args:question: 用户问题 embedding: 已有的查询向量（与检索共用） Returns:包含最高检索分数和中心向量相似度的字典
+    def score(self, question: str, embedding: List[float] = None) -> Dict[str, Any]:
+        # 只做一次查询向量化，检索分数和中心向量相似度共用
+        if embedding is None:
+            embedding = self.vector_store_manager.embeddings.embed_query(question)
+
+        top = self.vector_store_manager.similarity_search_with_scores_by_vector(embedding, k=1)
+        top_score = top[0][1] if top else 0.0
+
+        centroid_score = None
+        centroid = self.vector_store_manager.domain_centroid
+        if centroid is not None:
+            query_vector = np.asarray(embedding, dtype=np.float32)
+            centroid_score = float(np.dot(query_vector, centroid) / np.linalg.norm(query_vector))
+
+        return {"top_score": top_score, "centroid_score": centroid_score}
+
+    # 根据分数判断是否属于领域内 Args:scores: score()的返回值 Returns:是否属于领域内
+    def is_in_domain_scores(self, scores: Dict[str, Any]) -> bool:
+        if scores["top_score"] < self.score_threshold:
+            return False
+
+        if self.centroid_threshold > 0 and scores["centroid_score"] is not None:
+            if scores["centroid_score"] < self.centroid_threshold:
+                return False
+
+        return True
+
+    # 判断问题是否属于领域内 Args:question: 用户问题 embedding: 已有的查询向量 Returns:是否属于领域内
+    def is_in_domain(self, question: str, embedding: List[float] = None) -> bool:
+        return self.is_in_domain_scores(self.score(question, embedding))
@@ -0,0 +1,83 @@
+"""
+共享Embedding服务的客户端 - 与LangChain Embeddings接口兼容，可直接替换进程内的本地模型
+通过 localhost HTTP 或 Unix socket 调用 embedding_server.py
+"""
+import threading
+from typing import List, Optional
+from urllib.parse import urlparse
+import httpx
+from langchain_core.embeddings import Embeddings
+from config import Config
+
+
+class EmbeddingServiceClient(Embeddings):
+    """
+    调用共享Embedding服务。文档向量化按max_batch_size分批发送；
+    查询向量由服务端合批，多个进程的并发查询也能合并为一次前向计算。
+    首次使用时读取 /health，服务端加载的模型与expected_model不一致时直接报错，避免用错模型的向量检索索引。
+    """
+
+    # 初始化 server_url: http://host:port 或 unix:///path/to.sock timeout: 请求超时（秒） max_batch_size: 每次请求最多的文档数 expected_model: 期望服务端加载的模型（None表示不检查）
+    def __init__(self, server_url: str = None, timeout: float = None, max_batch_size: int = 256,
+                 expected_model: Optional[str] = None):
+        self.server_url = server_url or Config.EMBEDDING_SERVER_URL
+        self.max_batch_size = max_batch_size
+        self.expected_model = expected_model
+        self._server_info: Optional[dict] = None
+        self._check_lock = threading.Lock()
+        timeout = timeout or Config.EMBEDDING_SERVER_TIMEOUT
+
+        parsed = urlparse(self.server_url)
+        if parsed.scheme == "unix":
+            # Unix socket上的HTTP，主机名只用于拼接请求URL
+            transport = httpx.HTTPTransport(uds=parsed.path)
+            self._client = httpx.Client(transport=transport, base_url="http://embedding-server", timeout=timeout)
+        elif parsed.scheme in ("http", "https"):
+            self._client = httpx.Client(base_url=self.server_url.rstrip("/"), timeout=timeout)
+        else:
+            raise ValueError(f"不支持的Embedding服务地址: {self.server_url}（需要 http:// 或 unix://）")
+
+    def _request(self, method: str, path: str, **kwargs) -> dict:
+        try:
+            response = self._client.request(method, path, **kwargs)
+            response.raise_for_status()
+        except httpx.ConnectError as e:
+            raise ConnectionError(
+                f"无法连接Embedding服务 {self.server_url}，请先运行: python embedding_server.py"
+            ) from e
+        return response.json()
+
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        self.ensure_compatible()
+        return self._request("POST", "/embed", json={"texts": texts, "kind": kind})["vectors"]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.max_batch_size):
+            vectors.extend(self._embed(texts[start:start + self.max_batch_size], "documents"))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query")[0]
+
+    # 服务端信息（模型、设备、维度、合批统计）
+    def health(self) -> dict:
+        return self._request("GET", "/health")
+
+    # 检查服务端模型（只在首次调用时请求 /health） Returns:服务端信息 Raises:ValueError: 模型不一致
+    def ensure_compatible(self) -> dict:
+        with self._check_lock:
+            if self._server_info is None:
+                info = self.health()
+                if self.expected_model and info.get("model") != self.expected_model:
+                    raise ValueError(
+                        f"Embedding服务加载的模型为 {info.get('model')}，与本地配置的 {self.expected_model} 不一致，"
+                        f"请用相同的配置重启服务或修改 .env"
+                    )
+                self._server_info = info
+            return self._server_info
+
+    # 服务端模型的向量维度
+    @property
+    def dimension(self) -> int:
+        return self.ensure_compatible()["dimension"]
@@ -0,0 +1,141 @@
+"""
+共享Embedding服务 - 在一个进程中加载本地模型，为所有Streamlit进程、实验脚本和测试提供批量向量化
+    POST /embed    {"texts": [...], "kind": "documents" | "query"} -> {"vectors": [...]}
+    GET  /health   模型、设备、向量维度和合批统计
+使用方式:
+    python embedding_server.py                                   # 按EMBEDDING_SERVER_URL监听，默认 127.0.0.1:8200
+    python embedding_server.py --socket /tmp/rag_embedding.sock  # Unix socket
+    然后设置 EMBEDDING_SERVER_URL=http://127.0.0.1:8200（或 unix:///tmp/rag_embedding.sock）
+"""
+import argparse
+import asyncio
+import os
+import socket
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from aiohttp import web
+from config import Config
+from batching_embeddings import MicroBatchingEmbeddings
+from resource_registry import get_embeddings
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8200
+# 单次请求最多的文本数，防止一个请求长时间占住模型
+MAX_TEXTS_PER_REQUEST = 2048
+
+
+async def handle_embed(request: web.Request) -> web.Response:
+    app = request.app
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="请求体必须是JSON")
+
+    texts = body.get("texts")
+    kind = body.get("kind", "documents")
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        raise web.HTTPBadRequest(text="texts必须是字符串列表")
+    if len(texts) > MAX_TEXTS_PER_REQUEST:
+        raise web.HTTPBadRequest(text=f"单次最多 {MAX_TEXTS_PER_REQUEST} 条文本")
+    if kind not in ("documents", "query"):
+        raise web.HTTPBadRequest(text="kind必须是documents或query")
+
+    loop = asyncio.get_running_loop()
+    embeddings = app["embeddings"]
+    start = time.perf_counter()
+    if kind == "query":
+        # 查询逐条进入合批队列，来自不同客户端的并发查询合并为一次前向计算
+        vectors = await asyncio.gather(*[
+            loop.run_in_executor(app["executor"], embeddings.embed_query, text) for text in texts
+        ])
+    else:
+        vectors = await loop.run_in_executor(app["executor"], embeddings.embed_documents, texts)
+
+    app["stats"]["requests"] += 1
+    app["stats"]["texts"] += len(texts)
+    app["stats"]["seconds"] += time.perf_counter() - start
+    return web.json_response({"vectors": [list(map(float, vector)) for vector in vectors]})
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    app = request.app
+    return web.json_response({
+        "status": "ok",
+        "model": Config.LOCAL_EMBEDDING_MODEL if Config.USE_LOCAL_EMBEDDING else Config.EMBEDDING_MODEL,
+        "device": Config.EMBEDDING_DEVICE if Config.USE_LOCAL_EMBEDDING else "remote",
+        "dimension": app["dimension"],
+        "stats": app["stats"],
+        "batching": app["embeddings"].stats()
+    })
+
+
+def create_app() -> web.Application:
+    # 服务进程自己必须加载模型，不能再连接共享服务
+    embeddings = get_embeddings(use_server=False)
+    if not isinstance(embeddings, MicroBatchingEmbeddings):
+        embeddings = MicroBatchingEmbeddings(embeddings)
+
+    # 先跑一次推理，完成模型加载和首次推理的初始化
+    dimension = len(embeddings.embed_query("预热"))
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app["embeddings"] = embeddings
+    app["dimension"] = dimension
+    # 线程数决定同时等待合批的查询数
+    app["executor"] = ThreadPoolExecutor(max_workers=Config.EMBEDDING_BATCH_MAX_SIZE, thread_name_prefix="embed")
+    app["stats"] = {"requests": 0, "texts": 0, "seconds": 0.0}
+    app.router.add_post("/embed", handle_embed)
+    app.router.add_get("/health", handle_health)
+    return app
+
+
+# 清理上次异常退出留下的socket文件：只删除无人监听的socket，其他文件或仍在运行的服务直接报错退出
+def remove_stale_socket(socket_path: str):
+    if not os.path.exists(socket_path):
+        return
+    if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+        raise SystemExit(f"❌ {socket_path} 已存在且不是socket文件，拒绝覆盖")
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(socket_path)
+        return
+    finally:
+        probe.close()
+    raise SystemExit(f"❌ {socket_path} 上已有服务在运行")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="共享Embedding服务")
+    parser.add_argument("--host", help=f"监听地址，默认取EMBEDDING_SERVER_URL或{DEFAULT_HOST}")
+    parser.add_argument("--port", type=int, help=f"监听端口，默认取EMBEDDING_SERVER_URL或{DEFAULT_PORT}")
+    parser.add_argument("--socket", help="Unix socket路径（指定后不监听TCP）")
+    args = parser.parse_args()
+
+    parsed = urlparse(Config.EMBEDDING_SERVER_URL) if Config.EMBEDDING_SERVER_URL else None
+    socket_path = args.socket or (parsed.path if parsed and parsed.scheme == "unix" else None)
+
+    # 加载模型前检查，避免加载完才发现socket被占用
+    if socket_path:
+        remove_stale_socket(socket_path)
+
+    print("🔤 正在加载Embedding模型...")
+    app = create_app()
+
+    if socket_path:
+        print(f"🌐 Embedding服务启动: unix://{socket_path}（维度 {app['dimension']}）")
+        web.run_app(app, path=socket_path, print=None)
+    else:
+        host = args.host or (parsed.hostname if parsed and parsed.hostname else DEFAULT_HOST)
+        port = args.port or (parsed.port if parsed and parsed.port else DEFAULT_PORT)
+        print(f"🌐 Embedding服务启动: http://{host}:{port}（维度 {app['dimension']}）")
+        web.run_app(app, host=host, port=port, print=None)
+
+
+if __name__ == "__main__":
+    main()
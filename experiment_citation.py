@@ -1,13 +1,27 @@
-from langchain_openai import ChatOpenAI
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from llm_factory import get_chat_model
 from langchain_core.messages import HumanMessage
 from config import Config
 from vector_store_manager import VectorStoreManager
 from document_processor import DocumentProcessor
+from rate_limiter import RateLimiter
+from token_counter import count_tokens
+
+# 预估输出Token数（用于按Token配额限流，实际用量返回后再修正）
+ESTIMATED_OUTPUT_TOKENS = 512
+
+
+# 从响应中取实际Token用量，没有时返回None
+def _response_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
 
 # 带引用标注的RAG问答 
-# Args:query: 用户问题 vectorstore: 向量存储实例 client: ChatOpenAI客户端 
+# Args:query: 用户问题 vectorstore: 向量存储实例 client: ChatOpenAI客户端 rate_limiter: 限流器（None表示直接调用） verbose: 是否打印结果
 # Returns:answer: LLM生成的回答 retrieved_docs: 检索到的文档列表
-def rag_with_citation(query, vectorstore, client):
+def rag_with_citation(query, vectorstore, client, rate_limiter=None, verbose=True):
 
     retrieved_docs = vectorstore.similarity_search(query, k=5)
 
@@ -31,9 +45,21 @@ def rag_with_citation(query, vectorstore, client):
 
 请回答（记得标注引用）："""
 
-    response = client.invoke([HumanMessage(content=prompt)])
+    messages = [HumanMessage(content=prompt)]
+    if rate_limiter is None:
+        response = client.invoke(messages)
+    else:
+        estimated_tokens = count_tokens(prompt) + ESTIMATED_OUTPUT_TOKENS
+        response = rate_limiter.call(lambda: client.invoke(messages), estimated_tokens, usage=_response_tokens)
     answer = response.content
 
+    if verbose:
+        print_citation_result(query, answer, retrieved_docs)
+
+    return answer, retrieved_docs
+
+
+def print_citation_result(query, answer, retrieved_docs):
     print("=" * 60)
     print(f"问题：{query}\n")
     print(f"回答：{answer}\n")
@@ -42,10 +68,9 @@ def rag_with_citation(query, vectorstore, client):
         print(f"  [文档{i}] {doc.page_content[:100]}...")
     print("=" * 60)
 
-    return answer, retrieved_docs
-
 
-def run_citation_experiment():
+# 并发运行引用标注实验，总耗时由服务商配额决定 Args:max_workers: 并发数 requests_per_minute/tokens_per_minute: 配额，默认读取Config
+def run_citation_experiment(max_workers=None, requests_per_minute=None, tokens_per_minute=None):
     print("\n" + "="*80)
     print("任务3：带引用标注的RAG问答")
     print("="*80)
@@ -54,12 +79,10 @@ def run_citation_experiment():
     vector_store_manager.load_vector_store()
     vectorstore = vector_store_manager.vector_store
     
-    client = ChatOpenAI(
-        model=Config.OPENAI_MODEL,
-        temperature=0,
-        openai_api_key=Config.OPENAI_API_KEY,
-        openai_api_base=Config.OPENAI_API_BASE
-    )
+    # 429和瞬时故障（5xx、超时、连接错误）都由限流器退避重试，关闭SDK内部重试以免重复计数
+    client = get_chat_model(temperature=0, max_retries=0)
+    rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    max_workers = max_workers or Config.EXPERIMENT_CONCURRENCY
     
     test_questions = [
         "比亚迪海豹的电池容量是多少？",
@@ -70,23 +93,39 @@ def run_citation_experiment():
     ]
     
     print("\n" + "="*80)
-    print("开始测试")
+    print(f"开始测试（并发 {max_workers}，配额 {rate_limiter.request_bucket.capacity:.0f} 请求/分钟、"
+          f"{rate_limiter.token_bucket.capacity:.0f} Token/分钟）")
     print("="*80 + "\n")
     
+    start_time = time.time()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(rag_with_citation, question, vectorstore, client, rate_limiter, False): idx
+            for idx, question in enumerate(test_questions, 1)
+        }
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                results[idx] = future.result()
+                print(f"  ✓ 测试 {idx}/{len(test_questions)} 完成")
+            except Exception as e:
+                print(f"  ✗ 测试 {idx}/{len(test_questions)} 失败: {e}")
+    
+    # 按原顺序输出结果
     for idx, question in enumerate(test_questions, 1):
+        if idx not in results:
+            continue
         print(f"\n{'-'*40}")
         print(f"测试 {idx}/{len(test_questions)}")
         print(f"{'-'*40}\n")
-        
-        answer, sources = rag_with_citation(question, vectorstore, client)
-        
-        # 添加延时避免API限流
-        if idx < len(test_questions):
-            import time
-            time.sleep(1)
+        answer, sources = results[idx]
+        print_citation_result(question, answer, sources)
     
+    stats = rate_limiter.stats
     print("\n" + "="*80)
-    print("实验完成！")
+    print(f"实验完成！总耗时 {time.time() - start_time:.2f}s，"
+          f"限流等待 {stats['waited_seconds']:.1f}s，429次数 {stats['rate_limited']}")
     print("="*80)
 
 
@@ -101,12 +140,7 @@ def interactive_citation_mode():
     vector_store_manager.load_vector_store()
     vectorstore = vector_store_manager.vector_store
     
-    client = ChatOpenAI(
-        model=Config.OPENAI_MODEL,
-        temperature=0,
-        openai_api_key=Config.OPENAI_API_KEY,
-        openai_api_base=Config.OPENAI_API_BASE
-    )
+    client = get_chat_model(temperature=0)
     
     print("请输入您的问题：\n")
     
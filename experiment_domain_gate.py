@@ -0,0 +1,96 @@
+"""
+实验：领域外问题拦截
+在 test_question.json 上测量拦截的误拦率（领域内问题被拦截）和漏拦率（领域外问题未被拦截），不调用LLM
+"""
+import json
+import time
+from datetime import datetime
+import pandas as pd
+from config import Config
+from vector_store_manager import VectorStoreManager
+from domain_gate import DomainGate
+
+
+# 测试集中的领域外问题（其余问题均视为领域内，依据实验CSV中的拒答结果标注）
+OFF_DOMAIN_QUESTIONS = {
+    "中国足球的队长是谁",
+    "新冠肺炎如何预防？",
+}
+
+
+def evaluate(df, score_threshold, centroid_threshold):
+    """计算给定阈值下的误拦率和漏拦率"""
+    blocked = df['top_score'] < score_threshold
+    if centroid_threshold > 0 and df['centroid_score'].notna().all():
+        blocked = blocked | (df['centroid_score'] < centroid_threshold)
+
+    in_domain = ~df['off_domain']
+    false_positive = (blocked & in_domain).sum() / max(in_domain.sum(), 1)
+    false_negative = (~blocked & df['off_domain']).sum() / max(df['off_domain'].sum(), 1)
+    return false_positive, false_negative
+
+
+def run_domain_gate_experiment(questions_path='test_question.json'):
+    """运行领域外拦截实验"""
+    print("=" * 60)
+    print("🚧 领域外问题拦截实验")
+    print("=" * 60)
+
+    vector_store_manager = VectorStoreManager()
+    if not vector_store_manager.load_vector_store():
+        print("❌ 请先运行 python init_kb.py 初始化知识库")
+        return None
+
+    if vector_store_manager.domain_centroid is None:
+        print("⚠️  未找到领域中心向量，正在根据当前索引计算...")
+        vector_store_manager.compute_domain_centroid()
+
+    gate = DomainGate(vector_store_manager)
+
+    with open(questions_path, 'r', encoding='utf-8') as f:
+        questions = [q['question'] for q in json.load(f)]
+
+    rows = []
+    for question in questions:
+        start_time = time.time()
+        scores = gate.score(question)
+        gate_time = time.time() - start_time
+
+        rows.append({
+            'question': question,
+            'off_domain': question in OFF_DOMAIN_QUESTIONS,
+            'top_score': scores['top_score'],
+            'centroid_score': scores['centroid_score'],
+            'blocked': not gate.is_in_domain_scores(scores),
+            'gate_time': gate_time
+        })
+
+    df = pd.DataFrame(rows)
+
+    # 当前配置下的结果
+    fp, fn = evaluate(df, gate.score_threshold, gate.centroid_threshold)
+    print(f"\n当前阈值: 检索分数 >= {gate.score_threshold}, 中心相似度 >= {gate.centroid_threshold}")
+    print(f"  误拦率（领域内被拦截）: {fp:.1%}")
+    print(f"  漏拦率（领域外未拦截）: {fn:.1%}")
+    print(f"  平均拦截耗时: {df['gate_time'].mean() * 1000:.1f} ms")
+
+    print("\n领域外问题分数:")
+    print(df[df['off_domain']][['question', 'top_score', 'centroid_score']].to_string(index=False))
+    print(f"\n领域内问题最低检索分数: {df[~df['off_domain']]['top_score'].min():.3f}")
+
+    # 阈值扫描，便于标定 DOMAIN_GATE_SCORE_THRESHOLD
+    print("\n检索分数阈值扫描:")
+    for threshold in [0.3, 0.35, 0.4, 0.45, 0.5, 0.55, 0.6]:
+        fp, fn = evaluate(df, threshold, 0)
+        print(f"  阈值 {threshold:.2f}: 误拦率 {fp:.1%}, 漏拦率 {fn:.1%}")
+
+    output_file = f'experiment_domain_gate_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    df.to_csv(output_file, index=False, encoding='utf-8-sig')
+    print(f"\n✅ 实验完成！结果已保存到: {output_file}")
+
+    return df
+
+
+if __name__ == "__main__":
+    Config.validate()
+    run_domain_gate_experiment()
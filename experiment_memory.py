@@ -3,43 +3,14 @@
 对比两种不同的对话记忆方式，观察它们在多轮对话中的表现
 """
 
-from langchain_openai import ChatOpenAI
+from llm_factory import get_chat_model
 from langchain_core.messages import HumanMessage, AIMessage
 from config import Config
+from token_counter import count_tokens
+from history_manager import RollingSummaryMemory
 import time
 
 
-def count_tokens(text):
-    """简单的token计数估算（粗略）"""
-    # 英文：约4个字符 = 1 token
-    # 中文：约1.5个字符 = 1 token
-    chinese_chars = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
-    other_chars = len(text) - chinese_chars
-    return int(chinese_chars / 1.5 + other_chars / 4)
-
-
-def summarize_history(llm, messages):
-    """将对话历史压缩为摘要"""
-    if not messages:
-        return ""
-    
-    # 构建对话历史文本
-    history_text = "\n".join([
-        f"{'用户' if isinstance(msg, HumanMessage) else 'AI'}: {msg.content}"
-        for msg in messages
-    ])
-    
-    # 生成摘要
-    summary_prompt = f"""请将以下对话历史压缩为简洁的摘要，保留关键信息：
-
-{history_text}
-
-摘要："""
-    
-    response = llm.invoke([HumanMessage(content=summary_prompt)])
-    return response.content
-
-
 class BufferMemoryChat:
     """Buffer Memory：存储完整对话历史"""
     
@@ -72,45 +43,41 @@ class BufferMemoryChat:
 
 
 class SummaryMemoryChat:
-    """Summary Memory：将历史压缩为摘要"""
+    """Summary Memory：将历史压缩为摘要（回复返回后在后台增量合并，不占用对话的关键路径）"""
     
     def __init__(self, llm, summary_threshold=4):
         self.llm = llm
-        self.messages = []
-        self.summary = ""
-        self.summary_threshold = summary_threshold  # 超过这个数量就压缩
+        self.memory = RollingSummaryMemory(llm, max_messages=summary_threshold)  # 超过这个数量就压缩
+    
+    @property
+    def messages(self):
+        return self.memory.messages
+    
+    @property
+    def summary(self):
+        return self.memory.summary
     
     def chat(self, user_input, verbose=False):
-        # 如果历史消息过多，进行压缩
-        if len(self.messages) >= self.summary_threshold:
-            if verbose:
-                print(f"\n触发摘要压缩（消息数: {len(self.messages)}）")
-            self.summary = summarize_history(self.llm, self.messages)
-            self.messages = []
-            if verbose:
-                print(f"摘要: {self.summary[:100]}...")
-        
-        # 构建当前上下文：摘要 + 最近的消息
-        context_messages = []
-        if self.summary:
-            context_messages.append(HumanMessage(content=f"之前对话的摘要：{self.summary}"))
-        context_messages.extend(self.messages)
+        # 构建当前上下文：摘要 + 最近的消息（上一轮的摘要未完成时才等待）
+        context_messages = self.memory.get_messages()
         context_messages.append(HumanMessage(content=user_input))
         
         if verbose:
-            print(f"\n当前消息数: {len(self.messages)}, 是否有摘要: {bool(self.summary)}")
+            print(f"\n当前消息数: {len(self.messages)}, 是否有摘要: {bool(self.summary)}, "
+                  f"等待摘要: {self.memory.last_wait_seconds:.2f}s")
         
         # 调用LLM
         response = self.llm.invoke(context_messages)
         
-        # 只保存最近的消息到历史
-        self.messages.append(HumanMessage(content=user_input))
-        self.messages.append(AIMessage(content=response.content))
+        # 保存到历史，超出阈值时在后台把移出的消息合并进摘要
+        if self.memory.add_turn(user_input, response.content) and verbose:
+            print(f"\n触发后台摘要压缩（消息数: {len(self.messages)}）")
         
         return response.content
     
     def get_memory_content(self):
         """获取内存内容"""
+        self.memory.wait()
         content = ""
         if self.summary:
             content += f"=== 摘要 ===\n{self.summary}\n\n"
@@ -127,12 +94,7 @@ class SummaryMemoryChat:
 Config.validate()
 
 # 初始化LLM
-llm = ChatOpenAI(
-    model=Config.OPENAI_MODEL,
-    temperature=Config.TEMPERATURE,
-    api_key=Config.OPENAI_API_KEY,
-    base_url=Config.OPENAI_API_BASE
-)
+llm = get_chat_model()
 
 # 创建两种聊天实例
 print("初始化 Buffer Memory...")
@@ -160,12 +122,15 @@ print("=== Buffer Memory 测试 ===")
 print("="*80 + "\n")
 
 buffer_responses = []
+buffer_latencies = []
 buffer_start_time = time.time()
 
 for i, msg in enumerate(test_messages, 1):
     print(f"\n【第 {i} 轮对话】")
     print(f"用户: {msg}")
+    turn_start = time.time()
     response = buffer_chat.chat(msg, verbose=True)
+    buffer_latencies.append(time.time() - turn_start)
     buffer_responses.append(response)
     print(f"AI: {response}")
     print("-" * 80)
@@ -177,12 +142,15 @@ print("=== Summary Memory 测试 ===")
 print("="*80 + "\n")
 
 summary_responses = []
+summary_latencies = []
 summary_start_time = time.time()
 
 for i, msg in enumerate(test_messages, 1):
     print(f"\n【第 {i} 轮对话】")
     print(f"用户: {msg}")
+    turn_start = time.time()
     response = summary_chat.chat(msg, verbose=True)
+    summary_latencies.append(time.time() - turn_start)
     summary_responses.append(response)
     print(f"AI: {response}")
     print("-" * 80)
@@ -207,18 +175,20 @@ print("-" * 80)
 print("\nBuffer Memory 存储内容：")
 buffer_content = buffer_chat.get_memory_content()
 print(buffer_content)
-print(f"\nBuffer Memory Token 估算: {count_tokens(buffer_content)} tokens")
+print(f"\nBuffer Memory Token 数: {count_tokens(buffer_content)} tokens")
 
 print("\n" + "-" * 80)
 print("\nSummary Memory 存储内容：")
 summary_content = summary_chat.get_memory_content()
 print(summary_content)
-print(f"\nSummary Memory Token 估算: {count_tokens(summary_content)} tokens")
+print(f"\nSummary Memory Token 数: {count_tokens(summary_content)} tokens")
 
 print("\n3. 性能对比：")
 print("-" * 80)
 print(f"Buffer Memory 总耗时: {buffer_end_time - buffer_start_time:.2f} 秒")
 print(f"Summary Memory 总耗时: {summary_end_time - summary_start_time:.2f} 秒")
+print(f"Buffer Memory 平均每轮延迟: {sum(buffer_latencies) / len(buffer_latencies):.2f} 秒（最大 {max(buffer_latencies):.2f} 秒）")
+print(f"Summary Memory 平均每轮延迟: {sum(summary_latencies) / len(summary_latencies):.2f} 秒（最大 {max(summary_latencies):.2f} 秒）")
 
 print("\n4. 总结：")
 print("-" * 80)
@@ -1,15 +1,127 @@
+import hashlib
 import json
+import sqlite3
+import threading
 import time
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Tuple
 from datetime import datetime
 
 from config import Config
 from document_processor import DocumentProcessor
 from vector_store_manager import VectorStoreManager
 from rag_chain import RAGChain
-from langchain_openai import ChatOpenAI
+from llm_factory import get_chat_model
+from results_store import ResultsStore
+from metrics import record_cache
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.documents import Document
+
+
+# SQLite单条语句的参数个数上限较低，按批查询
+EMBEDDING_CACHE_QUERY_BATCH = 500
+
+
+class EmbeddingCache:
+    """持久化的向量缓存（SQLite），键为 (模型, 文本SHA-256)。
+    不同分块大小切出的文本块几乎不会相同，缓存的收益来自重跑实验和Chunk Size页面重建索引：
+    同一模型下向量化过的文本块直接读取（线程安全）"""
+
+    # 初始化 embeddings: Embedding模型 model_name: 缓存键中的模型名，默认取当前配置 db_path: 缓存文件路径
+    def __init__(self, embeddings, model_name: str = None, db_path: str = None):
+        self.embeddings = embeddings
+        self.model_name = model_name or (
+            Config.LOCAL_EMBEDDING_MODEL if Config.USE_LOCAL_EMBEDDING else Config.EMBEDDING_MODEL)
+        self.db_path = db_path or Config.EMBEDDING_CACHE_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    # 从缓存读取向量 Args:hashes: 文本哈希 Returns:哈希 → 向量
+    def _lookup(self, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), EMBEDDING_CACHE_QUERY_BATCH):
+                batch = hashes[start:start + EMBEDDING_CACHE_QUERY_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    [self.model_name, *batch]
+                ).fetchall()
+                found.update((text_hash, np.frombuffer(vector, dtype=np.float32).tolist()) for text_hash, vector in rows)
+        return found
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [self._hash(text) for text in texts]
+        unique = dict(zip(hashes, texts))
+        found = self._lookup(list(unique))
+        missing = [(text_hash, text) for text_hash, text in unique.items() if text_hash not in found]
+
+        hits = len(texts) - len(missing)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(missing)
+        record_cache("embedding", hits=hits, misses=len(missing))
+
+        # 向量化在锁外进行，不同分块大小的工作线程可以并行计算
+        if missing:
+            vectors = self.embeddings.embed_documents([text for _, text in missing])
+            rows = [(self.model_name, text_hash, np.asarray(vector, dtype=np.float32).tobytes())
+                    for (text_hash, _), vector in zip(missing, vectors)]
+            with self._lock:
+                self._conn.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?)", rows)
+                self._conn.commit()
+            found.update((text_hash, list(vector)) for (text_hash, _), vector in zip(missing, vectors))
+
+        return [found[text_hash] for text_hash in hashes]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# 用已解析的页面为指定分块大小建立内存FAISS索引 Args:pages: PDF页面 chunk_size: 分块大小 chunk_overlap: 重叠 embedding_cache: 共享的向量缓存 progress_callback: 向量化进度回调(已完成数, 总数) Returns:(向量存储管理器, 文本块)
+def build_chunk_size_index(pages: List[Document], chunk_size: int, chunk_overlap: int = 50,
+                           embedding_cache: EmbeddingCache = None, progress_callback: Callable[[int, int], None] = None,
+                           batch_size: int = 64) -> Tuple[VectorStoreManager, List[Document]]:
+    splits = DocumentProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap).split_documents(pages)
+
+    # 使用FAISS内存索引，避免多个配置并行写同一个Chroma持久化目录
+    vector_store_manager = VectorStoreManager(store_type="faiss")
+    own_cache = embedding_cache is None
+    if own_cache:
+        embedding_cache = EmbeddingCache(vector_store_manager.embeddings)
+
+    # 分批向量化以便汇报进度
+    texts = [doc.page_content for doc in splits]
+    vectors = []
+    try:
+        for start in range(0, len(texts), batch_size):
+            vectors.extend(embedding_cache.embed_documents(texts[start:start + batch_size]))
+            if progress_callback:
+                progress_callback(len(vectors), len(texts))
+    finally:
+        if own_cache:
+            embedding_cache.close()
+
+    vector_store_manager.create_vector_store_from_embeddings(splits, vectors)
+    return vector_store_manager, splits
 
 
 class RAGExperiments:
@@ -17,6 +129,8 @@ class RAGExperiments:
         self.knowledge_base_path = Config.KNOWLEDGE_BASE_PATH
         self.test_questions_path = 'test_question.json'
         self.results = []
+        # 逐题写入结果库，中断后重跑只补跑未完成的问题
+        self.results_store = ResultsStore()
         
     # 加载测试问题
     def load_test_questions(self, limit=10) -> List[Dict]:
@@ -24,70 +138,113 @@ class RAGExperiments:
             questions = json.load(f)
         return questions[:limit]
     
+    # 影响实验结果的公共配置（与实验参数一起计算配置哈希，重跑时只复用完全相同配置下的结果）
+    # 新增会改变RAGChain输出的配置项时需要同步加到这里
+    def _base_config(self) -> Dict[str, Any]:
+        return {
+            "model": Config.OPENAI_MODEL,
+            "temperature": Config.TEMPERATURE,
+            "embedding_model": Config.LOCAL_EMBEDDING_MODEL if Config.USE_LOCAL_EMBEDDING else Config.EMBEDDING_MODEL,
+            "knowledge_base": self.knowledge_base_path,
+            # 检索与上下文
+            "adaptive_retrieval": Config.ADAPTIVE_RETRIEVAL,
+            "adaptive_min_k": Config.ADAPTIVE_MIN_K,
+            "adaptive_score_threshold": Config.ADAPTIVE_SCORE_THRESHOLD,
+            "adaptive_score_drop": Config.ADAPTIVE_SCORE_DROP,
+            "context_token_budget": Config.CONTEXT_TOKEN_BUDGET,
+            "retrieval_candidate_k": Config.RETRIEVAL_CANDIDATE_K,
+            # 领域外拦截
+            "domain_gate": Config.DOMAIN_GATE,
+            "domain_gate_score_threshold": Config.DOMAIN_GATE_SCORE_THRESHOLD,
+            "domain_centroid_threshold": Config.DOMAIN_CENTROID_THRESHOLD,
+            # 对话历史（同一配置内的问题共享历史）
+            "history_token_budget": Config.HISTORY_TOKEN_BUDGET
+        }
+    
+    # 实验所用向量库的配置 Args:use_best_chunk_size: 是否用chunk_size=1024重建 Returns:配置字典
+    def _vector_store_config(self, use_best_chunk_size: bool) -> Dict[str, Any]:
+        if use_best_chunk_size:
+            chunk_size, chunk_overlap = 1024, 50
+        else:
+            # 加载磁盘上已有的索引，按init_kb建索引时使用的分块配置区分
+            chunk_size, chunk_overlap = Config.CHUNK_SIZE, Config.CHUNK_OVERLAP
+        return {
+            "use_best_chunk_size": use_best_chunk_size,
+            "vector_store_type": Config.VECTOR_STORE_TYPE,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap
+        }
+    
+    # 过滤出尚未完成的问题 Args:experiment: 实验名 config: 实验配置 test_questions: 测试问题 Returns:未完成的问题
+    def _pending_questions(self, experiment: str, config: Dict[str, Any], test_questions: List[Dict]) -> List[Dict]:
+        completed = self.results_store.completed_questions(experiment, config)
+        pending = [q for q in test_questions if q['question'] not in completed]
+        if completed:
+            print(f"♻️  结果库中已有 {len(test_questions) - len(pending)}/{len(test_questions)} 个问题的结果，跳过")
+        return pending
+    
+    # 从结果库取出本次测试问题在这些配置下的全部结果（含之前运行中已完成的）
+    def _collect_results(self, experiment: str, configs: List[Dict[str, Any]], test_questions: List[Dict]) -> pd.DataFrame:
+        questions = [q['question'] for q in test_questions]
+        frames = [self.results_store.load_results(experiment, config) for config in configs]
+        frames = [df[df['question'].isin(questions)] for df in frames if len(df)]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    
+    # 准备实验用的向量库 Args:use_best_chunk_size: 是否使用chunk_size=1024重建 Returns:向量存储管理器
+    def _prepare_vector_store(self, use_best_chunk_size: bool) -> VectorStoreManager:
+        if use_best_chunk_size:
+            print("\n📏 使用最佳 Chunk Size = 1024, Overlap = 50 重建向量库")
+            doc_processor = DocumentProcessor(chunk_size=1024, chunk_overlap=50)
+            splits = doc_processor.process_pdf(self.knowledge_base_path)
+            vector_store_manager = VectorStoreManager()
+            vector_store_manager.create_vector_store(splits)
+        else:
+            # 加载现有向量存储
+            vector_store_manager = VectorStoreManager()
+            vector_store_manager.load_vector_store()
+        return vector_store_manager
+    
     # ==================== 实验1: Chunk Size对比 ====================
     
-    # 实验1：测试不同的Chunk Size对检索效果的影响
-    def experiment_chunk_size(self, retrieval_k=3):
+    # 实验1：测试不同的Chunk Size对检索效果的影响（各配置并行建索引和问答）
+    def experiment_chunk_size(self, retrieval_k=3, chunk_sizes=None, max_workers=None):
         """
         Args:
             retrieval_k: 检索文档数量，默认k=3
+            chunk_sizes: 待对比的分块大小，默认[256, 512, 1024]
+            max_workers: 并行的配置数，默认每个分块大小一个线程
         """
         print("\n" + "="*60)
         print("🔬 实验1: Chunk Size对比实验")
         print(f"📊 检索文档数 k = {retrieval_k}")
         print("="*60)
         
-        chunk_sizes = [256,512,1024]
+        chunk_sizes = chunk_sizes or [256,512,1024]
         test_questions = self.load_test_questions(limit=5)
-        results = []
-        
-        for chunk_size in chunk_sizes:
-            print(f"\n📏 测试 Chunk Size = {chunk_size}")
-            print("-" * 60)
-            
-            # 重新处理文档
-            doc_processor = DocumentProcessor(
-                chunk_size=chunk_size,
-                chunk_overlap=50
-            )
-            splits = doc_processor.process_pdf(self.knowledge_base_path)
-            
-            # 创建向量存储
-            vector_store_manager = VectorStoreManager()
-            vector_store_manager.create_vector_store(splits)
-            
-            # 创建RAG链
-            rag_chain = RAGChain(vector_store_manager, retrieval_k=retrieval_k)
-            
-            # 测试每个问题
-            for q in test_questions:
-                question = q['question']
-                start_time = time.time()
-                
-                try:
-                    response = rag_chain.get_answer_with_sources(question)
-                    answer = response['answer']
-                    num_sources = len(response['sources'])
-                    response_time = time.time() - start_time
-                    
-                    result = {
-                        'chunk_size': chunk_size,
-                        'retrieval_k': retrieval_k,
-                        'question': question,
-                        'answer': answer,
-                        'num_sources': num_sources,
-                        'response_time': response_time,
-                        'num_chunks': len(splits)
-                    }
-                    results.append(result)
-                    
-                    print(f"  ✓ {question[:30]}... ({response_time:.2f}s)")
-                    
-                except Exception as e:
-                    print(f"  ✗ {question[:30]}... 失败: {e}")
-        
-        # 保存结果
-        df = pd.DataFrame(results)
+        sweep_start = time.time()
+        
+        # PDF只解析一次；向量缓存持久化在磁盘上，重跑时已向量化的文本块直接读取
+        pages = DocumentProcessor().load_pdf(self.knowledge_base_path)
+        print(f"加载了 {len(pages)} 个页面")
+        embedding_cache = EmbeddingCache(VectorStoreManager(store_type="faiss").embeddings)
+        
+        # 每个分块大小一个工作线程：建索引后顺序提问（与原来一样，同一配置内共享对话历史）
+        with ThreadPoolExecutor(max_workers=max_workers or len(chunk_sizes)) as executor:
+            futures = [
+                executor.submit(self._run_chunk_size_config, pages, chunk_size, retrieval_k,
+                                test_questions, embedding_cache)
+                for chunk_size in chunk_sizes
+            ]
+            for future in futures:
+                future.result()
+        
+        sweep_time = time.time() - sweep_start
+        print(f"\n⏱️  扫描总耗时 {sweep_time:.2f}s（向量缓存命中 {embedding_cache.hits} 条，新计算 {embedding_cache.misses} 条）")
+        embedding_cache.close()
+        
+        # 保存结果（包含之前运行中已完成的问题）
+        configs = [self._chunk_size_config(chunk_size, retrieval_k) for chunk_size in chunk_sizes]
+        df = self._collect_results('chunk_size', configs, test_questions)
         output_file = f'experiment_chunk_size_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
         df.to_csv(output_file, index=False, encoding='utf-8-sig')
         
@@ -96,6 +253,53 @@ class RAGExperiments:
         
         return df
     
+    def _chunk_size_config(self, chunk_size, retrieval_k) -> Dict[str, Any]:
+        return {**self._base_config(), "chunk_size": chunk_size, "chunk_overlap": 50, "retrieval_k": retrieval_k}
+    
+    # 运行单个分块大小配置，每完成一个问题写入结果库
+    def _run_chunk_size_config(self, pages, chunk_size, retrieval_k, test_questions, embedding_cache):
+        config = self._chunk_size_config(chunk_size, retrieval_k)
+        test_questions = self._pending_questions('chunk_size', config, test_questions)
+        if not test_questions:
+            # 全部已完成，不必建索引
+            return
+        
+        index_start = time.time()
+        vector_store_manager, splits = build_chunk_size_index(pages, chunk_size, 50, embedding_cache)
+        index_time = time.time() - index_start
+        print(f"\n📏 Chunk Size = {chunk_size}: {len(splits)} 个文本块，建索引 {index_time:.2f}s")
+        
+        # 创建RAG链
+        rag_chain = RAGChain(vector_store_manager, retrieval_k=retrieval_k)
+        
+        # 测试每个问题
+        for q in test_questions:
+            question = q['question']
+            start_time = time.time()
+            
+            try:
+                response = rag_chain.get_answer_with_sources(question)
+                answer = response['answer']
+                num_sources = len(response['sources'])
+                response_time = time.time() - start_time
+                
+                result = {
+                    'chunk_size': chunk_size,
+                    'retrieval_k': retrieval_k,
+                    'question': question,
+                    'answer': answer,
+                    'num_sources': num_sources,
+                    'response_time': response_time,
+                    'num_chunks': len(splits),
+                    'index_time': index_time
+                }
+                self.results_store.save_result('chunk_size', config, question, result)
+                
+                print(f"  ✓ [{chunk_size}] {question[:30]}... ({response_time:.2f}s)")
+                
+            except Exception as e:
+                print(f"  ✗ [{chunk_size}] {question[:30]}... 失败: {e}")
+    
     def _print_chunk_size_summary(self, df):
         """打印Chunk Size实验总结"""
         print("\n" + "="*60)
@@ -104,7 +308,8 @@ class RAGExperiments:
         
         summary = df.groupby('chunk_size').agg({
             'response_time': 'mean',
-            'num_chunks': 'first'
+            'num_chunks': 'first',
+            'index_time': 'first'
         }).round(2)
         
         print(summary)
@@ -128,30 +333,19 @@ class RAGExperiments:
         print(f"📊 Baseline k={baseline_k}, Rerank从{rerank_pool_k}中挑{rerank_top_k}个")
         print("="*60)
         
-        # 如果需要使用最佳chunk_size，先重建向量库
-        if use_best_chunk_size:
-            print("\n📏 使用最佳 Chunk Size = 1024, Overlap = 50 重建向量库")
-            doc_processor = DocumentProcessor(chunk_size=1024, chunk_overlap=50)
-            splits = doc_processor.process_pdf(self.knowledge_base_path)
-            vector_store_manager = VectorStoreManager()
-            vector_store_manager.create_vector_store(splits)
-        else:
-            # 加载现有向量存储
-            vector_store_manager = VectorStoreManager()
-            vector_store_manager.load_vector_store()
+        config = {**self._base_config(), **self._vector_store_config(use_best_chunk_size), "baseline_k": baseline_k,
+                  "rerank_pool_k": rerank_pool_k, "rerank_top_k": rerank_top_k}
+        test_questions = self.load_test_questions(limit=5)
+        pending_questions = self._pending_questions('reranking', config, test_questions)
         
-        # 初始化LLM用于重排序
-        llm = ChatOpenAI(
-            model=Config.OPENAI_MODEL,
-            temperature=0,  # 温度=0确保评分稳定
-            openai_api_key=Config.OPENAI_API_KEY,
-            openai_api_base=Config.OPENAI_API_BASE
-        )
+        # 如果需要使用最佳chunk_size，先重建向量库（全部已完成时跳过）
+        if pending_questions:
+            vector_store_manager = self._prepare_vector_store(use_best_chunk_size)
         
-        test_questions = self.load_test_questions(limit=5)
-        results = []
+        # 初始化LLM用于重排序
+        llm = get_chat_model(temperature=0)  # 温度=0确保评分稳定
         
-        for q in test_questions:
+        for q in pending_questions:
             question = q['question']
             print(f"\n❓ 问题: {question}")
             print("-" * 60)
@@ -189,13 +383,13 @@ class RAGExperiments:
                 'num_sources_reranked': len(docs_reranked),
                 'docs_changed': docs_changed
             }
-            results.append(result)
+            self.results_store.save_result('reranking', config, question, result)
             
             print(f"  原始检索: {time_original:.2f}s")
             print(f"  重排序后: {time_reranked:.2f}s")
         
-        # 保存结果
-        df = pd.DataFrame(results)
+        # 保存结果（包含之前运行中已完成的问题）
+        df = self._collect_results('reranking', [config], test_questions)
         output_file = f'experiment_reranking_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
         df.to_csv(output_file, index=False, encoding='utf-8-sig')
         
@@ -328,12 +522,7 @@ class RAGExperiments:
 """
         
         # 使用与RAGChain相同的LLM配置
-        llm = ChatOpenAI(
-            model=Config.OPENAI_MODEL,
-            temperature=Config.TEMPERATURE, 
-            openai_api_key=Config.OPENAI_API_KEY,
-            openai_api_base=Config.OPENAI_API_BASE
-        )
+        llm = get_chat_model()
         
         prompt = ChatPromptTemplate.from_messages([
             ("system", system_prompt),
@@ -369,30 +558,18 @@ class RAGExperiments:
         print(f"📊 检索文档数 k = {retrieval_k}")
         print("="*60)
         
-        # 如果需要使用最佳chunk_size，先重建向量库（控制变量）
-        if use_best_chunk_size:
-            print("\n📏 使用最佳 Chunk Size = 1024, Overlap = 50 重建向量库")
-            doc_processor = DocumentProcessor(chunk_size=1024, chunk_overlap=50)
-            splits = doc_processor.process_pdf(self.knowledge_base_path)
-            vector_store_manager = VectorStoreManager()
-            vector_store_manager.create_vector_store(splits)
-        else:
-            # 加载现有向量存储
-            vector_store_manager = VectorStoreManager()
-            vector_store_manager.load_vector_store()
+        config = {**self._base_config(), **self._vector_store_config(use_best_chunk_size), "retrieval_k": retrieval_k}
+        test_questions = self.load_test_questions(limit=5)
+        pending_questions = self._pending_questions('query_rewriting', config, test_questions)
         
-        # 初始化LLM
-        llm = ChatOpenAI(
-            model=Config.OPENAI_MODEL,
-            temperature=0.3,
-            openai_api_key=Config.OPENAI_API_KEY,
-            openai_api_base=Config.OPENAI_API_BASE
-        )
+        # 如果需要使用最佳chunk_size，先重建向量库（控制变量，全部已完成时跳过）
+        if pending_questions:
+            vector_store_manager = self._prepare_vector_store(use_best_chunk_size)
         
-        test_questions = self.load_test_questions(limit=5)
-        results = []
+        # 初始化LLM
+        llm = get_chat_model(temperature=0.3)
         
-        for q in test_questions:
+        for q in pending_questions:
             original_question = q['question']
             print(f"\n❓ 原始问题: {original_question}")
             print("-" * 60)
@@ -432,13 +609,13 @@ class RAGExperiments:
                 'num_sources_original': len(response_original['sources']),
                 'num_sources_rewritten': len(docs_rewritten)
             }
-            results.append(result)
+            self.results_store.save_result('query_rewriting', config, original_question, result)
             
             print(f"  原始查询: {time_original:.2f}s")
             print(f"  改写查询: {time_rewritten:.2f}s")
         
-        # 保存结果
-        df = pd.DataFrame(results)
+        # 保存结果（包含之前运行中已完成的问题）
+        df = self._collect_results('query_rewriting', [config], test_questions)
         output_file = f'experiment_query_rewriting_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
         df.to_csv(output_file, index=False, encoding='utf-8-sig')
         
@@ -0,0 +1,263 @@
+"""
+对话历史管理 - 按Token预算（或消息条数）限制历史，超出时在后台线程中把最早的对话折叠进滚动摘要
+"""
+import threading
+import time
+from typing import List, Optional
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from config import Config
+from token_counter import count_message_tokens, count_tokens, count_tokens_batch, get_encoding
+
+
+# 滚动摘要提示词：只把新移出的对话合并进已有摘要
+SUMMARY_PROMPT = """请将以下新的对话内容合并进已有的对话摘要，输出更新后的简洁摘要，保留用户信息、提问意图和关键结论：
+
+已有摘要：
+{summary}
+
+新的对话：
+{history_text}
+
+更新后的摘要："""
+
+# 摘要超出长度上限时的压缩提示词
+COMPRESS_SUMMARY_PROMPT = """请把以下对话摘要压缩到{max_tokens}个Token以内，只保留用户信息、提问意图和关键结论：
+
+{summary}
+
+压缩后的摘要："""
+
+# 摘要最多占历史Token预算的比例，其余留给最近的对话
+SUMMARY_BUDGET_RATIO = 0.25
+
+
+# 把消息格式化为摘要提示词中的对话文本
+def format_history(messages: List[BaseMessage]) -> str:
+    return "\n".join([
+        f"{'用户' if isinstance(msg, HumanMessage) else 'AI'}: {msg.content}"
+        for msg in messages
+    ])
+
+
+# 把新移出的对话增量合并进已有摘要 Returns:更新后的摘要
+def merge_into_summary(llm, summary: str, evicted: List[BaseMessage]) -> str:
+    response = llm.invoke([HumanMessage(content=SUMMARY_PROMPT.format(
+        summary=summary or "（无）",
+        history_text=format_history(evicted)
+    ))])
+    return response.content
+
+
+class ChatHistoryManager:
+    # 初始化 llm: 用于生成摘要的模型 token_budget: 历史Token预算（含摘要） model_name: 用于计数的模型名称
+    def __init__(self, llm, token_budget: int = None, model_name: str = None):
+        self.llm = llm
+        self.token_budget = token_budget or Config.HISTORY_TOKEN_BUDGET
+        self.model_name = model_name or Config.OPENAI_MODEL
+        self.summary_budget = int(self.token_budget * SUMMARY_BUDGET_RATIO)
+
+        self.messages: List[BaseMessage] = []
+        self.summary = ""
+
+        # 后台摘要线程与保护历史状态的锁
+        self._lock = threading.Lock()
+        self._summary_thread: Optional[threading.Thread] = None
+        # 每次清空历史时递增，用于丢弃过期的摘要结果
+        self._generation = 0
+
+    # 统计文本Token数（共享的计数缓存，同一条消息只编码一次）
+    def count_tokens(self, text: str) -> int:
+        return count_tokens(text, self.model_name)
+
+    # 摘要消息的Token数
+    def _summary_tokens(self) -> int:
+        return self.count_tokens(self.summary) if self.summary else 0
+
+    # 当前历史（摘要 + 消息）的总Token数
+    def total_tokens(self) -> int:
+        with self._lock:
+            return self._total_tokens()
+
+    def _total_tokens(self) -> int:
+        return self._summary_tokens() + count_message_tokens(self.messages, self.model_name)
+
+    # 获取放入提示词的历史消息，后台摘要尚未完成时丢弃最早的消息，保证不超出预算 Returns:消息列表
+    def get_messages(self) -> List[BaseMessage]:
+        with self._lock:
+            budget = self.token_budget - self._summary_tokens()
+            recent = []
+            used = 0
+            counts = count_tokens_batch([m.content for m in self.messages], self.model_name)
+            # 从最新的一轮向前取，按完整的问答对保留
+            for i in range(len(self.messages) - 2, -1, -2):
+                pair = self.messages[i:i + 2]
+                pair_tokens = sum(counts[i:i + 2])
+                if used + pair_tokens > budget:
+                    break
+                recent = pair + recent
+                used += pair_tokens
+
+            if self.summary:
+                return [SystemMessage(content=f"之前对话的摘要：{self.summary}")] + recent
+            return recent
+
+    # 添加一轮对话，超出预算时启动后台摘要（不阻塞调用方）
+    def add_turn(self, question: str, answer: str):
+        with self._lock:
+            self.messages.append(HumanMessage(content=question))
+            self.messages.append(AIMessage(content=answer))
+            if self._total_tokens() > self.token_budget:
+                self._start_summary()
+
+    # 启动后台摘要线程（调用方需持有self._lock；已有线程在运行时跳过，下一轮会再次检查）
+    def _start_summary(self):
+        if self._summary_thread and self._summary_thread.is_alive():
+            return
+
+        self._summary_thread = threading.Thread(target=self._fold_oldest_turns, daemon=True)
+        self._summary_thread.start()
+
+    # 把最早的对话折叠进摘要，直到保留的消息不超过预算的一半
+    def _fold_oldest_turns(self):
+        with self._lock:
+            generation = self._generation
+            summary = self.summary
+            target = self.token_budget // 2
+
+            counts = count_tokens_batch([m.content for m in self.messages], self.model_name)
+            remaining = sum(counts)
+            evict_count = 0
+            # 至少保留最近一轮对话
+            while remaining > target and evict_count < len(self.messages) - 2:
+                remaining -= sum(counts[evict_count:evict_count + 2])
+                evict_count += 2
+            evicted = self.messages[:evict_count]
+
+        if not evicted:
+            return
+
+        try:
+            new_summary = self._bound_summary(merge_into_summary(self.llm, summary, evicted))
+        except Exception as e:
+            print(f"后台摘要失败: {e}")
+            return
+
+        with self._lock:
+            # 摘要期间历史被清空则丢弃结果；新消息只会追加在末尾，被折叠的消息仍在开头
+            if generation != self._generation:
+                return
+            self.summary = new_summary
+            self.messages = self.messages[evict_count:]
+
+    # 限制摘要长度：超出summary_budget时让模型重新压缩，仍然超出则按Token截断 Args:summary: 合并后的摘要 Returns:不超过summary_budget的摘要
+    def _bound_summary(self, summary: str) -> str:
+        if self.count_tokens(summary) <= self.summary_budget:
+            return summary
+
+        response = self.llm.invoke([HumanMessage(content=COMPRESS_SUMMARY_PROMPT.format(
+            max_tokens=self.summary_budget,
+            summary=summary
+        ))])
+        summary = response.content
+        if self.count_tokens(summary) <= self.summary_budget:
+            return summary
+
+        encoding = get_encoding(self.model_name)
+        return encoding.decode(encoding.encode(summary, disallowed_special=())[:self.summary_budget])
+
+    # 等待后台摘要完成 Args:timeout: 最长等待秒数
+    def wait(self, timeout: float = None):
+        thread = self._summary_thread
+        if thread and thread.is_alive():
+            thread.join(timeout)
+
+    # 清空历史和摘要
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.messages = []
+            self.summary = ""
+
+
+class RollingSummaryMemory:
+    """按消息条数限制的摘要记忆：回复返回后在后台把新移出的对话增量合并进摘要，
+    下一次请求只在摘要尚未完成时才等待"""
+
+    # 初始化 llm: 用于生成摘要的模型 max_messages: 保留的最近消息条数，超出部分折叠进摘要
+    def __init__(self, llm, max_messages: int = 4):
+        self.llm = llm
+        self.max_messages = max(max_messages, 2)
+
+        self.messages: List[BaseMessage] = []
+        self.summary = ""
+
+        self._lock = threading.Lock()
+        self._summary_thread: Optional[threading.Thread] = None
+        self._generation = 0
+        # 最近一次请求等待摘要完成的时间（秒），用于观察摘要是否拖慢了对话
+        self.last_wait_seconds = 0.0
+
+    # 后台摘要是否仍在进行
+    @property
+    def summarizing(self) -> bool:
+        return bool(self._summary_thread and self._summary_thread.is_alive())
+
+    # 获取放入提示词的历史（摘要 + 最近消息），后台摘要未完成时等待 Returns:消息列表
+    def get_messages(self) -> List[BaseMessage]:
+        start = time.perf_counter()
+        self.wait()
+        self.last_wait_seconds = time.perf_counter() - start
+
+        with self._lock:
+            if self.summary:
+                return [SystemMessage(content=f"之前对话的摘要：{self.summary}")] + list(self.messages)
+            return list(self.messages)
+
+    # 添加一轮对话，超出条数时启动后台摘要（不阻塞调用方） Returns:是否触发了摘要
+    def add_turn(self, question: str, answer: str) -> bool:
+        with self._lock:
+            self.messages.append(HumanMessage(content=question))
+            self.messages.append(AIMessage(content=answer))
+            # 检查和启动在同一把锁内，避免并发的两轮对话各启动一个摘要线程
+            if len(self.messages) > self.max_messages and not self.summarizing:
+                self._summary_thread = threading.Thread(target=self._fold_evicted, daemon=True)
+                self._summary_thread.start()
+                return True
+        return False
+
+    # 把超出条数的最早消息（按完整问答对）合并进摘要
+    def _fold_evicted(self):
+        with self._lock:
+            generation = self._generation
+            summary = self.summary
+            evict_count = len(self.messages) - self.max_messages
+            evict_count += evict_count % 2
+            evicted = self.messages[:evict_count]
+
+        if not evicted:
+            return
+
+        try:
+            new_summary = merge_into_summary(self.llm, summary, evicted)
+        except Exception as e:
+            print(f"后台摘要失败: {e}")
+            return
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            self.summary = new_summary
+            self.messages = self.messages[evict_count:]
+
+    # 等待后台摘要完成 Args:timeout: 最长等待秒数
+    def wait(self, timeout: float = None):
+        thread = self._summary_thread
+        if thread and thread.is_alive():
+            thread.join(timeout)
+
+    # 清空历史和摘要
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.messages = []
+            self.summary = ""
@@ -1,9 +1,11 @@
 """
 初始化脚本 - 用于第一次运行时初始化知识库
 """
+import argparse
 import os
 import sys
 from config import Config
+from profiling import PROFILE_MODES, configure_profiler, get_profiler
 from document_processor import DocumentProcessor
 from vector_store_manager import VectorStoreManager
 
@@ -46,19 +48,21 @@ def initialize_vector_store():
     print("=" * 60)
     
     try:
-        # 文档处理
-        print("\n📄 步骤 1/3: 处理PDF文档")
-        doc_processor = DocumentProcessor()
-        splits = doc_processor.process_pdf(Config.KNOWLEDGE_BASE_PATH)
-        
-        # 创建向量存储
-        print(f"\n💾 步骤 2/3: 创建 {Config.VECTOR_STORE_TYPE.upper()} 向量存储")
-        vector_store_manager = VectorStoreManager()
-        vector_store_manager.create_vector_store(splits)
-        
-        # 保存向量存储
-        print("\n💿 步骤 3/3: 保存向量存储到磁盘")
-        vector_store_manager.save_vector_store()
+        # 开启剖析时采样所有线程（向量化可能在线程池中进行）
+        with get_profiler().profile("init_kb", all_threads=True):
+            # 文档处理
+            print("\n📄 步骤 1/3: 处理PDF文档")
+            doc_processor = DocumentProcessor()
+            splits = doc_processor.process_pdf(Config.KNOWLEDGE_BASE_PATH)
+            
+            # 创建向量存储
+            print(f"\n💾 步骤 2/3: 创建 {Config.VECTOR_STORE_TYPE.upper()} 向量存储")
+            vector_store_manager = VectorStoreManager()
+            vector_store_manager.create_vector_store(splits)
+            
+            # 保存向量存储
+            print("\n💿 步骤 3/3: 保存向量存储到磁盘")
+            vector_store_manager.save_vector_store()
         
         print("\n" + "=" * 60)
         print("✅ 初始化完成！")
@@ -79,8 +83,16 @@ def initialize_vector_store():
         return False
 
 
-def main():
-    """主函数"""
+def main(argv=None):
+    """主函数 Args:argv: 命令行参数（None时读取sys.argv，main.py进程内调用时传入）"""
+    parser = argparse.ArgumentParser(description="初始化知识库")
+    parser.add_argument("--profile", nargs="?", const="all", choices=PROFILE_MODES,
+                        help="剖析构建过程：cpu（采样折叠栈）、memory（tracemalloc快照）、all（默认），输出到PROFILE_OUTPUT_DIR")
+    args = parser.parse_args(argv)
+    if args.profile:
+        # 命令行显式要求时不受最小间隔限制
+        configure_profiler(args.profile, min_interval=0)
+    
     print("\n🚗 智能汽车知识库问答系统 - 初始化工具\n")
     
     # 检查环境
@@ -0,0 +1,147 @@
+"""
+LLM客户端工厂 - 所有ChatOpenAI实例共享同一个长连接、支持HTTP/2的连接池
+避免每个实例各自建立连接池、重复TLS握手，并提供连接复用统计
+"""
+import threading
+from typing import TYPE_CHECKING, Dict, Tuple
+import httpx
+from config import Config
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+
+_lock = threading.Lock()
+_http_client: httpx.Client = None
+_http_async_client: httpx.AsyncClient = None
+_chat_models: Dict[Tuple, "ChatOpenAI"] = {}
+
+# 连接复用统计：请求数与新建连接数之差即复用次数
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "new_connections": 0}
+
+
+# 是否可以启用HTTP/2（需要安装h2）
+def _http2_available() -> bool:
+    if not Config.LLM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("未安装h2，LLM连接池使用HTTP/1.1（pip install httpx[http2] 以启用HTTP/2）")
+        return False
+
+
+def _record_request():
+    with _stats_lock:
+        _stats["requests"] += 1
+
+
+def _record_connect(event_name: str):
+    if event_name == "connection.connect_tcp.complete":
+        with _stats_lock:
+            _stats["new_connections"] += 1
+
+
+# httpcore的trace回调：只有新建连接时才会触发connect_tcp事件
+def _trace(event_name, info):
+    _record_connect(event_name)
+
+
+async def _async_trace(event_name, info):
+    _record_connect(event_name)
+
+
+def _on_request(request: httpx.Request):
+    _record_request()
+    request.extensions["trace"] = _trace
+
+
+async def _on_async_request(request: httpx.Request):
+    _record_request()
+    request.extensions["trace"] = _async_trace
+
+
+def _create_clients():
+    global _http_client, _http_async_client
+
+    limits = httpx.Limits(
+        max_connections=Config.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=Config.LLM_KEEPALIVE_EXPIRY
+    )
+    timeout = httpx.Timeout(Config.LLM_TIMEOUT, connect=10.0)
+    http2 = _http2_available()
+
+    _http_client = httpx.Client(
+        limits=limits, timeout=timeout, http2=http2,
+        event_hooks={"request": [_on_request]}
+    )
+    _http_async_client = httpx.AsyncClient(
+        limits=limits, timeout=timeout, http2=http2,
+        event_hooks={"request": [_on_async_request]}
+    )
+
+
+# 获取共享连接池的ChatOpenAI（相同参数的实例也会复用） Args:temperature: 温度，默认Config.TEMPERATURE model: 模型名称 max_retries: SDK内部重试次数（None使用默认值） Returns:ChatOpenAI对象
+def get_chat_model(temperature: float = None, model: str = None, max_retries: int = None) -> "ChatOpenAI":
+    temperature = Config.TEMPERATURE if temperature is None else temperature
+    model = model or Config.OPENAI_MODEL
+    key = (model, temperature, max_retries)
+
+    with _lock:
+        if key in _chat_models:
+            return _chat_models[key]
+
+        # 首次创建模型时才导入openai SDK
+        from langchain_openai import ChatOpenAI
+
+        if _http_client is None:
+            _create_clients()
+
+        kwargs = {} if max_retries is None else {"max_retries": max_retries}
+        llm = ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            openai_api_key=Config.OPENAI_API_KEY,
+            openai_api_base=Config.OPENAI_API_BASE,
+            http_client=_http_client,
+            http_async_client=_http_async_client,
+            **kwargs
+        )
+        _chat_models[key] = llm
+        return llm
+
+
+# 预先建立到LLM服务的连接（TCP+TLS握手），之后的第一个请求直接复用 Returns:是否连接成功
+def warm_connection() -> bool:
+    with _lock:
+        if _http_client is None:
+            _create_clients()
+
+    # 只请求模型列表，不消耗Token；状态码不重要，连接建立后即进入连接池
+    try:
+        _http_client.get(
+            f"{Config.OPENAI_API_BASE.rstrip('/')}/models",
+            headers={"Authorization": f"Bearer {Config.OPENAI_API_KEY}"}
+        )
+        return True
+    except httpx.HTTPError as e:
+        print(f"LLM连接预热失败: {e}")
+        return False
+
+
+# 连接复用统计 Returns:请求数、新建连接数、复用次数、复用率
+def get_connection_stats() -> dict:
+    with _stats_lock:
+        requests = _stats["requests"]
+        new_connections = _stats["new_connections"]
+
+    reused = max(requests - new_connections, 0)
+    return {
+        "requests": requests,
+        "new_connections": new_connections,
+        "reused": reused,
+        "reuse_rate": reused / requests if requests else 0.0
+    }
@@ -0,0 +1,307 @@
+"""
+压测工具 - 按目标QPS重放测试问题，统计延迟分位数、首token时间、错误率和各阶段耗时
+    服务内部各阶段（embed_query、vector_search、prompt_build、llm_ttft 等）的耗时来自RAG链的追踪，
+    以 stage_<阶段> 列写入CSV并在JSON中给出分位数（TRACING=off 时没有这些列）
+    目标: chain（进程内RAGChain）或 http（api_server 的 /ask/stream）
+    模式: open（开环，按泊松到达率发请求，不受响应速度影响）或 closed（闭环，固定并发数）
+使用方式:
+    python load_test.py --target chain --mode open --qps 2 --requests 50
+    python load_test.py --target http --url http://127.0.0.1:8000 --mode closed --concurrency 8 --duration 60
+    python load_test.py --questions query_log.jsonl ...    # 重放记录的查询日志（每行一个JSON，包含question字段）
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+import pandas as pd
+
+
+# 加载问题：test_question.json（JSON数组）或查询日志（JSONL / 每行一个问题）
+def load_questions(path: str) -> List[str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read().strip()
+
+    if content.startswith('['):
+        return [item['question'] for item in json.loads(content)]
+
+    questions = []
+    for line in content.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('{'):
+            questions.append(json.loads(line)['question'])
+        else:
+            questions.append(line)
+    return questions
+
+
+class ChainTarget:
+    """进程内调用RAGChain.stream_answer，每个请求使用独立的对话历史"""
+
+    def __init__(self, concurrency: int):
+        # 延迟导入：target=http 时不需要加载模型
+        from rag_chain import RAGChain
+        from resource_registry import get_vector_store_manager
+
+        self.rag_chain_class = RAGChain
+        self.vector_store_manager = get_vector_store_manager()
+        if self.vector_store_manager is None:
+            raise RuntimeError("未找到向量存储，请先运行: python init_kb.py")
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def _run(self, question: str) -> Dict:
+        rag_chain = self.rag_chain_class(self.vector_store_manager)
+        start = time.perf_counter()
+        first_token = None
+        output_chars = 0
+        for content in rag_chain.stream_answer(question):
+            if first_token is None:
+                first_token = time.perf_counter()
+            output_chars += len(content)
+        end = time.perf_counter()
+        return {"start": start, "first_token": first_token or end, "end": end, "output_chars": output_chars,
+                "stages": rag_chain.last_timings}
+
+    async def request(self, question: str) -> Dict:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._run, question)
+
+    async def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class HttpTarget:
+    """调用HTTP服务的SSE接口，每个请求使用独立的会话ID"""
+
+    def __init__(self, url: str, timeout: float):
+        import aiohttp
+
+        self.url = url.rstrip('/') + '/ask/stream'
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout))
+
+    async def request(self, question: str) -> Dict:
+        start = time.perf_counter()
+        first_token = None
+        output_chars = 0
+        event = None
+        stages = {}
+
+        async with self.session.post(self.url, json={"question": question, "session_id": uuid.uuid4().hex}) as resp:
+            if resp.status != 200:
+                raise RuntimeError(f"HTTP {resp.status}")
+            async for raw_line in resp.content:
+                line = raw_line.decode('utf-8').strip()
+                if line.startswith('event:'):
+                    event = line[len('event:'):].strip()
+                elif line.startswith('data:'):
+                    data = json.loads(line[len('data:'):])
+                    if event == 'token':
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                        output_chars += len(data.get('content', ''))
+                    elif event == 'done':
+                        stages = data.get('timings') or {}
+                    elif event == 'error':
+                        raise RuntimeError(data.get('message', 'stream error'))
+
+        end = time.perf_counter()
+        return {"start": start, "first_token": first_token or end, "end": end, "output_chars": output_chars,
+                "stages": stages}
+
+    async def close(self):
+        await self.session.close()
+
+
+class LoadTester:
+    def __init__(self, target, questions: List[str], concurrency: int):
+        self.target = target
+        self.questions = questions
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.results: List[Dict] = []
+        self.test_start = None
+
+    # 发送单个请求并记录各阶段耗时 Args:index: 请求序号 scheduled: 计划发送时间
+    async def _one(self, index: int, scheduled: float):
+        question = self.questions[index % len(self.questions)]
+        row = {"index": index, "question": question, "error": ""}
+
+        async with self.semaphore:
+            dispatched = time.perf_counter()
+            try:
+                timing = await self.target.request(question)
+                row.update({
+                    "queue_wait": dispatched - scheduled,
+                    "ttft": timing["first_token"] - timing["start"],
+                    "generation": timing["end"] - timing["first_token"],
+                    "service_time": timing["end"] - timing["start"],
+                    "output_chars": timing["output_chars"]
+                })
+                # 服务内部各阶段耗时（追踪结果为毫秒，统一换算为秒；total与service_time重复，不单独记录）
+                row.update({
+                    f"stage_{name}": ms / 1000
+                    for name, ms in timing.get("stages", {}).items() if name != "total"
+                })
+            except Exception as e:
+                row["error"] = f"{type(e).__name__}: {e}"
+
+        finished = time.perf_counter()
+        # 端到端延迟从计划发送时间算起，开环模式下包含排队时间
+        row["latency"] = finished - scheduled
+        row["finished_at"] = finished - self.test_start
+        self.results.append(row)
+
+    # 开环：按泊松过程到达，到达时间不受响应速度影响
+    async def run_open_loop(self, qps: float, total_requests: int, duration: float, seed: int):
+        rng = random.Random(seed)
+        self.test_start = time.perf_counter()
+        tasks = []
+        next_arrival = self.test_start
+        index = 0
+
+        while True:
+            if total_requests and index >= total_requests:
+                break
+            if duration and next_arrival - self.test_start >= duration:
+                break
+
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self._one(index, next_arrival)))
+            index += 1
+            next_arrival += rng.expovariate(qps)
+
+        await asyncio.gather(*tasks)
+
+    # 闭环：固定数量的并发用户，每个用户收到响应后立即发送下一个请求
+    async def run_closed_loop(self, concurrency: int, total_requests: int, duration: float):
+        self.test_start = time.perf_counter()
+        next_index = 0
+
+        async def worker():
+            nonlocal next_index
+            while True:
+                if duration and time.perf_counter() - self.test_start >= duration:
+                    return
+                if total_requests and next_index >= total_requests:
+                    return
+                index = next_index
+                next_index += 1
+                await self._one(index, time.perf_counter())
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+
+# 客户端测得的延迟列
+LATENCY_COLUMNS = ["latency", "queue_wait", "ttft", "generation", "service_time"]
+
+
+# 服务内部阶段耗时列（按出现顺序）
+def stage_columns(df: pd.DataFrame) -> List[str]:
+    return [column for column in df.columns if column.startswith("stage_")]
+
+
+# 汇总统计 Args:df: 每个请求的结果 wall_time: 总耗时 Returns:汇总字典
+def summarize(df: pd.DataFrame, wall_time: float) -> Dict:
+    ok = df[df['error'] == ''] if len(df) else df
+    summary = {
+        "requests": len(df),
+        "errors": int((df['error'] != '').sum()) if len(df) else 0,
+        "error_rate": float((df['error'] != '').mean()) if len(df) else 0.0,
+        "wall_time": wall_time,
+        "throughput_rps": len(ok) / wall_time if wall_time else 0.0,
+    }
+
+    for column in LATENCY_COLUMNS + stage_columns(df):
+        if len(ok) and column in ok:
+            values = ok[column].dropna()
+            if not len(values):
+                continue
+            summary[column] = {
+                "mean": float(values.mean()),
+                "p50": float(values.quantile(0.50)),
+                "p95": float(values.quantile(0.95)),
+                "p99": float(values.quantile(0.99)),
+                "max": float(values.max())
+            }
+    return summary
+
+
+def print_summary(summary: Dict):
+    print("\n" + "=" * 60)
+    print("📊 压测结果")
+    print("=" * 60)
+    print(f"请求数: {summary['requests']}  错误数: {summary['errors']}  错误率: {summary['error_rate']:.1%}")
+    print(f"总耗时: {summary['wall_time']:.1f}s  吞吐量: {summary['throughput_rps']:.2f} 请求/秒")
+    print(f"\n{'阶段':<24}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    columns = LATENCY_COLUMNS + [key for key in summary if key.startswith("stage_")]
+    for column in columns:
+        if column in summary:
+            stats = summary[column]
+            print(f"{column:<24}" + "".join(f"{stats[k]:>9.3f}" for k in ["mean", "p50", "p95", "p99", "max"]))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="RAG问答链路压测")
+    parser.add_argument("--target", choices=["chain", "http"], default="chain")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="HTTP服务地址（target=http）")
+    parser.add_argument("--questions", default="test_question.json", help="测试问题或查询日志文件")
+    parser.add_argument("--mode", choices=["open", "closed"], default="open")
+    parser.add_argument("--qps", type=float, default=1.0, help="开环模式的目标到达率")
+    parser.add_argument("--concurrency", type=int, default=8, help="最大并发数（闭环模式为并发用户数）")
+    parser.add_argument("--requests", type=int, default=0, help="请求总数（0表示只按时长）")
+    parser.add_argument("--duration", type=float, default=0, help="压测时长（秒，0表示只按请求数）")
+    parser.add_argument("--timeout", type=float, default=120, help="单个请求超时（秒，target=http）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="输出文件前缀，默认 load_test_时间戳")
+    args = parser.parse_args(argv)
+    if not args.requests and not args.duration:
+        args.requests = 20
+    return args
+
+
+async def run(args):
+    questions = load_questions(args.questions)
+    if args.target == "chain":
+        target = ChainTarget(args.concurrency)
+    else:
+        target = HttpTarget(args.url, args.timeout)
+
+    tester = LoadTester(target, questions, args.concurrency)
+    start = time.perf_counter()
+    try:
+        if args.mode == "open":
+            print(f"🚀 开环压测: 目标 {args.qps} QPS, 最大并发 {args.concurrency}")
+            await tester.run_open_loop(args.qps, args.requests, args.duration, args.seed)
+        else:
+            print(f"🚀 闭环压测: 并发 {args.concurrency}")
+            await tester.run_closed_loop(args.concurrency, args.requests, args.duration)
+    finally:
+        await target.close()
+    return tester.results, time.perf_counter() - start
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results, wall_time = asyncio.run(run(args))
+
+    df = pd.DataFrame(results).sort_values("index")
+    summary = summarize(df, wall_time)
+    summary["config"] = vars(args)
+    print_summary(summary)
+
+    prefix = args.output or f'load_test_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+    df.to_csv(f"{prefix}.csv", index=False, encoding='utf-8-sig')
+    with open(f"{prefix}.json", 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 结果已保存到: {prefix}.csv, {prefix}.json")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 """
 主入口文件 - 提供命令行界面
 """
-import sys
 import os
+import runpy
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
 
 
 def print_banner():
@@ -19,33 +22,146 @@ def print_banner():
     print(banner)
 
 
+# 命令行问答复用的RAG链（worker模式下在各次操作之间保持对话历史和已加载的索引）
+_rag_chain = None
+
+
 def print_menu():
     """打印菜单"""
     print("\n请选择操作：\n")
     print("  1. 🚀 启动 Web 应用")
     print("  2. 🔧 初始化知识库")
     print("  3. 🧪 运行测试")
-    print("  4. 📖 查看快速开始指南")
-    print("  5. ❌ 退出")
+    print("  4. 💬 命令行问答")
+    print("  5. 📖 查看快速开始指南")
+    print("  6. ❌ 退出")
     print()
 
 
-def run_streamlit():
-    """运行 Streamlit 应用"""
+def run_entry(func, *args):
+    """在当前进程中调用入口函数，入口函数中的 sys.exit 只结束本次操作 Returns:退出码"""
+    try:
+        result = func(*args)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except KeyboardInterrupt:
+        print("\n已中断")
+        return 130
+    except Exception as e:
+        # 与原来的子进程一样，单个操作失败不影响菜单
+        print(f"\n❌ 执行失败: {e}")
+        return 1
+    if result is False:
+        return 1
+    # 入口函数返回的非零整数（如 init_kb.main 的返回值）作为退出码
+    if isinstance(result, int) and not isinstance(result, bool):
+        return result
+    return 0
+
+
+def run_streamlit(args=()):
+    """运行 Streamlit 应用（在当前进程中启动，已加载的模块和索引可直接复用）"""
     print("\n正在启动 Web 应用...")
-    os.system("streamlit run app.py")
+    from streamlit.web import cli as stcli
+
+    argv = sys.argv
+    sys.argv = ["streamlit", "run", os.path.join(ROOT, "app.py"), *args]
+    try:
+        return run_entry(stcli.main)
+    finally:
+        sys.argv = argv
 
 
-def run_init():
+def run_init(argv=()):
     """运行初始化脚本"""
+    global _rag_chain
     print("\n正在初始化知识库...")
-    os.system("python init_kb.py")
+    import init_kb
+
+    code = run_entry(init_kb.main, list(argv))
+    if code == 0:
+        # 索引已重建，丢弃进程内缓存的旧索引和RAG链
+        from resource_registry import invalidate_vector_store
+        invalidate_vector_store()
+        _rag_chain = None
+    return code
+
+
+def run_api_server():
+    """运行 HTTP 服务"""
+    print("\n正在启动 HTTP 服务...")
+    import api_server
+    return run_entry(api_server.main)
 
 
 def run_test():
-    """运行测试"""
+    """运行测试（test_documents/test_rag.py，进程内已加载的索引和模型直接复用）"""
     print("\n正在运行测试...")
-    os.system("python test_rag.py")
+    return run_entry(runpy.run_path, os.path.join(ROOT, "test_documents", "test_rag.py"), None, "__main__")
+
+
+def get_rag_chain():
+    """获取命令行问答使用的RAG链，首次调用时创建 Returns:RAG链，没有索引时返回None"""
+    global _rag_chain
+    if _rag_chain is None:
+        from rag_chain import RAGChain
+        from resource_registry import get_vector_store_manager
+
+        vector_store_manager = get_vector_store_manager()
+        if vector_store_manager is None:
+            print("❌ 未找到向量存储，请先初始化知识库")
+            return None
+        _rag_chain = RAGChain(vector_store_manager)
+    return _rag_chain
+
+
+def run_ask(question=None):
+    """命令行问答：指定问题时回答一次，否则进入交互模式（输入 clear 清除历史，quit 退出）"""
+    rag_chain = get_rag_chain()
+    if rag_chain is None:
+        return 1
+
+    questions = [question] if question else None
+    if questions is None:
+        print("\n💬 命令行问答（输入 clear 清除对话历史，quit 返回）\n")
+
+    while True:
+        if questions is not None:
+            if not questions:
+                return 0
+            user_input = questions.pop()
+        else:
+            try:
+                user_input = input("您的问题: ").strip()
+            except (EOFError, KeyboardInterrupt):
+                print()
+                return 0
+            if user_input.lower() in ["quit", "exit", "退出"]:
+                return 0
+            if user_input.lower() == "clear":
+                rag_chain.clear_history()
+                continue
+            if not user_input:
+                continue
+
+        try:
+            response = rag_chain.invoke(user_input)
+            print(f"\n回答: {response['answer']}")
+            timings = response.get("timings")
+            if timings:
+                print(f"耗时: {timings['total']:.0f} ms")
+            print()
+        except Exception as e:
+            print(f"\n❌ 回答失败: {e}\n")
+
+
+def run_worker():
+    """常驻 worker：后台预先加载索引和模型，之后的菜单操作（测试、问答）直接复用"""
+    from warmup import start_warmup, warmup_status
+
+    start_warmup()
+    print("🔥 worker 模式：索引和模型在后台加载，加载完成后各操作无需再等待冷启动")
+    interactive_menu(status=warmup_status)
 
 
 def show_quickstart():
@@ -67,10 +183,42 @@ def show_quickstart():
     print("步骤 4: 启动应用")
     print("  streamlit run app.py")
     print()
+    print("可选: 启动 HTTP 服务（/ask, /ask/stream）")
+    print("  python main.py serve")
+    print()
+    print("可选: 命令行问答 / 常驻 worker（索引和模型只加载一次）")
+    print("  python main.py ask 如何加热座椅？")
+    print("  python main.py worker")
+    print()
     print("详细说明请查看: QUICKSTART.md")
     print("="*60)
 
 
+def interactive_menu(status=None):
+    """交互式菜单，所有操作都在当前进程中执行 Args:status: worker模式下返回预热状态的函数"""
+    actions = {"1": run_streamlit, "2": run_init, "3": run_test, "4": run_ask, "5": show_quickstart}
+
+    while True:
+        if status is not None:
+            state = status()
+            labels = {"ready": f"🟢 已就绪（{state['seconds']:.1f}s）", "running": f"🟡 {state['step']}",
+                      "failed": f"🔴 预热失败：{state['error']}"}
+            print(f"\n预热状态: {labels.get(state['state'], '⚪ 未预热（WARMUP=false）')}")
+        print_menu()
+        choice = input("请输入选项 (1-6): ").strip()
+        
+        if choice == '6':
+            print("\n👋 再见！")
+            break
+        if choice not in actions:
+            print("\n❌ 无效的选项，请重新输入")
+            continue
+        
+        run_entry(actions[choice])
+        if choice in ['1', '2', '3', '4']:
+            input("\n按 Enter 键继续...")
+
+
 def main():
     """主函数"""
     print_banner()
@@ -78,42 +226,30 @@ def main():
     # 检查是否有命令行参数
     if len(sys.argv) > 1:
         command = sys.argv[1].lower()
+        args = sys.argv[2:]
         if command in ['run', 'start', 'app']:
-            run_streamlit()
+            code = run_streamlit(args)
         elif command in ['init', 'initialize']:
-            run_init()
+            code = run_init(args)
+        elif command in ['serve', 'api']:
+            code = run_api_server()
         elif command in ['test']:
-            run_test()
+            code = run_test()
+        elif command in ['ask']:
+            code = run_entry(run_ask, " ".join(args) or None)
+        elif command in ['worker']:
+            code = run_worker()
         elif command in ['help', '--help', '-h']:
-            show_quickstart()
+            code = show_quickstart()
         else:
             print(f"未知命令: {command}")
-            print("可用命令: run, init, test, help")
-        return
+            print("可用命令: run, init, serve, test, ask, worker, help")
+            code = 1
+        sys.exit(code or 0)
     
     # 交互式菜单
-    while True:
-        print_menu()
-        choice = input("请输入选项 (1-5): ").strip()
-        
-        if choice == '1':
-            run_streamlit()
-        elif choice == '2':
-            run_init()
-        elif choice == '3':
-            run_test()
-        elif choice == '4':
-            show_quickstart()
-        elif choice == '5':
-            print("\n👋 再见！")
-            break
-        else:
-            print("\n❌ 无效的选项，请重新输入")
-        
-        if choice in ['1', '2', '3']:
-            input("\n按 Enter 键继续...")
+    interactive_menu()
 
 
 if __name__ == "__main__":
     main()
-
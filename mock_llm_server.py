@@ -0,0 +1,194 @@
+"""
+本地OpenAI兼容模拟服务 - 用于离线压测、超时和并发测试
+    POST /v1/chat/completions   对话补全（支持 stream=true）
+    POST /v1/embeddings         向量（按文本哈希生成的确定性向量）
+    GET  /v1/models             模型列表
+使用方式:
+    python mock_llm_server.py --port 8100 --ttft lognormal:0.4,0.3 --tokens-per-sec 40 --error-rate 0.02
+    然后设置 OPENAI_API_BASE=http://127.0.0.1:8100/v1
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import uuid
+from typing import Callable, List
+from aiohttp import web
+
+
+# 模拟回答内容（按字符切分为token）
+MOCK_ANSWER = (
+    "根据提供的上下文信息，您可以通过中央显示屏进入车辆功能界面，选择座椅设置后调节加热档位。"
+    "加热功能共有三档，建议根据环境温度选择合适的档位。如长时间使用，请注意避免低温烫伤。"
+)
+
+
+# 解析延迟分布 Args:spec: fixed:秒 / uniform:最小,最大 / normal:均值,标准差 / lognormal:中位数,sigma Returns:采样函数
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(rng.gauss(values[0], values[1]), 0.0)
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"不支持的延迟分布: {spec}")
+
+
+# 按文本哈希生成归一化的确定性向量
+def mock_embedding(text: str, dimensions: int) -> List[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class MockLLMServer:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.ttft = parse_latency(args.ttft)
+        self.embedding_latency = parse_latency(args.embedding_latency)
+        self.answer_tokens = list(MOCK_ANSWER)[:args.max_tokens]
+
+    # 按配置的概率注入错误 Returns:错误响应，不注入时返回None
+    def maybe_error(self):
+        if self.rng.random() >= self.args.error_rate:
+            return None
+
+        status = self.args.error_status
+        headers = {"Retry-After": "1"} if status == 429 else None
+        return web.json_response(
+            {"error": {"message": "mock injected error", "type": "mock_error", "code": status}},
+            status=status,
+            headers=headers
+        )
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        error = self.maybe_error()
+        if error is not None:
+            return error
+
+        model = body.get("model", "mock-model")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+        token_interval = 1.0 / self.args.tokens_per_sec
+
+        # 首token延迟
+        await asyncio.sleep(self.ttft(self.rng))
+
+        if not body.get("stream"):
+            await asyncio.sleep(token_interval * len(self.answer_tokens))
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(self.answer_tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(self.answer_tokens),
+                    "total_tokens": prompt_tokens + len(self.answer_tokens)
+                }
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        def chunk(delta, finish_reason=None):
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        await response.write(chunk({"role": "assistant", "content": ""}))
+        for i, token in enumerate(self.answer_tokens):
+            if i:
+                await asyncio.sleep(token_interval)
+            await response.write(chunk({"content": token}))
+        await response.write(chunk({}, finish_reason="stop"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        error = self.maybe_error()
+        if error is not None:
+            return error
+
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+
+        await asyncio.sleep(self.embedding_latency(self.rng))
+
+        # OpenAIEmbeddings可能传入token id列表，统一转为字符串计算哈希
+        data = [
+            {"object": "embedding", "index": i, "embedding": mock_embedding(str(text), self.args.dimensions)}
+            for i, text in enumerate(inputs)
+        ]
+        return web.json_response({
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "mock-embedding"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}
+        })
+
+    async def models(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "object": "list",
+            "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]
+        })
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        app.router.add_get("/v1/models", self.models)
+        return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="本地OpenAI兼容模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--ttft", default="lognormal:0.4,0.3", help="首token延迟分布（秒）")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0, help="生成速度")
+    parser.add_argument("--max-tokens", type=int, default=200, help="每个回答的token数上限")
+    parser.add_argument("--embedding-latency", default="fixed:0.02", help="向量接口延迟分布（秒）")
+    parser.add_argument("--dimensions", type=int, default=512, help="向量维度")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="错误注入概率")
+    parser.add_argument("--error-status", type=int, default=500, help="注入错误的HTTP状态码（如500、429）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子，保证结果可复现")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = MockLLMServer(args)
+    print(f"🧪 模拟LLM服务启动: http://{args.host}:{args.port}/v1")
+    print(f"   设置 OPENAI_API_BASE=http://{args.host}:{args.port}/v1 即可使用")
+    web.run_app(server.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,8 @@ AI智能问答 - 成品页面
 """
 import streamlit as st
 from config import Config
-from vector_store_manager import VectorStoreManager
 from rag_chain import RAGChain
+from resource_registry import get_vector_store_manager
 from langchain_core.messages import HumanMessage, AIMessage
 
 st.set_page_config(page_title="AI智能问答", page_icon="💬", layout="wide")
@@ -26,8 +26,11 @@ def initialize_rag():
     if not st.session_state.initialized:
         try:
             with st.spinner("🔧 正在初始化RAG系统..."):
-                vector_store_manager = VectorStoreManager()
-                vector_store_manager.load_vector_store()
+                # 共享进程内已加载的模型和索引，会话中只保存RAG链（对话历史）
+                vector_store_manager = get_vector_store_manager()
+                if vector_store_manager is None:
+                    st.error("❌ 未找到向量存储，请先运行: python init_kb.py")
+                    return False
                 
                 st.session_state.rag_chain = RAGChain(vector_store_manager)
                 st.session_state.initialized = True
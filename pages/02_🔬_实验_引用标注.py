@@ -3,9 +3,8 @@
 测试LLM在回答时标注引用来源的能力
 """
 import streamlit as st
-from config import Config
-from vector_store_manager import VectorStoreManager
-from langchain_openai import ChatOpenAI
+from resource_registry import get_vector_store_manager
+from llm_factory import get_chat_model
 from langchain_core.messages import HumanMessage
 import time
 
@@ -57,15 +56,13 @@ def initialize_system():
     """初始化系统"""
     try:
         with st.spinner("🔧 正在初始化..."):
-            vector_store_manager = VectorStoreManager()
-            vector_store_manager.load_vector_store()
+            # 共享进程内已加载的模型和索引
+            vector_store_manager = get_vector_store_manager()
+            if vector_store_manager is None:
+                st.error("❌ 未找到向量存储，请先运行: python init_kb.py")
+                return False
             
-            client = ChatOpenAI(
-                model=Config.OPENAI_MODEL,
-                temperature=0,
-                openai_api_key=Config.OPENAI_API_KEY,
-                openai_api_base=Config.OPENAI_API_BASE
-            )
+            client = get_chat_model(temperature=0)
             
             st.session_state.vectorstore = vector_store_manager.vector_store
             st.session_state.llm_client = client
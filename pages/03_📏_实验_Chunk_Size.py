@@ -4,9 +4,10 @@
 """
 import streamlit as st
 from config import Config
-from document_processor import DocumentProcessor
-from vector_store_manager import VectorStoreManager
+from experiments import build_chunk_size_index
 from rag_chain import RAGChain
+from resource_registry import get_chunk_size_index, get_parsed_pages, start_chunk_size_index_build
+from results_store import ResultsStore
 import time
 import pandas as pd
 
@@ -19,19 +20,51 @@ if 'chunk_experiments' not in st.session_state:
     st.session_state.chunk_experiments = []
 
 
-def test_chunk_size(chunk_size, question, retrieval_k=3):
-    """测试特定chunk size"""
-    try:
-        # 重新处理文档
-        doc_processor = DocumentProcessor(
-            chunk_size=chunk_size,
-            chunk_overlap=int(chunk_size * 0.2)  # 20% overlap
-        )
-        splits = doc_processor.process_pdf(Config.KNOWLEDGE_BASE_PATH)
+def chunk_overlap_for(chunk_size):
+    return int(chunk_size * 0.2)  # 20% overlap
+
+
+def ensure_indexes(chunk_sizes):
+    """在后台线程中为尚未缓存的chunk size建索引，页面轮询显示进度；已缓存的直接复用，其他会话正在构建的直接等待"""
+    # 每个chunk size一个构建线程（由注册表统一管理），线程只更新状态字典，界面由主线程刷新
+    builds = {}
+    for chunk_size in chunk_sizes:
+        def build(state, chunk_size=chunk_size):
+            pages = get_parsed_pages(Config.KNOWLEDGE_BASE_PATH)
+            return build_chunk_size_index(
+                pages, chunk_size, chunk_overlap_for(chunk_size),
+                progress_callback=lambda done, total: state.update(done=done, total=total)
+            )
         
-        # 创建临时向量存储
-        vector_store_manager = VectorStoreManager()
-        vector_store_manager.create_vector_store(splits)
+        state = start_chunk_size_index_build(chunk_size, chunk_overlap_for(chunk_size), build)
+        if state is not None:
+            builds[chunk_size] = (state, st.progress(0.0, text=f"Chunk Size = {chunk_size}: 等待分块..."))
+    
+    while any(state["thread"].is_alive() for state, _ in builds.values()):
+        for chunk_size, (state, bar) in builds.items():
+            if state["total"]:
+                bar.progress(state["done"] / state["total"],
+                             text=f"Chunk Size = {chunk_size}: 向量化 {state['done']}/{state['total']}")
+        time.sleep(0.2)
+    
+    for chunk_size, (state, bar) in builds.items():
+        if state["error"]:
+            bar.progress(1.0, text=f"Chunk Size = {chunk_size}: 建索引失败")
+        else:
+            bar.progress(1.0, text=f"Chunk Size = {chunk_size}: 索引已建好（{state['seconds']:.1f}s）")
+    return {chunk_size: state for chunk_size, (state, _) in builds.items()}
+
+
+def test_chunk_size(chunk_size, question, retrieval_k=3, build_state=None):
+    """在已缓存的索引上测试特定chunk size，只做检索和生成"""
+    if build_state and build_state["error"]:
+        return {"chunk_size": chunk_size, "error": build_state["error"]}
+    
+    try:
+        cached = get_chunk_size_index(chunk_size, chunk_overlap_for(chunk_size))
+        if cached is None:
+            return {"chunk_size": chunk_size, "error": "索引已被淘汰，请调大 CHUNK_INDEX_CACHE_SIZE 后重试"}
+        vector_store_manager, splits = cached
         
         # 创建RAG链
         rag_chain = RAGChain(vector_store_manager, retrieval_k=retrieval_k)
@@ -45,7 +78,8 @@ def test_chunk_size(chunk_size, question, retrieval_k=3):
             "chunk_size": chunk_size,
             "answer": response,
             "time": elapsed_time,
-            "num_chunks": len(splits)
+            "num_chunks": len(splits),
+            "index_time": build_state["seconds"] if build_state else None
         }
         
     except Exception as e:
@@ -137,6 +171,9 @@ def main():
         st.markdown("---")
         st.markdown("### 🧪 实验进行中...")
         
+        # 每个chunk size只建一次索引，之后的实验直接复用缓存
+        build_states = ensure_indexes(chunk_sizes)
+        
         results = []
         progress_bar = st.progress(0)
         status_text = st.empty()
@@ -145,7 +182,7 @@ def main():
             status_text.text(f"正在测试 Chunk Size = {chunk_size}... ({idx+1}/{len(chunk_sizes)})")
             
             with st.spinner(f"处理 Chunk Size = {chunk_size}"):
-                result = test_chunk_size(chunk_size, test_question, retrieval_k)
+                result = test_chunk_size(chunk_size, test_question, retrieval_k, build_states.get(chunk_size))
                 results.append(result)
             
             progress_bar.progress((idx + 1) / len(chunk_sizes))
@@ -183,6 +220,7 @@ def main():
                             "Chunk Size": result['chunk_size'],
                             "Chunks数量": result['num_chunks'],
                             "响应时间(秒)": f"{result['time']:.2f}",
+                            "建索引(秒)": f"{result['index_time']:.2f}" if result.get('index_time') is not None else "缓存",
                         })
                 
                 if df_data:
@@ -221,6 +259,24 @@ def main():
                 st.session_state.chunk_experiments = []
                 st.rerun()
     
+    # 结果库中的批量实验结果（python experiments.py 写入）
+    st.markdown("<br>", unsafe_allow_html=True)
+    with st.expander("📚 结果库中的批量实验结果", expanded=False):
+        store = ResultsStore()
+        stored = store.load_results("chunk_size")
+        if stored.empty:
+            st.info("结果库中还没有 Chunk Size 实验结果，可运行 python experiments.py 生成")
+        else:
+            summary = stored.groupby(["config_hash", "chunk_size"]).agg(
+                问题数=("question", "count"),
+                平均响应时间=("response_time", "mean"),
+                Chunks数量=("num_chunks", "first")
+            ).round(2).reset_index()
+            st.dataframe(summary, use_container_width=True)
+            st.dataframe(stored[["chunk_size", "question", "answer", "response_time", "created_at"]],
+                         use_container_width=True)
+        store.close()
+    
     # 实验建议
     st.markdown("<br><br>", unsafe_allow_html=True)
     st.markdown("### 💡 实验建议")
@@ -3,8 +3,9 @@
 对比 Buffer Memory 和 Summary Memory 在多轮对话中的表现
 """
 import streamlit as st
-from config import Config
-from langchain_openai import ChatOpenAI
+from llm_factory import get_chat_model
+from token_counter import count_message_tokens, count_tokens
+from history_manager import RollingSummaryMemory
 from langchain_core.messages import HumanMessage, AIMessage
 
 st.set_page_config(page_title="记忆机制实验", page_icon="🧠", layout="wide")
@@ -16,37 +17,8 @@ if 'memory_initialized' not in st.session_state:
     st.session_state.memory_initialized = False
 if 'buffer_history' not in st.session_state:
     st.session_state.buffer_history = []
-if 'summary_history' not in st.session_state:
-    st.session_state.summary_history = []
-if 'summary_text' not in st.session_state:
-    st.session_state.summary_text = ""
-
-
-def count_tokens(text):
-    """简单的token计数（粗略估算）"""
-    chinese_chars = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
-    other_chars = len(text) - chinese_chars
-    return int(chinese_chars / 1.5 + other_chars / 4)
-
-
-def summarize_history(llm, messages):
-    """压缩对话历史为摘要"""
-    if not messages:
-        return ""
-    
-    history_text = "\n".join([
-        f"{'用户' if isinstance(msg, HumanMessage) else 'AI'}: {msg.content}"
-        for msg in messages
-    ])
-    
-    summary_prompt = f"""请将以下对话历史压缩为简洁的摘要，保留关键信息：
-
-{history_text}
-
-摘要："""
-    
-    response = llm.invoke([HumanMessage(content=summary_prompt)])
-    return response.content
+if 'summary_memory' not in st.session_state:
+    st.session_state.summary_memory = None
 
 
 def buffer_memory_chat(llm, user_input, history):
@@ -61,50 +33,25 @@ def buffer_memory_chat(llm, user_input, history):
     return response.content, messages
 
 
-def summary_memory_chat(llm, user_input, history, summary, max_history=4):
-    """Summary Memory: 超出长度后压缩历史"""
-    messages = history.copy()
-    
-    # 如果历史太长，进行摘要
-    if len(messages) > max_history:
-        # 保留最近的消息，其余压缩为摘要
-        old_messages = messages[:-max_history]
-        recent_messages = messages[-max_history:]
-        
-        # 生成新摘要
-        if summary:
-            old_messages = [HumanMessage(content=f"之前的对话摘要：{summary}")] + old_messages
-        
-        new_summary = summarize_history(llm, old_messages)
-        messages = recent_messages
-        summary = new_summary
-    
-    # 添加新的用户输入
-    messages.append(HumanMessage(content=user_input))
-    
-    # 如果有摘要，添加到开头
-    if summary:
-        context_messages = [HumanMessage(content=f"对话历史摘要：{summary}")] + messages
-    else:
-        context_messages = messages
+def summary_memory_chat(llm, user_input, memory):
+    """Summary Memory: 超出长度后在后台把移出的消息增量合并进摘要，不阻塞本轮回复"""
+    # 摘要 + 最近的消息（上一轮的摘要尚未完成时才等待）
+    context_messages = memory.get_messages()
+    context_messages.append(HumanMessage(content=user_input))
     
     response = llm.invoke(context_messages)
     
-    messages.append(AIMessage(content=response.content))
+    memory.add_turn(user_input, response.content)
     
-    return response.content, messages, summary
+    return response.content
 
 
 def initialize_system():
     """初始化LLM"""
     try:
-        llm = ChatOpenAI(
-            model=Config.OPENAI_MODEL,
-            temperature=Config.TEMPERATURE,
-            openai_api_key=Config.OPENAI_API_KEY,
-            openai_api_base=Config.OPENAI_API_BASE
-        )
+        llm = get_chat_model()
         st.session_state.llm = llm
+        st.session_state.summary_memory = RollingSummaryMemory(llm, max_messages=4)
         st.session_state.memory_initialized = True
         return True
     except Exception as e:
@@ -164,14 +111,12 @@ def main():
         if st.button("🔄 重新初始化", use_container_width=True):
             st.session_state.memory_initialized = False
             st.session_state.buffer_history = []
-            st.session_state.summary_history = []
-            st.session_state.summary_text = ""
+            st.session_state.summary_memory = None
             st.rerun()
     with col2:
         if st.button("🗑️ 清除对话历史", use_container_width=True):
             st.session_state.buffer_history = []
-            st.session_state.summary_history = []
-            st.session_state.summary_text = ""
+            st.session_state.summary_memory.clear()
             st.rerun()
     
     st.markdown("<br>", unsafe_allow_html=True)
@@ -212,12 +157,12 @@ def main():
                     """, unsafe_allow_html=True)
         
         # Token统计
-        buffer_tokens = sum(count_tokens(msg.content) for msg in st.session_state.buffer_history)
+        buffer_tokens = count_message_tokens(st.session_state.buffer_history)
         st.markdown(f"""
         <div style="text-align: center; padding: 0.5rem; margin-top: 1rem; 
              background-color: var(--background-hover); border-radius: 8px;">
             <span style="color: var(--text-secondary); font-size: 0.875rem;">
-                📊 约 {buffer_tokens} tokens · {len(st.session_state.buffer_history)} 条消息
+                📊 {buffer_tokens} tokens · {len(st.session_state.buffer_history)} 条消息
             </span>
         </div>
         """, unsafe_allow_html=True)
@@ -233,14 +178,18 @@ def main():
         </div>
         """, unsafe_allow_html=True)
         
+        summary_memory = st.session_state.summary_memory
+        
         # 显示摘要
-        if st.session_state.summary_text:
+        if summary_memory.summarizing:
+            st.caption("⏳ 摘要正在后台更新…")
+        if summary_memory.summary:
             st.markdown(f"""
             <div style="background-color: var(--background-hover); padding: 0.75rem; 
                  border-radius: 12px; margin: 0.5rem 0; border-left: 3px solid var(--primary-color);">
                 <div style="color: var(--text-secondary); font-size: 0.75rem;">📋 历史摘要</div>
                 <div style="color: var(--text-primary); font-size: 0.85rem; font-style: italic;">
-                    {st.session_state.summary_text}
+                    {summary_memory.summary}
                 </div>
             </div>
             """, unsafe_allow_html=True)
@@ -248,7 +197,7 @@ def main():
         # Summary Memory 历史
         summary_container = st.container()
         with summary_container:
-            for msg in st.session_state.summary_history:
+            for msg in summary_memory.messages:
                 if isinstance(msg, HumanMessage):
                     st.markdown(f"""
                     <div style="background-color: var(--background-hover); padding: 0.75rem; 
@@ -267,15 +216,15 @@ def main():
                     """, unsafe_allow_html=True)
         
         # Token统计
-        summary_tokens = sum(count_tokens(msg.content) for msg in st.session_state.summary_history)
-        if st.session_state.summary_text:
-            summary_tokens += count_tokens(st.session_state.summary_text)
+        summary_tokens = count_message_tokens(summary_memory.messages)
+        if summary_memory.summary:
+            summary_tokens += count_tokens(summary_memory.summary)
         
         st.markdown(f"""
         <div style="text-align: center; padding: 0.5rem; margin-top: 1rem; 
              background-color: var(--background-hover); border-radius: 8px;">
             <span style="color: var(--text-secondary); font-size: 0.875rem;">
-                📊 约 {summary_tokens} tokens · {len(st.session_state.summary_history)} 条消息
+                📊 {summary_tokens} tokens · {len(summary_memory.messages)} 条消息
             </span>
         </div>
         """, unsafe_allow_html=True)
@@ -323,15 +272,11 @@ def main():
                 st.session_state.buffer_history = new_buffer_history
                 
                 # Summary Memory
-                summary_response, new_summary_history, new_summary = summary_memory_chat(
+                summary_memory_chat(
                     st.session_state.llm,
                     user_input,
-                    st.session_state.summary_history,
-                    st.session_state.summary_text,
-                    max_history=4
+                    st.session_state.summary_memory
                 )
-                st.session_state.summary_history = new_summary_history
-                st.session_state.summary_text = new_summary
                 
                 st.rerun()
                 
@@ -0,0 +1,192 @@
+"""
+按需性能剖析 - 用采样剖析器包装知识库构建或单次RAG请求，输出折叠栈（flamegraph.pl / speedscope 可直接读取）
+可选tracemalloc内存快照，定位内存热点；按最小间隔限流，可以在生产环境中长期开启
+    PROFILE=cpu|memory|all streamlit run app_gemini.py
+    python init_kb.py --profile all
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+from config import Config
+
+
+PROFILE_MODES = ("off", "cpu", "memory", "all")
+
+# 内存报告中列出的分配位置数
+TOP_ALLOCATIONS = 25
+
+
+class SamplingProfiler:
+    """后台线程按固定间隔采集调用栈，统计每条栈出现的次数（开销与采样间隔成正比，与被测代码无关）"""
+
+    # 初始化 interval: 采样间隔（秒） thread_ids: 只采样这些线程，None表示采样所有线程
+    def __init__(self, interval: float = 0.005, thread_ids: Optional[List[int]] = None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+                self.stacks[self._collapse(frame)] += 1
+            self.samples += 1
+
+    # 把调用栈折叠为 "外层;...;内层" 的一行
+    @staticmethod
+    def _collapse(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    # 写出折叠栈文件（每行 "栈 次数"）
+    def write_collapsed(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """按配置决定是否剖析，并限制两次剖析之间的最小间隔"""
+
+    # 初始化 mode: off/cpu/memory/all，默认Config.PROFILE output_dir: 输出目录 min_interval: 两次剖析的最小间隔（秒）
+    def __init__(self, mode: str = None, output_dir: str = None, min_interval: float = None,
+                 sample_interval: float = None):
+        self.mode = (mode or Config.PROFILE).lower()
+        if self.mode not in PROFILE_MODES:
+            raise ValueError(f"不支持的剖析模式: {self.mode}（可选 {', '.join(PROFILE_MODES)}）")
+        self.output_dir = output_dir or Config.PROFILE_OUTPUT_DIR
+        self.min_interval = Config.PROFILE_MIN_INTERVAL if min_interval is None else min_interval
+        self.sample_interval = sample_interval or Config.PROFILE_SAMPLE_INTERVAL_MS / 1000
+
+        self._lock = threading.Lock()
+        self._active = False
+        self._last_started = 0.0
+        self.skipped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    # 是否可以开始一次剖析：同一时间只剖析一个调用，且距上次开始超过最小间隔
+    def _acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self._active or (self._last_started and now - self._last_started < self.min_interval):
+                self.skipped += 1
+                return False
+            self._active = True
+            self._last_started = now
+            return True
+
+    def _release(self):
+        with self._lock:
+            self._active = False
+
+    # 剖析一段代码，未开启或被限流时直接执行 Args:name: 输出文件名前缀 all_threads: 是否采样所有线程（构建知识库时的线程池） Yields:输出文件路径字典（未剖析时为None）
+    @contextmanager
+    def profile(self, name: str, all_threads: bool = False) -> Iterator[Optional[Dict[str, str]]]:
+        if not self.enabled or not self._acquire():
+            yield None
+            return
+
+        outputs: Dict[str, str] = {}
+        prefix = os.path.join(self.output_dir, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}")
+        cpu = self.mode in ("cpu", "all")
+        memory = self.mode in ("memory", "all")
+
+        sampler = None
+        if cpu:
+            sampler = SamplingProfiler(self.sample_interval, None if all_threads else [threading.get_ident()])
+            sampler.start()
+        # 其他代码已经开启tracemalloc时不重复开启，也不负责关闭
+        started_tracemalloc = memory and not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        try:
+            yield outputs
+        finally:
+            elapsed = time.perf_counter() - start
+            if sampler:
+                sampler.stop()
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                if sampler:
+                    outputs["cpu"] = f"{prefix}.collapsed"
+                    sampler.write_collapsed(outputs["cpu"])
+                if memory:
+                    snapshot = tracemalloc.take_snapshot()
+                    outputs["memory"] = f"{prefix}_memory.txt"
+                    outputs["snapshot"] = f"{prefix}.tracemalloc"
+                    self._write_memory_report(snapshot, outputs["memory"], elapsed)
+                    snapshot.dump(outputs["snapshot"])
+                print(f"🔍 剖析完成 {name}（{elapsed:.2f}s）: {', '.join(outputs.values())}")
+            except OSError as e:
+                print(f"剖析结果写入失败: {e}")
+            finally:
+                if started_tracemalloc:
+                    tracemalloc.stop()
+                self._release()
+
+    @staticmethod
+    def _write_memory_report(snapshot, path: str, elapsed: float):
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        stats = snapshot.statistics("lineno")
+        total = sum(stat.size for stat in stats)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"耗时 {elapsed:.2f}s，剖析期间分配且仍存活的内存 {total / 1024 / 1024:.1f} MB\n\n")
+            for i, stat in enumerate(stats[:TOP_ALLOCATIONS], 1):
+                frame = stat.traceback[0]
+                f.write(f"{i:>3}. {stat.size / 1024:10.1f} KB  {stat.count:>8} 次  {frame.filename}:{frame.lineno}\n")
+
+
+_profiler: Optional[Profiler] = None
+_profiler_lock = threading.Lock()
+
+
+# 获取进程内共享的剖析器
+def get_profiler() -> Profiler:
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = Profiler()
+    return _profiler
+
+
+# 替换共享剖析器（命令行参数覆盖环境变量时使用） Args:mode: 剖析模式 min_interval: 最小间隔
+def configure_profiler(mode: str, min_interval: float = None) -> Profiler:
+    global _profiler
+    with _profiler_lock:
+        _profiler = Profiler(mode=mode, min_interval=min_interval)
+    return _profiler
@@ -1,30 +1,41 @@
+import time
 from typing import List, Dict, Any
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
 from config import Config
+from llm_factory import get_chat_model
 from vector_store_manager import VectorStoreManager
+from context_packer import ContextPacker
+from domain_gate import DomainGate, OFF_DOMAIN_ANSWER
+from history_manager import ChatHistoryManager
+from tracing import activate, get_tracer, span
+from token_counter import count_message_tokens, count_tokens
+from profiling import get_profiler
+from metrics import LLM_TOKENS, RAG_REQUESTS, RAG_REQUEST_SECONDS, RAG_STAGE_SECONDS, RETRIEVAL_DOCUMENTS
 
 
 class RAGChain:
-    def __init__(self, vector_store_manager: VectorStoreManager, retrieval_k: int = None):
+    def __init__(self, vector_store_manager: VectorStoreManager, retrieval_k: int = None,
+                 context_token_budget: int = None):
         """
         Args:
             vector_store_manager: 向量存储管理器
             retrieval_k: 检索文档数量，默认使用Config.RETRIEVAL_K
+            context_token_budget: 上下文Token预算，默认使用Config.CONTEXT_TOKEN_BUDGET，为0时使用固定的retrieval_k
         """
         self.vector_store_manager = vector_store_manager
         self.retrieval_k = retrieval_k or Config.RETRIEVAL_K
         
+        if context_token_budget is None:
+            context_token_budget = Config.CONTEXT_TOKEN_BUDGET
+        
+        # 上下文打包器：从更大的候选池中按Token预算填充上下文
+        self.context_packer = ContextPacker(token_budget=context_token_budget) if context_token_budget > 0 else None
+        
+        # 领域外问题拦截：命中时直接返回固定回复，不调用LLM
+        self.domain_gate = DomainGate(vector_store_manager) if Config.DOMAIN_GATE else None
+        
         # 初始化LLM
-        self.llm = ChatOpenAI(
-            model=Config.OPENAI_MODEL,
-            temperature=Config.TEMPERATURE,
-            openai_api_key=Config.OPENAI_API_KEY,
-            openai_api_base=Config.OPENAI_API_BASE
-        )
+        self.llm = get_chat_model()
         
         # 创建提示模板
         self.system_prompt = """你是一个专业的汽车知识助手。你的任务是根据提供的上下文信息回答用户的问题。
@@ -46,54 +57,147 @@ class RAGChain:
             ("human", "{question}")
         ])
         
-        # 创建检索器（使用自定义k）
-        self.retriever = self.vector_store_manager.get_retriever(k=self.retrieval_k)
+        # 检索数量（启用打包时检索候选池）；查询向量在invoke中只计算一次，领域拦截和检索共用
+        if not self.vector_store_manager.vector_store:
+            raise ValueError("向量存储未初始化")
+        self.search_k = max(Config.RETRIEVAL_CANDIDATE_K, self.retrieval_k) if self.context_packer else self.retrieval_k
         
-        # 对话历史
-        self.chat_history: List[Any] = []
+        # 分阶段耗时追踪（TRACING=off 时为空操作）；流式回答无法在返回值中携带耗时，结束后保存在last_timings
+        self.tracer = get_tracer()
+        self.last_timings: Dict[str, float] = {}
+        # 按需性能剖析（PROFILE=off 时直接执行，开启后按最小间隔抽取请求剖析）
+        self.profiler = get_profiler()
+        
+        # 对话历史：按Token预算限制，超出时在后台折叠进摘要
+        self.history_manager = ChatHistoryManager(self.llm)
+    
+    # 放入提示词的对话历史（摘要 + 最近的消息）
+    @property
+    def chat_history(self) -> List[Any]:
+        return self.history_manager.get_messages()
     
     # 格式化：文档拼接
     def format_docs(self, docs):
         return "\n\n".join(doc.page_content for doc in docs)
     
-    # 调用RAG链回答问题 Args:question: 用户问题 use_history: 是否使用对话历史 Returns:包含答案和上下文的字典
-    def invoke(self, question: str, use_history: bool = True) -> Dict[str, Any]:
-
-        # 检索相关文档
-        retrieved_docs = self.retriever.invoke(question)
-        context = self.format_docs(retrieved_docs)
-        
-        # 准备消息
-        messages = [
-            ("system", self.system_prompt.format(context=context)),
-        ]
-        
-        # 添加历史
-        if use_history and self.chat_history:
-            messages.append(MessagesPlaceholder(variable_name="chat_history"))
-            messages.append(("human", question))
-            prompt = ChatPromptTemplate.from_messages(messages)
-            chain = prompt | self.llm | StrOutputParser()
-            answer = chain.invoke({"chat_history": self.chat_history})
+    # 查询向量化
+    def embed_query(self, question: str) -> List[float]:
+        with span("embed_query"):
+            return self.vector_store_manager.embeddings.embed_query(question)
+    
+    # 检索上下文文档 Args:question: 用户问题 embedding: 已有的查询向量 Returns:放入上下文的文档列表
+    def retrieve_context(self, question: str, embedding: List[float] = None) -> List:
+        if embedding is None:
+            embedding = self.embed_query(question)
+        
+        if Config.ADAPTIVE_RETRIEVAL:
+            docs = self.vector_store_manager.adaptive_search(question, max_k=self.search_k, embedding=embedding)
         else:
+            scored_docs = self.vector_store_manager.similarity_search_with_scores_by_vector(embedding, k=self.search_k)
+            docs = [doc for doc, _ in scored_docs]
+        
+        if self.context_packer:
+            with span("context_pack"):
+                docs = self.context_packer.pack(docs)
+        return docs
+    
+    # 判断问题是否应被拦截（领域外） Args:question: 用户问题 embedding: 已有的查询向量 Returns:是否拦截
+    def is_off_domain(self, question: str, embedding: List[float] = None) -> bool:
+        if self.domain_gate is None:
+            return False
+        with span("domain_gate"):
+            return not self.domain_gate.is_in_domain(question, embedding)
+    
+    # 构建提示词（上下文 + 可选的历史 + 问题） Returns:可直接传给LLM的提示词
+    def build_prompt(self, question: str, docs: List, use_history: bool = True):
+        with span("prompt_build"):
+            context = self.format_docs(docs)
+            messages = [
+                ("system", self.system_prompt.format(context=context)),
+            ]
+            
+            # 添加历史
+            chat_history = self.chat_history if use_history else []
+            if chat_history:
+                messages.append(MessagesPlaceholder(variable_name="chat_history"))
             messages.append(("human", question))
+            
             prompt = ChatPromptTemplate.from_messages(messages)
-            chain = prompt | self.llm | StrOutputParser()
-            answer = chain.invoke({})
+            return prompt.invoke({"chat_history": chat_history} if chat_history else {})
+    
+    # 更新对话历史（超出预算时的摘要在后台进行，不增加本次请求的延迟）
+    def _update_history(self, question: str, answer: str):
+        self.history_manager.add_turn(question, answer)
+    
+    # 记录一次请求的指标 Args:method: invoke/stream status: ok/off_domain/error start: 开始时间 timings: 各阶段耗时（毫秒）
+    def _record_request(self, method: str, status: str, start: float, timings: Dict[str, float] = None):
+        RAG_REQUESTS.inc(method=method, status=status)
+        RAG_REQUEST_SECONDS.observe(time.perf_counter() - start, method=method)
+        for stage, ms in (timings or {}).items():
+            if stage != "total":
+                RAG_STAGE_SECONDS.observe(ms / 1000, stage=stage)
+    
+    # 记录检索文档数和LLM输入/输出Token数
+    def _record_generation(self, docs: List, prompt_value, answer: str):
+        RETRIEVAL_DOCUMENTS.observe(len(docs))
+        LLM_TOKENS.inc(count_message_tokens(prompt_value.to_messages()), direction="input")
+        LLM_TOKENS.inc(count_tokens(answer), direction="output")
+    
+    # 调用RAG链回答问题 Args:question: 用户问题 use_history: 是否使用对话历史 Returns:包含答案、上下文和各阶段耗时（毫秒）的字典
+    def invoke(self, question: str, use_history: bool = True) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            with self.profiler.profile("rag_invoke"):
+                response = self._invoke(question, use_history)
+        except Exception:
+            self._record_request("invoke", "error", start)
+            raise
         
-        # 更新对话历史
-        if use_history:
-            self.chat_history.append(HumanMessage(content=question))
-            self.chat_history.append(AIMessage(content=answer))
+        status = "off_domain" if response["off_domain"] else "ok"
+        self._record_request("invoke", status, start, response["timings"])
+        return response
+    
+    def _invoke(self, question: str, use_history: bool) -> Dict[str, Any]:
+        trace = self.tracer.start_trace("rag.invoke", use_history=use_history)
+        with activate(trace):
+            embedding = self.embed_query(question)
+            
+            # 领域外问题直接返回固定回复
+            if self.is_off_domain(question, embedding):
+                if use_history:
+                    self._update_history(question, OFF_DOMAIN_ANSWER)
+                return {
+                    "answer": OFF_DOMAIN_ANSWER,
+                    "context": [],
+                    "input": question,
+                    "off_domain": True,
+                    "timings": self.tracer.end_trace(trace)
+                }
             
-            # 限制历史长度（保留最近10轮对话）
-            if len(self.chat_history) > 20:
-                self.chat_history = self.chat_history[-20:]
+            # 检索相关文档
+            retrieved_docs = self.retrieve_context(question, embedding)
+            prompt_value = self.build_prompt(question, retrieved_docs, use_history)
+            
+            # 内部以流式调用LLM，分开统计首Token时间和剩余生成时间
+            with span("llm_ttft"):
+                response = self.llm.stream(prompt_value)
+                first_chunk = next(response, None)
+            with span("llm_generation"):
+                parts = [first_chunk.content] if first_chunk is not None else []
+                parts.extend(chunk.content for chunk in response)
+            answer = "".join(parts)
+            self._record_generation(retrieved_docs, prompt_value, answer)
+            
+            # 更新对话历史
+            if use_history:
+                self._update_history(question, answer)
         
         return {
             "answer": answer,
             "context": retrieved_docs,
-            "input": question
+            "input": question,
+            "off_domain": False,
+            "timings": self.tracer.end_trace(trace)
         }
     
     # 获取问题答案 Args:question: 用户问题 Returns:答案字符串
@@ -113,47 +217,55 @@ class RAGChain:
     
     # 清除对话历史
     def clear_history(self):
-        self.chat_history = []
+        self.history_manager.clear()
         print("对话历史已清除")
     
-    # 流式回答问题 Args:question: 用户问题 Yields:答案片段
-    def stream_answer(self, question: str):
-        # 获取相关文档
-        docs = self.retriever.invoke(question)
-        
-        # 准备上下文
-        context = self.format_docs(docs)
-        
-        # 准备消息
-        messages = [
-            ("system", self.system_prompt.format(context=context)),
-        ]
-        
-        if self.chat_history:
-            messages.append(MessagesPlaceholder(variable_name="chat_history"))
-            
-        messages.append(("human", question))
+    # 流式回答问题 Args:question: 用户问题 use_history: 是否使用对话历史 Yields:答案片段
+    def stream_answer(self, question: str, use_history: bool = True):
+        start = time.perf_counter()
+        try:
+            yield from self._stream_answer(question, start, use_history)
+        except Exception:
+            self._record_request("stream", "error", start)
+            raise
+    
+    def _stream_answer(self, question: str, start: float, use_history: bool = True):
+        trace = self.tracer.start_trace("rag.stream", use_history=use_history)
+        # 只在不跨yield的代码段激活追踪，避免生成器挂起期间影响调用方的上下文
+        with activate(trace):
+            embedding = self.embed_query(question)
+            off_domain = self.is_off_domain(question, embedding)
+            if not off_domain:
+                docs = self.retrieve_context(question, embedding)
+                prompt_value = self.build_prompt(question, docs, use_history)
         
-        prompt = ChatPromptTemplate.from_messages(messages)
+        # 领域外问题直接返回固定回复
+        if off_domain:
+            if use_history:
+                self._update_history(question, OFF_DOMAIN_ANSWER)
+            self.last_timings = self.tracer.end_trace(trace)
+            self._record_request("stream", "off_domain", start, self.last_timings)
+            yield OFF_DOMAIN_ANSWER
+            return
         
         # 流式生成
-        chain = prompt | self.llm
-        
-        if self.chat_history:
-            response = chain.stream({"chat_history": self.chat_history})
-        else:
-            response = chain.stream({})
-        
+        llm_start = trace.now_ns() if trace else None
+        first_token_at = None
         full_answer = ""
-        for chunk in response:
-            if hasattr(chunk, 'content'):
-                content = chunk.content
-                full_answer += content
-                yield content
+        for chunk in self.llm.stream(prompt_value):
+            if trace and first_token_at is None:
+                first_token_at = trace.now_ns()
+                trace.record("llm_ttft", llm_start, first_token_at)
+            content = chunk.content
+            full_answer += content
+            yield content
         
-        # 更新历史
-        self.chat_history.append(HumanMessage(content=question))
-        self.chat_history.append(AIMessage(content=full_answer))
+        if trace:
+            trace.record("llm_generation", first_token_at or llm_start, trace.now_ns())
+        self._record_generation(docs, prompt_value, full_answer)
+        self.last_timings = self.tracer.end_trace(trace)
+        self._record_request("stream", "ok", start, self.last_timings)
         
-        if len(self.chat_history) > 20:
-            self.chat_history = self.chat_history[-20:]
+        # 更新历史
+        if use_history:
+            self._update_history(question, full_answer)
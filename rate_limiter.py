@@ -0,0 +1,175 @@
+"""
+令牌桶限流器 - 按服务商配额（每分钟请求数、每分钟Token数）调度并发的LLM调用
+收到429时根据 Retry-After 或指数退避暂停所有线程，连续成功后恢复；
+5xx、超时、连接错误等瞬时故障只让当前调用退避重试（调用方关闭了SDK内部重试时由这里接管）
+"""
+import random
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+from config import Config
+
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """容量为capacity、每秒补充refill_rate的令牌桶（线程安全）"""
+
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_rate)
+        self._updated = now
+
+    # 尝试取出令牌 Returns:需要等待的秒数，0表示已取出
+    def try_acquire(self, amount: float) -> float:
+        # 单次请求超过桶容量时按容量计，避免永远等不到
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.refill_rate
+
+    # 按实际用量修正（预估偏高时退还，偏低时补扣，余额可以为负）
+    def adjust(self, amount: float):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class RateLimiter:
+    """请求数和Token数两个令牌桶，加上429自适应退避"""
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None,
+                 max_backoff: float = 60.0):
+        requests_per_minute = requests_per_minute or Config.LLM_REQUESTS_PER_MINUTE
+        tokens_per_minute = tokens_per_minute or Config.LLM_TOKENS_PER_MINUTE
+        self.request_bucket = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.token_bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._consecutive_429 = 0
+        self.stats = {"requests": 0, "rate_limited": 0, "transient_errors": 0, "waited_seconds": 0.0}
+
+    # 阻塞直到配额允许发送请求 Args:estimated_tokens: 预估的输入+输出Token数
+    def acquire(self, estimated_tokens: int = 0):
+        while True:
+            with self._lock:
+                pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                self._sleep(pause)
+                continue
+
+            wait = self.request_bucket.try_acquire(1)
+            if wait > 0:
+                self._sleep(wait)
+                continue
+
+            wait = self.token_bucket.try_acquire(estimated_tokens)
+            if wait > 0:
+                # 退还请求令牌，等Token配额够了再一起取
+                self.request_bucket.adjust(1)
+                self._sleep(wait)
+                continue
+            return
+
+    def _sleep(self, seconds: float):
+        with self._lock:
+            self.stats["waited_seconds"] += seconds
+        time.sleep(seconds)
+
+    # 请求成功后调用 Args:estimated_tokens: acquire时的预估 actual_tokens: 实际用量（未知时传None）
+    def record_success(self, estimated_tokens: int = 0, actual_tokens: Optional[int] = None):
+        if actual_tokens is not None:
+            self.token_bucket.adjust(estimated_tokens - actual_tokens)
+        with self._lock:
+            self.stats["requests"] += 1
+            self._consecutive_429 = 0
+
+    # 收到429后暂停所有调用方 Args:retry_after: 服务端给出的等待秒数 Returns:暂停秒数
+    def record_rate_limited(self, retry_after: Optional[float] = None) -> float:
+        with self._lock:
+            self._consecutive_429 += 1
+            self.stats["rate_limited"] += 1
+            if retry_after is None:
+                # 指数退避加抖动，避免所有线程同时重试
+                retry_after = min(self.max_backoff, 2 ** self._consecutive_429) * random.uniform(0.5, 1.0)
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            return retry_after
+
+    # 瞬时故障后当前调用的退避时间（不影响其他线程） Args:attempt: 第几次重试（从1开始） retry_after: 服务端给出的等待秒数 Returns:退避秒数
+    def record_transient_error(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        with self._lock:
+            self.stats["transient_errors"] += 1
+        if retry_after is None:
+            retry_after = min(self.max_backoff, 2 ** attempt) * random.uniform(0.5, 1.0)
+        return retry_after
+
+    # 在限流下调用函数，429时暂停所有调用方后重试，瞬时故障时当前调用退避重试 Args:fn: 调用函数 estimated_tokens: 预估Token数 usage: 从返回值取实际Token数 max_retries: 最多重试次数
+    def call(self, fn: Callable[[], T], estimated_tokens: int = 0,
+             usage: Callable[[T], Optional[int]] = None, max_retries: int = 5) -> T:
+        for attempt in range(max_retries + 1):
+            self.acquire(estimated_tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                if attempt < max_retries and is_rate_limit_error(e):
+                    wait = self.record_rate_limited(retry_after_seconds(e))
+                    print(f"  ⏳ 触发限流(429)，{wait:.1f}s 后重试（第{attempt + 1}次）")
+                    continue
+                if attempt < max_retries and is_transient_error(e):
+                    # 失败的请求仍然占用了配额，不退还令牌
+                    wait = self.record_transient_error(attempt + 1, retry_after_seconds(e))
+                    print(f"  ⚠️ 瞬时错误({type(e).__name__})，{wait:.1f}s 后重试（第{attempt + 1}次）")
+                    self._sleep(wait)
+                    continue
+                raise
+            self.record_success(estimated_tokens, usage(result) if usage else None)
+            return result
+
+
+# 是否为429限流错误（openai.RateLimitError 或带429状态码的HTTP错误）
+def is_rate_limit_error(error: Exception) -> bool:
+    if type(error).__name__ == "RateLimitError":
+        return True
+    return getattr(error, "status_code", None) == 429
+
+
+# 瞬时错误的类型名（openai / httpx，按名称判断以免导入SDK）
+TRANSIENT_ERROR_NAMES = {
+    "APITimeoutError", "APIConnectionError", "InternalServerError",
+    "TimeoutException", "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout",
+    "ConnectError", "ReadError", "WriteError", "RemoteProtocolError",
+}
+
+
+# 是否为可重试的瞬时错误（5xx、超时、连接错误）
+def is_transient_error(error: Exception) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in TRANSIENT_ERROR_NAMES:
+        return True
+    status_code = getattr(error, "status_code", None)
+    return isinstance(status_code, int) and status_code >= 500
+
+
+# 从错误响应的 Retry-After 头读取等待秒数
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,228 @@
+"""
+进程级资源注册表 - 在所有Streamlit会话和线程之间共享Embedding模型和已加载的向量索引
+每个会话只需保存自己的对话历史，模型和索引在进程内只加载一次；加载按资源分别加锁，慢的加载不会阻塞其他资源
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from config import Config
+from batching_embeddings import MicroBatchingEmbeddings
+from metrics import record_cache
+
+
+# 保护注册表字典的全局锁，只在读写字典时短暂持有
+_lock = threading.RLock()
+# 每个资源一把加载锁：同一资源的首个请求负责加载，并发请求等待后直接复用；不同资源互不阻塞
+_load_locks: Dict[Tuple, threading.Lock] = {}
+# 每次清除索引缓存时递增，加载期间被清除的索引不再登记
+_vector_store_generation = 0
+_embeddings: Dict[Tuple, Embeddings] = {}
+_vector_store_managers: Dict[Tuple, object] = {}
+# 实验页面按分块大小建立的临时索引（LRU，容量为Config.CHUNK_INDEX_CACHE_SIZE）和已解析的PDF页面
+_chunk_size_indexes: "OrderedDict[Tuple, Tuple[object, List]]" = OrderedDict()
+_parsed_pages: Dict[str, List] = {}
+# 正在后台构建的分块大小索引：键 → 构建状态（线程、进度、耗时、错误），其他会话请求同一索引时加入已有构建
+_chunk_size_builds: Dict[Tuple, Dict] = {}
+
+
+# 获取资源的加载锁 Args:key: 资源键 Returns:同一资源共用的锁
+def _load_lock(key: Tuple) -> threading.Lock:
+    with _lock:
+        return _load_locks.setdefault(key, threading.Lock())
+
+
+# 获取共享的Embedding模型 Args:model_name: 远程Embedding模型名称（本地模型使用Config.LOCAL_EMBEDDING_MODEL） use_server: 是否通过共享的Embedding服务，默认取决于Config.EMBEDDING_SERVER_URL Returns:Embeddings对象
+def get_embeddings(model_name: str = None, use_server: bool = None) -> Embeddings:
+    use_server = bool(Config.EMBEDDING_SERVER_URL) if use_server is None else use_server
+    if use_server:
+        # 服务端按与本进程相同的规则选择模型，不一致时在首次连接时报错
+        expected_model = Config.LOCAL_EMBEDDING_MODEL if Config.USE_LOCAL_EMBEDDING else model_name or Config.EMBEDDING_MODEL
+        key = ("server", Config.EMBEDDING_SERVER_URL, expected_model)
+    elif Config.USE_LOCAL_EMBEDDING:
+        key = ("local", Config.LOCAL_EMBEDDING_MODEL, Config.EMBEDDING_DEVICE)
+    else:
+        key = ("remote", model_name or Config.EMBEDDING_MODEL, Config.OPENAI_API_BASE)
+
+    with _lock:
+        if key in _embeddings:
+            return _embeddings[key]
+
+    # 模型加载耗时数秒，只持有该模型的加载锁，其他模型和索引的请求不受影响
+    with _load_lock(("embeddings",) + key):
+        with _lock:
+            if key in _embeddings:
+                return _embeddings[key]
+
+        embeddings = _create_embeddings(key, use_server)
+        with _lock:
+            _embeddings[key] = embeddings
+        return embeddings
+
+
+# 创建Embedding模型（由get_embeddings在该模型的加载锁内调用）
+def _create_embeddings(key: Tuple, use_server: bool) -> Embeddings:
+    # 模型由 embedding_server.py 进程加载，本进程只保留HTTP客户端（合批在服务端进行）
+    if use_server:
+        from embedding_client import EmbeddingServiceClient
+        print(f"使用共享 Embedding 服务: {Config.EMBEDDING_SERVER_URL}")
+        embeddings = EmbeddingServiceClient(Config.EMBEDDING_SERVER_URL, expected_model=key[2])
+        # 立即检查服务端模型，不一致时不缓存客户端
+        embeddings.ensure_compatible()
+        return embeddings
+
+    # 只导入实际使用的后端：HuggingFace会连带加载torch，导入就要数秒
+    if Config.USE_LOCAL_EMBEDDING:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        print(f"使用本地 Embedding 模型: {Config.LOCAL_EMBEDDING_MODEL}")
+        print(f"使用设备: {Config.EMBEDDING_DEVICE}")
+        embeddings = HuggingFaceEmbeddings(
+            model_name=Config.LOCAL_EMBEDDING_MODEL,
+            model_kwargs={'device': Config.EMBEDDING_DEVICE},
+            encode_kwargs={'normalize_embeddings': True}
+        )
+    else:
+        from langchain_openai import OpenAIEmbeddings
+        print(f"使用远程 Embedding 模型: {key[1]}")
+        embeddings = OpenAIEmbeddings(
+            model=key[1],
+            openai_api_key=Config.OPENAI_API_KEY,
+            openai_api_base=Config.OPENAI_API_BASE
+        )
+
+    # 并发查询合批编码（对远程模型同样可以减少请求数）
+    if Config.EMBEDDING_MICRO_BATCH:
+        embeddings = MicroBatchingEmbeddings(embeddings)
+    return embeddings
+
+
+# 获取共享的、已加载索引的向量存储管理器 Args:store_type: 向量存储类型 persist_directory: 持久化目录 Returns:管理器，磁盘上没有索引时返回None
+def get_vector_store_manager(store_type: str = None, persist_directory: str = None):
+    # 延迟导入，避免与vector_store_manager循环依赖
+    from vector_store_manager import VectorStoreManager
+
+    key = (store_type or Config.VECTOR_STORE_TYPE, persist_directory or Config.VECTOR_STORE_PATH)
+
+    with _lock:
+        if key in _vector_store_managers:
+            return _vector_store_managers[key]
+
+    with _load_lock(("vector_store",) + key):
+        with _lock:
+            if key in _vector_store_managers:
+                return _vector_store_managers[key]
+            generation = _vector_store_generation
+
+        manager = VectorStoreManager(store_type=key[0], persist_directory=key[1])
+        if manager.load_vector_store() is None:
+            return None
+
+        with _lock:
+            # 加载期间索引被重建并清除缓存时，本次加载的可能是旧索引，只返回给调用方而不登记
+            if generation == _vector_store_generation:
+                _vector_store_managers[key] = manager
+        return manager
+
+
+# 注册新建的向量存储管理器（例如首次创建索引后），供其他会话复用
+def register_vector_store_manager(manager) -> None:
+    key = (manager.store_type, manager.persist_directory)
+    with _lock:
+        _vector_store_managers[key] = manager
+
+
+# 移除已缓存的索引（重建索引后调用），Embedding模型保持加载 Args:store_type/persist_directory: 为空时清除全部索引
+def invalidate_vector_store(store_type: str = None, persist_directory: str = None) -> None:
+    global _vector_store_generation
+    with _lock:
+        _vector_store_generation += 1
+        if store_type is None and persist_directory is None:
+            _vector_store_managers.clear()
+            return
+
+        key = (store_type or Config.VECTOR_STORE_TYPE, persist_directory or Config.VECTOR_STORE_PATH)
+        _vector_store_managers.pop(key, None)
+
+
+# 是否已有可复用的索引 Returns:是否已加载
+def is_vector_store_loaded(store_type: str = None, persist_directory: str = None) -> bool:
+    key = (store_type or Config.VECTOR_STORE_TYPE, persist_directory or Config.VECTOR_STORE_PATH)
+    with _lock:
+        return key in _vector_store_managers
+
+
+# 获取已解析的PDF页面（同一文件只解析一次） Args:pdf_path: PDF路径 Returns:页面文档列表
+def get_parsed_pages(pdf_path: str = None) -> List:
+    from document_processor import DocumentProcessor
+
+    pdf_path = pdf_path or Config.KNOWLEDGE_BASE_PATH
+    with _lock:
+        if pdf_path in _parsed_pages:
+            return _parsed_pages[pdf_path]
+
+    with _load_lock(("parsed_pages", pdf_path)):
+        with _lock:
+            if pdf_path in _parsed_pages:
+                return _parsed_pages[pdf_path]
+
+        pages = DocumentProcessor().load_pdf(pdf_path)
+        with _lock:
+            _parsed_pages[pdf_path] = pages
+        return pages
+
+
+def _chunk_size_index_key(chunk_size: int, chunk_overlap: int) -> Tuple:
+    embedding_model = Config.LOCAL_EMBEDDING_MODEL if Config.USE_LOCAL_EMBEDDING else Config.EMBEDDING_MODEL
+    return (chunk_size, chunk_overlap, Config.KNOWLEDGE_BASE_PATH, embedding_model)
+
+
+# 获取已建好的分块大小索引 Returns:(向量存储管理器, 文本块)，未缓存时返回None
+def get_chunk_size_index(chunk_size: int, chunk_overlap: int) -> Optional[Tuple[object, List]]:
+    key = _chunk_size_index_key(chunk_size, chunk_overlap)
+    with _lock:
+        if key not in _chunk_size_indexes:
+            record_cache("chunk_size_index", misses=1)
+            return None
+        record_cache("chunk_size_index", hits=1)
+        _chunk_size_indexes.move_to_end(key)
+        return _chunk_size_indexes[key]
+
+
+# 缓存新建的分块大小索引，超过容量时淘汰最久未使用的
+def register_chunk_size_index(chunk_size: int, chunk_overlap: int, manager, splits: List) -> None:
+    key = _chunk_size_index_key(chunk_size, chunk_overlap)
+    with _lock:
+        _chunk_size_indexes[key] = (manager, splits)
+        _chunk_size_indexes.move_to_end(key)
+        while len(_chunk_size_indexes) > Config.CHUNK_INDEX_CACHE_SIZE:
+            _chunk_size_indexes.popitem(last=False)
+
+
+# 在后台线程中构建分块大小索引，同一索引正在构建时返回已有的构建状态而不重复构建 Args:build_fn: 接收构建状态字典、返回(管理器, 文本块)的函数，可通过state.update(done=, total=)汇报进度 Returns:构建状态（含thread、done、total、seconds、error），索引已缓存时返回None
+def start_chunk_size_index_build(chunk_size: int, chunk_overlap: int, build_fn: Callable[[Dict], Tuple[object, List]]) -> Optional[Dict]:
+    key = _chunk_size_index_key(chunk_size, chunk_overlap)
+    with _lock:
+        if key in _chunk_size_indexes:
+            return None
+        if key in _chunk_size_builds:
+            return _chunk_size_builds[key]
+
+        state = {"done": 0, "total": 0, "seconds": 0.0, "error": None}
+
+        def run():
+            start = time.time()
+            try:
+                manager, splits = build_fn(state)
+                register_chunk_size_index(chunk_size, chunk_overlap, manager, splits)
+            except Exception as e:
+                state["error"] = str(e)
+            state["seconds"] = time.time() - start
+            # 先登记索引再移除构建记录，其他会话总能看到其中之一
+            with _lock:
+                _chunk_size_builds.pop(key, None)
+
+        state["thread"] = threading.Thread(target=run, daemon=True, name=f"chunk-index-{chunk_size}")
+        _chunk_size_builds[key] = state
+        state["thread"].start()
+        return state
@@ -0,0 +1,108 @@
+"""
+实验结果库 - 每完成一个问题就写入一行（SQLite），键为 (实验名, 配置哈希, 问题)
+实验中断后重跑会跳过已完成的问题，Streamlit 实验页面也可以直接查询同一个库
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+import pandas as pd
+from config import Config
+
+
+# 配置字典的稳定哈希（键顺序无关）
+def config_hash(config: Dict[str, Any]) -> str:
+    payload = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+class ResultsStore:
+    """线程安全的实验结果库，并行实验的多个工作线程可以共用一个实例"""
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or Config.RESULTS_DB_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # WAL模式下Streamlit页面读取时不会阻塞正在写入的实验
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                experiment TEXT NOT NULL,
+                config_hash TEXT NOT NULL,
+                question TEXT NOT NULL,
+                config TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (experiment, config_hash, question)
+            )
+        """)
+        self._conn.commit()
+
+    # 已完成的问题 Args:experiment: 实验名 config: 实验配置 Returns:问题集合
+    def completed_questions(self, experiment: str, config: Dict[str, Any]) -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question FROM results WHERE experiment = ? AND config_hash = ?",
+                (experiment, config_hash(config))
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    # 保存单个问题的结果，立即提交（同一键重复写入时覆盖）
+    def save_result(self, experiment: str, config: Dict[str, Any], question: str, result: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (experiment, config_hash(config), question,
+                 json.dumps(config, sort_keys=True, ensure_ascii=False, default=str),
+                 json.dumps(result, ensure_ascii=False, default=str),
+                 datetime.now().isoformat(timespec="seconds"))
+            )
+            self._conn.commit()
+
+    # 查询结果 Args:experiment: 实验名（None表示全部） config: 只返回该配置的结果 Returns:每行一个问题，展开result字段
+    def load_results(self, experiment: str = None, config: Dict[str, Any] = None) -> pd.DataFrame:
+        query = "SELECT experiment, config_hash, question, result, created_at FROM results WHERE 1 = 1"
+        params: List[Any] = []
+        if experiment:
+            query += " AND experiment = ?"
+            params.append(experiment)
+        if config is not None:
+            query += " AND config_hash = ?"
+            params.append(config_hash(config))
+        query += " ORDER BY created_at"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        records = []
+        for experiment_name, hash_value, question, result, created_at in rows:
+            record = {"experiment": experiment_name, "config_hash": hash_value, "question": question}
+            record.update(json.loads(result))
+            record["created_at"] = created_at
+            records.append(record)
+        return pd.DataFrame(records)
+
+    # 实验列表及每个配置的完成数量
+    def list_experiments(self) -> pd.DataFrame:
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT experiment, config_hash, config, COUNT(*), MAX(created_at)
+                FROM results GROUP BY experiment, config_hash ORDER BY MAX(created_at) DESC
+            """).fetchall()
+        return pd.DataFrame(rows, columns=["experiment", "config_hash", "config", "questions", "last_updated"])
+
+    # 删除结果，强制重跑 Args:experiment: 实验名 config: 只删除该配置（None表示该实验全部）
+    def clear(self, experiment: str, config: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            if config is None:
+                self._conn.execute("DELETE FROM results WHERE experiment = ?", (experiment,))
+            else:
+                self._conn.execute("DELETE FROM results WHERE experiment = ? AND config_hash = ?",
+                                   (experiment, config_hash(config)))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,84 @@
+"""
+测试脚本 - 测试上下文打包在预算边界上的行为（句子边界截断、超出预算的首个文档）
+"""
+import sys
+from langchain_core.documents import Document
+from context_packer import ContextPacker
+
+
+def test_sentence_truncation():
+    """预算放不下第二个文档时，在句子边界截断后放入"""
+    print("=" * 60)
+    print("✂️  测试句子边界截断")
+    print("=" * 60)
+
+    packer = ContextPacker(token_budget=60)
+    first = Document(page_content="座椅加热按钮位于中控台。按下一次为低档。", metadata={"page": 1})
+    second = Document(page_content="按下两次为高档。" * 30, metadata={"page": 2})
+    packed = packer.pack([first, second])
+
+    print(f"\n打包结果: {[doc.page_content[:20] for doc in packed]}")
+    if len(packed) != 2 or not packed[1].metadata.get("truncated"):
+        print("❌ 第二个文档没有被截断放入")
+        return False
+    if not packed[1].page_content.endswith("。"):
+        print("❌ 截断位置不在句子边界")
+        return False
+
+    print("✅ 句子边界截断测试通过！")
+    return True
+
+
+def test_oversize_first_document():
+    """排名第一的文档超出预算且没有句子边界时，按Token硬截断而不是返回空上下文"""
+    print("\n" + "=" * 60)
+    print("📏 测试超出预算的首个文档")
+    print("=" * 60)
+
+    budget = 50
+    packer = ContextPacker(token_budget=budget)
+    # 长表格行：没有句号和换行
+    table = Document(page_content=" | ".join(f"型号{i} 电池容量 {60 + i}.5kWh" for i in range(200)),
+                     metadata={"page": 7})
+    other = Document(page_content="这是另一个较短的文档。", metadata={"page": 8})
+    packed = packer.pack([table, other])
+
+    if not packed:
+        print("❌ 上下文为空")
+        return False
+    tokens = packer.count_tokens(packed[0].page_content)
+    print(f"\n首个文档截断为 {tokens} 个Token（预算 {budget}）")
+    if packed[0].metadata.get("page") != 7 or not packed[0].metadata.get("truncated"):
+        print("❌ 没有保留排名第一的文档")
+        return False
+    if tokens > budget:
+        print("❌ 截断后超出预算")
+        return False
+
+    # 非首个文档仍然只在句子边界截断，没有边界时不放入
+    packed = packer.pack([other, table])
+    if len(packed) != 1:
+        print("❌ 非首个文档在没有句子边界时被硬截断放入")
+        return False
+
+    print("✅ 超出预算的首个文档测试通过！")
+    return True
+
+
+def main():
+    """主函数"""
+    print("\n📦 上下文打包 - 测试工具\n")
+
+    if not test_sentence_truncation():
+        sys.exit(1)
+
+    if not test_oversize_first_document():
+        sys.exit(1)
+
+    print("\n" + "=" * 60)
+    print("🎉 所有测试通过！")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
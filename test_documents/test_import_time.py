@@ -0,0 +1,117 @@
+"""
+测试脚本 - 入口模块的导入耗时，防止重量级后端（torch、HuggingFace、OpenAI SDK、FAISS/Chroma、PDF解析）重新回到导入阶段
+每个模块在独立的子进程中导入，结果不受当前进程已导入模块的影响
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 导入耗时预算（秒，子进程冷启动，含解释器启动时间）
+IMPORT_BUDGETS = {
+    "main": 0.5,
+    "config": 0.5,
+    "init_kb": 3.0,
+    "document_processor": 3.0,
+    "vector_store_manager": 3.0,
+    "resource_registry": 3.0,
+    "llm_factory": 1.5,
+    "rag_chain": 3.0,
+}
+
+# 只应在首次使用时加载的后端
+HEAVY_MODULES = [
+    "torch",
+    "sentence_transformers",
+    "langchain_huggingface",
+    "langchain_openai",
+    "openai",
+    "langchain_community",
+    "faiss",
+    "chromadb",
+    "pypdf",
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+# 在子进程中导入模块 Returns:(进程总耗时, 导入耗时, 已加载的重量级模块, 自身耗时最多的模块) 导入失败时抛出RuntimeError
+def measure_import(module):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "未知错误"
+        raise RuntimeError(error)
+
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+
+    # -X importtime 输出格式: "import time: self [us] | cumulative | imported package"
+    slowest = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        slowest.append((int(self_us), name.strip()))
+    slowest.sort(reverse=True)
+
+    return wall, probe["elapsed"], probe["heavy"], slowest[:3]
+
+
+def test_import_time():
+    """逐个入口模块测量冷启动导入耗时"""
+    print("=" * 60)
+    print("⏱️  测试入口模块导入耗时")
+    print("=" * 60)
+
+    passed = True
+    print(f"\n{'模块':<24}{'导入(s)':>9}{'预算(s)':>9}  自身耗时最多的模块")
+    for module, budget in IMPORT_BUDGETS.items():
+        try:
+            wall, elapsed, heavy, slowest = measure_import(module)
+        except RuntimeError as e:
+            print(f"{module:<24}❌ 导入失败: {e}")
+            passed = False
+            continue
+
+        top = ", ".join(f"{name} {us / 1000:.0f}ms" for us, name in slowest)
+        print(f"{module:<24}{elapsed:>9.2f}{budget:>9.2f}  {top}")
+
+        if heavy:
+            print(f"   ❌ 导入时加载了重量级后端: {', '.join(heavy)}")
+            passed = False
+        if wall > budget:
+            print(f"   ❌ 超出导入预算（进程总耗时 {wall:.2f}s）")
+            passed = False
+
+    if passed:
+        print("\n✅ 导入耗时测试通过！")
+    return passed
+
+
+def main():
+    """主函数"""
+    print("\n🚀 启动速度 - 测试工具\n")
+
+    if not test_import_time():
+        sys.exit(1)
+
+    print("\n" + "=" * 60)
+    print("🎉 所有测试通过！")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,10 @@
 测试脚本 - 测试RAG系统的基本功能
 """
 import json
+import sys
 from config import Config
-from vector_store_manager import VectorStoreManager
 from rag_chain import RAGChain
+from resource_registry import get_vector_store_manager
 
 
 def test_basic_qa():
@@ -17,10 +18,10 @@ def test_basic_qa():
         # 验证配置
         Config.validate()
         
-        # 加载向量存储
+        # 加载向量存储（进程内共享，main.py worker 模式下已预先加载）
         print("\n📚 加载向量存储...")
-        vector_store_manager = VectorStoreManager()
-        if not vector_store_manager.load_vector_store():
+        vector_store_manager = get_vector_store_manager()
+        if vector_store_manager is None:
             print("❌ 请先运行 python init_kb.py 初始化知识库")
             return False
         
@@ -77,8 +78,8 @@ def test_retrieval():
     
     try:
         # 加载向量存储
-        vector_store_manager = VectorStoreManager()
-        if not vector_store_manager.load_vector_store():
+        vector_store_manager = get_vector_store_manager()
+        if vector_store_manager is None:
             print("❌ 请先运行 python init_kb.py 初始化知识库")
             return False
         
@@ -96,6 +97,16 @@ def test_retrieval():
             print(f"  元数据: {doc.metadata}")
             print()
         
+        # 按已有查询向量检索（只用公开接口自行换算相关性分数）应与按文本检索的分数一致
+        embedding = vector_store_manager.embeddings.embed_query(test_query)
+        by_text = vector_store_manager.similarity_search_with_scores(test_query, k=3)
+        by_vector = vector_store_manager.similarity_search_with_scores_by_vector(embedding, k=3)
+        for (doc_a, score_a), (doc_b, score_b) in zip(by_text, by_vector):
+            if doc_a.page_content != doc_b.page_content or abs(score_a - score_b) > 1e-4:
+                print(f"❌ 按向量检索的结果与按文本检索不一致: {score_a:.4f} vs {score_b:.4f}")
+                return False
+        print("✅ 按向量检索的相关性分数与按文本检索一致")
+        
         print("✅ 检索测试完成！")
         return True
         
@@ -112,11 +123,11 @@ def main():
     
     # 测试检索
     if not test_retrieval():
-        return
+        sys.exit(1)
     
     # 测试问答
     if not test_basic_qa():
-        return
+        sys.exit(1)
     
     print("\n" + "=" * 60)
     print("🎉 所有测试通过！")
@@ -0,0 +1,143 @@
+"""
+测试脚本 - 测试共享Token计数模块的准确性和速度
+"""
+import time
+import tiktoken
+from langchain_core.messages import HumanMessage, AIMessage
+from config import Config
+import token_counter
+from token_counter import count_message_tokens, count_tokens, count_tokens_batch, get_encoding
+
+
+# 原来的启发式估算（中文约1.5字符/token，其他约4字符/token），用于对比
+def heuristic_count_tokens(text):
+    chinese_chars = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
+    other_chars = len(text) - chinese_chars
+    return int(chinese_chars / 1.5 + other_chars / 4)
+
+
+SAMPLE_TEXTS = [
+    "如何通过中央显示屏进行副驾驶员座椅设置？",
+    "Press and hold the button for 3 seconds to reset the trip meter.",
+    "按下 AUTO 按钮后，空调系统会根据车内温度自动调节风量（1-7档）。",
+    "特殊标记 <|endoftext|> 也应按普通文本计数",
+    "",
+    "🚗 电池容量 82.56 kWh，CLTC续航 650 km。",
+]
+
+
+def build_history(turns=200):
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"第{i}轮：请问中央显示屏的日间和夜间模式如何自动切换？" * 5))
+        messages.append(AIMessage(content=f"在自动模式下，系统会根据环境光线传感器自动切换（第{i}轮回答）。" * 10))
+    return messages
+
+
+def test_accuracy():
+    """与tiktoken直接编码的结果逐条比对"""
+    print("=" * 60)
+    print("🎯 测试计数准确性")
+    print("=" * 60)
+
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(Config.OPENAI_MODEL)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        print(f"\n模型: {Config.OPENAI_MODEL}  编码: {encoding.name}")
+
+        expected = [len(encoding.encode(text, disallowed_special=())) for text in SAMPLE_TEXTS]
+        single = [count_tokens(text) for text in SAMPLE_TEXTS]
+        batch = count_tokens_batch(SAMPLE_TEXTS)
+
+        print(f"\n{'tiktoken':>9}{'单条':>6}{'批量':>6}{'旧估算':>8}  文本")
+        for text, e, s, b in zip(SAMPLE_TEXTS, expected, single, batch):
+            print(f"{e:>9}{s:>8}{b:>8}{heuristic_count_tokens(text):>10}  {text[:30]}")
+
+        if single != expected or batch != expected:
+            print("❌ 计数与tiktoken不一致")
+            return False
+
+        messages = build_history(turns=5)
+        if count_message_tokens(messages) != sum(len(encoding.encode(m.content)) for m in messages):
+            print("❌ 消息列表计数不一致")
+            return False
+
+        if get_encoding("unknown-model-name").name != "cl100k_base":
+            print("❌ 未知模型没有回退到cl100k_base")
+            return False
+
+        print("\n✅ 准确性测试通过！")
+        return True
+
+    except Exception as e:
+        print(f"❌ 准确性测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_speed():
+    """长对话历史：旧的逐字符估算 vs 首次批量编码 vs 缓存命中"""
+    print("\n" + "=" * 60)
+    print("⚡ 测试计数速度（400条消息的对话历史）")
+    print("=" * 60)
+
+    try:
+        messages = build_history(turns=200)
+        token_counter.clear_cache()
+        get_encoding()  # 编码加载不计入耗时
+
+        start = time.perf_counter()
+        heuristic_total = sum(heuristic_count_tokens(m.content) for m in messages)
+        heuristic_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        cold_total = count_message_tokens(messages)
+        cold_time = time.perf_counter() - start
+
+        # 多轮对话中每轮都会重新统计整个历史，第二次起全部命中缓存
+        start = time.perf_counter()
+        warm_total = count_message_tokens(messages)
+        warm_time = time.perf_counter() - start
+
+        print(f"\n旧估算:      {heuristic_time * 1000:8.2f} ms  ({heuristic_total} tokens, 估算)")
+        print(f"批量编码:    {cold_time * 1000:8.2f} ms  ({cold_total} tokens)")
+        print(f"缓存命中:    {warm_time * 1000:8.2f} ms  ({warm_total} tokens)")
+        print(f"缓存统计:    {token_counter.cache_stats()}")
+
+        if warm_total != cold_total:
+            print("❌ 缓存结果与首次计数不一致")
+            return False
+        if warm_time >= heuristic_time:
+            print("❌ 缓存命中后仍不快于旧的逐字符估算")
+            return False
+
+        print(f"\n✅ 速度测试通过！缓存命中比旧估算快 {heuristic_time / warm_time:.1f} 倍")
+        return True
+
+    except Exception as e:
+        print(f"❌ 速度测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """主函数"""
+    print("\n🔢 Token计数模块 - 测试工具\n")
+
+    if not test_accuracy():
+        return
+
+    if not test_speed():
+        return
+
+    print("\n" + "=" * 60)
+    print("🎉 所有测试通过！")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
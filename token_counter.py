@@ -0,0 +1,85 @@
+"""
+Token计数 - 使用目标模型的BPE分词器（tiktoken），批量编码并按文本缓存计数
+对话历史、上下文打包和记忆实验共用，同一条消息在多轮对话中只编码一次
+"""
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+import tiktoken
+from langchain_core.messages import BaseMessage
+from config import Config
+from metrics import record_cache
+
+
+# 计数缓存容量（条），按最近使用淘汰
+CACHE_SIZE = 10000
+
+_cache: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+# 获取模型对应的编码（未知模型回退到通用编码） Args:model_name: 模型名称，默认Config.OPENAI_MODEL Returns:tiktoken编码
+@lru_cache(maxsize=None)
+def get_encoding(model_name: str = None) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model_name or Config.OPENAI_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+# 批量统计Token数，未缓存的文本一次性批量编码 Args:texts: 文本列表 model_name: 模型名称 Returns:与texts对应的Token数
+def count_tokens_batch(texts: List[str], model_name: str = None) -> List[int]:
+    encoding = get_encoding(model_name)
+    keys = [(encoding.name, text) for text in texts]
+    counts = {}
+
+    with _cache_lock:
+        for key in keys:
+            if key in _cache:
+                _cache.move_to_end(key)
+                counts[key] = _cache[key]
+        _stats["hits"] += len(counts)
+
+    missing = list(dict.fromkeys(text for name, text in keys if (name, text) not in counts))
+    record_cache("token_count", hits=len(keys) - len(missing), misses=len(missing))
+    if missing:
+        # encode_batch 在tiktoken内部用线程池并行编码
+        encoded = encoding.encode_batch(missing, disallowed_special=())
+        with _cache_lock:
+            _stats["misses"] += len(missing)
+            for text, tokens in zip(missing, encoded):
+                key = (encoding.name, text)
+                _cache[key] = counts[key] = len(tokens)
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+
+    return [counts[key] for key in keys]
+
+
+# 统计单个文本的Token数 Args:text: 文本 model_name: 模型名称 Returns:Token数
+def count_tokens(text: str, model_name: str = None) -> int:
+    if not text:
+        return 0
+    return count_tokens_batch([text], model_name)[0]
+
+
+# 统计消息列表内容的总Token数 Args:messages: 消息列表 model_name: 模型名称 Returns:Token数
+def count_message_tokens(messages: Iterable[BaseMessage], model_name: str = None) -> int:
+    contents = [message.content for message in messages if message.content]
+    return sum(count_tokens_batch(contents, model_name)) if contents else 0
+
+
+# 缓存命中统计 Returns:命中数、未命中数、缓存条数
+def cache_stats() -> dict:
+    with _cache_lock:
+        return {**_stats, "size": len(_cache)}
+
+
+# 清空计数缓存（测试用）
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+        _stats["hits"] = 0
+        _stats["misses"] = 0
@@ -0,0 +1,215 @@
+"""
+分阶段耗时追踪 - 记录RAG请求各阶段（查询向量化、向量搜索、提示词构建、首Token、生成）的耗时
+TRACING=off 时所有span都是空操作；jsonl/otel 模式下每个请求写一行记录到 TRACE_EXPORT_PATH
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+from config import Config
+
+
+# 支持的模式：off（空操作）、memory（只在响应中返回耗时）、jsonl、otel（OTLP JSON格式）
+TRACING_MODES = ("off", "memory", "jsonl", "otel")
+
+# 当前线程（或协程）正在记录的追踪
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+_NOOP = nullcontext()
+
+
+def _new_id(length: int) -> str:
+    return uuid.uuid4().hex[:length]
+
+
+class Trace:
+    """一次请求的追踪：根span加若干阶段span，时间用纳秒记录"""
+
+    def __init__(self, name: str, attributes: Dict[str, Any] = None):
+        self.name = name
+        self.trace_id = _new_id(32)
+        self.span_id = _new_id(16)
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self._start_perf = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+        self.spans: List[Dict[str, Any]] = []
+
+    # 墙钟时间起点 + 单调时钟偏移，避免系统时间调整造成负耗时
+    def _now_ns(self) -> int:
+        return self.start_ns + (time.perf_counter_ns() - self._start_perf)
+
+    # 记录一个阶段span（同名阶段可以出现多次，汇总时累加）
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Dict[str, Any]]:
+        start = self._now_ns()
+        try:
+            yield attributes
+        finally:
+            self.record(name, start, self._now_ns(), attributes)
+
+    # 直接写入已经测好起止时间的span（用于跨yield的流式阶段）
+    def record(self, name: str, start_ns: int, end_ns: int, attributes: Dict[str, Any] = None):
+        self.spans.append({
+            "name": name,
+            "span_id": _new_id(16),
+            "start_ns": start_ns,
+            "end_ns": end_ns,
+            "attributes": attributes or {},
+        })
+
+    def now_ns(self) -> int:
+        return self._now_ns()
+
+    def finish(self):
+        if self.end_ns is None:
+            self.end_ns = self._now_ns()
+
+    # 各阶段耗时（毫秒），最后一项为总耗时 Returns:{阶段名: 毫秒}
+    def breakdown(self) -> Dict[str, float]:
+        timings: Dict[str, float] = {}
+        for span in self.spans:
+            timings[span["name"]] = timings.get(span["name"], 0.0) + (span["end_ns"] - span["start_ns"]) / 1e6
+        end_ns = self.end_ns if self.end_ns is not None else self._now_ns()
+        timings["total"] = (end_ns - self.start_ns) / 1e6
+        return {name: round(ms, 3) for name, ms in timings.items()}
+
+    # 扁平JSON记录（一行一个请求）
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start_time": self.start_ns / 1e9,
+            "duration_ms": self.breakdown()["total"],
+            "attributes": self.attributes,
+            "spans": [
+                {
+                    "name": span["name"],
+                    "span_id": span["span_id"],
+                    "start_time": span["start_ns"] / 1e9,
+                    "duration_ms": round((span["end_ns"] - span["start_ns"]) / 1e6, 3),
+                    "attributes": span["attributes"],
+                }
+                for span in self.spans
+            ],
+        }
+
+    # OTLP JSON格式（可被OpenTelemetry Collector的otlpjsonfile接收器读取）
+    def to_otlp(self) -> Dict[str, Any]:
+        def otlp_span(span_id, parent_id, name, start_ns, end_ns, attributes):
+            span = {
+                "traceId": self.trace_id,
+                "spanId": span_id,
+                "name": name,
+                "kind": 1,
+                "startTimeUnixNano": str(start_ns),
+                "endTimeUnixNano": str(end_ns),
+                "attributes": [_otlp_attribute(key, value) for key, value in attributes.items()],
+            }
+            if parent_id:
+                span["parentSpanId"] = parent_id
+            return span
+
+        spans = [otlp_span(self.span_id, None, self.name, self.start_ns, self.end_ns or self._now_ns(), self.attributes)]
+        spans += [
+            otlp_span(span["span_id"], self.span_id, span["name"], span["start_ns"], span["end_ns"], span["attributes"])
+            for span in self.spans
+        ]
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", "dc-llm-base")]},
+                "scopeSpans": [{"scope": {"name": "rag"}, "spans": spans}],
+            }]
+        }
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Tracer:
+    """按配置创建追踪并在结束时导出"""
+
+    # 初始化 mode: 追踪模式，默认Config.TRACING export_path: 导出文件路径
+    def __init__(self, mode: str = None, export_path: str = None):
+        self.mode = (mode or Config.TRACING).lower()
+        if self.mode not in TRACING_MODES:
+            raise ValueError(f"不支持的追踪模式: {self.mode}（可选 {', '.join(TRACING_MODES)}）")
+        self.export_path = export_path or Config.TRACE_EXPORT_PATH
+        self._write_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    # 开始一次请求的追踪（off模式返回None）
+    def start_trace(self, name: str, **attributes) -> Optional[Trace]:
+        return Trace(name, attributes) if self.enabled else None
+
+    # 结束追踪并按模式导出 Returns:阶段耗时（off模式为空字典）
+    def end_trace(self, trace: Optional[Trace]) -> Dict[str, float]:
+        if trace is None:
+            return {}
+        trace.finish()
+        if self.mode == "jsonl":
+            self._write(trace.to_json())
+        elif self.mode == "otel":
+            self._write(trace.to_otlp())
+        return trace.breakdown()
+
+    def _write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False)
+        try:
+            with self._write_lock:
+                directory = os.path.dirname(self.export_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.export_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            # 导出失败不影响请求本身
+            print(f"追踪导出失败: {e}")
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+# 获取进程内共享的追踪器
+def get_tracer() -> Tracer:
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer()
+    return _tracer
+
+
+# 把追踪设为当前上下文，期间的span()都记录到它上面（trace为None时什么也不做）
+@contextmanager
+def activate(trace: Optional[Trace]):
+    if trace is None:
+        yield None
+        return
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+# 在当前追踪上记录一个阶段，没有活动追踪时是空操作 Args:name: 阶段名 attributes: 附加属性
+def span(name: str, **attributes):
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP
+    return trace.span(name, **attributes)
@@ -1,11 +1,44 @@
+import math
 import os
-from typing import List, Optional
+import time
+import uuid
+from collections import Counter
+from typing import Any, List, Optional, Tuple
+import numpy as np
 from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS, Chroma
+from langchain_core.retrievers import BaseRetriever
 from langchain_core.vectorstores import VectorStore
 from config import Config
+from resource_registry import get_embeddings
+from tracing import span
+from metrics import INDEX_DOCUMENTS, VECTOR_SEARCH_SECONDS
+
+
+# 距离换算为0~1的相关性分数，与LangChain VectorStore中同名距离策略的换算公式一致
+def euclidean_relevance(distance: float) -> float:
+    return 1.0 - distance / math.sqrt(2)
+
+
+def cosine_relevance(distance: float) -> float:
+    return 1.0 - distance
+
+
+def max_inner_product_relevance(distance: float) -> float:
+    return 1.0 - distance if distance > 0 else -1.0 * distance
+
+
+RELEVANCE_FUNCTIONS = {
+    "euclidean_distance": euclidean_relevance,
+    "l2": euclidean_relevance,
+    "cosine": cosine_relevance,
+    "max_inner_product": max_inner_product_relevance,
+    "ip": max_inner_product_relevance,
+}
+
+# 本项目创建的Chroma集合使用默认的l2距离（未设置 hnsw:space）
+CHROMA_DISTANCE = "l2"
+# LangChain Chroma的默认集合名，按向量建库和加载时使用同一个集合
+CHROMA_COLLECTION = "langchain"
 
 # 创建，保存，加载
 class VectorStoreManager:    
@@ -20,24 +53,16 @@ class VectorStoreManager:
         self.persist_directory = persist_directory or Config.VECTOR_STORE_PATH
         self.embedding_model = embedding_model or Config.EMBEDDING_MODEL
         
-        # 初始化Embeddings - 支持本地和远程
-        if Config.USE_LOCAL_EMBEDDING:
-            print(f"使用本地 Embedding 模型: {Config.LOCAL_EMBEDDING_MODEL}")
-            print(f"使用设备: {Config.EMBEDDING_DEVICE}")
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name=Config.LOCAL_EMBEDDING_MODEL,
-                model_kwargs={'device': Config.EMBEDDING_DEVICE},
-                encode_kwargs={'normalize_embeddings': True}
-            )
-        else:
-            print(f"使用远程 Embedding 模型: {self.embedding_model}")
-            self.embeddings = OpenAIEmbeddings(
-                model=self.embedding_model,
-                openai_api_key=Config.OPENAI_API_KEY,
-                openai_api_base=Config.OPENAI_API_BASE
-            )
+        # 初始化Embeddings - 支持本地和远程，同一进程内共享已加载的模型
+        self.embeddings = get_embeddings(self.embedding_model)
         
         self.vector_store: Optional[VectorStore] = None
+        
+        # 自适应检索的k分布统计，用于调参
+        self.k_distribution: Counter = Counter()
+        
+        # 领域中心向量（建索引时计算），用于领域外问题判断
+        self.domain_centroid: Optional[np.ndarray] = None
     
     # 创建向量存储 Args:documents: 文档列表 Returns:向量存储对象
     def create_vector_store(self, documents: List[Document]) -> VectorStore:
@@ -45,11 +70,13 @@ class VectorStoreManager:
         print(f"正在创建 {self.store_type} 向量存储...")
         
         if self.store_type.lower() == "faiss":
+            from langchain_community.vectorstores import FAISS
             self.vector_store = FAISS.from_documents(
                 documents=documents,
                 embedding=self.embeddings
             )
         elif self.store_type.lower() == "chroma":
+            from langchain_community.vectorstores import Chroma
             self.vector_store = Chroma.from_documents(
                 documents=documents,
                 embedding=self.embeddings,
@@ -59,8 +86,70 @@ class VectorStoreManager:
             raise ValueError(f"不支持的向量存储类型: {self.store_type}")
         
         print(f"向量存储创建完成，包含 {len(documents)} 个文档")
+        self.compute_domain_centroid()
+        return self.vector_store
+    
+    # 用已计算好的向量创建向量存储（避免重复向量化） Args:documents: 文档列表 vectors: 对应的向量 compute_centroid: 是否随后计算领域中心向量（基准测试关闭以单独计时） Returns:向量存储对象
+    def create_vector_store_from_embeddings(self, documents: List[Document], vectors: List[List[float]],
+                                            compute_centroid: bool = True) -> VectorStore:
+        if self.store_type.lower() == "faiss":
+            from langchain_community.vectorstores import FAISS
+            self.vector_store = FAISS.from_embeddings(
+                text_embeddings=list(zip([doc.page_content for doc in documents], vectors)),
+                embedding=self.embeddings,
+                metadatas=[doc.metadata for doc in documents]
+            )
+        elif self.store_type.lower() == "chroma":
+            self.vector_store = self._chroma_from_embeddings(documents, vectors)
+        else:
+            raise ValueError(f"不支持的向量存储类型: {self.store_type}")
+        
+        print(f"向量存储创建完成，包含 {len(documents)} 个文档")
+        if compute_centroid:
+            self.compute_domain_centroid()
         return self.vector_store
     
+    # LangChain的Chroma封装只接受文本，这里通过chromadb客户端的公开接口直接写入向量，再用同一集合构造Chroma
+    def _chroma_from_embeddings(self, documents: List[Document], vectors: List[List[float]]) -> VectorStore:
+        import chromadb
+        from langchain_community.vectorstores import Chroma
+        
+        client = chromadb.PersistentClient(path=self.persist_directory)
+        collection = client.get_or_create_collection(CHROMA_COLLECTION)
+        batch_size = client.get_max_batch_size()
+        ids = [str(uuid.uuid4()) for _ in documents]
+        for start in range(0, len(documents), batch_size):
+            end = start + batch_size
+            collection.add(
+                ids=ids[start:end],
+                embeddings=[list(map(float, vector)) for vector in vectors[start:end]],
+                documents=[doc.page_content for doc in documents[start:end]],
+                metadatas=[doc.metadata for doc in documents[start:end]]
+            )
+        
+        return Chroma(client=client, collection_name=CHROMA_COLLECTION, embedding_function=self.embeddings)
+    
+    # 计算领域中心向量：所有文档向量的归一化均值 Returns:中心向量
+    def compute_domain_centroid(self) -> Optional[np.ndarray]:
+        if not self.vector_store:
+            raise ValueError("向量存储未初始化")
+        
+        if self.store_type.lower() == "faiss":
+            index = self.vector_store.index
+            vectors = index.reconstruct_n(0, index.ntotal)
+        elif self.store_type.lower() == "chroma":
+            vectors = self.vector_store.get(include=["embeddings"])["embeddings"]
+        else:
+            raise ValueError(f"不支持的向量存储类型: {self.store_type}")
+        
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) == 0:
+            return None
+        
+        centroid = vectors.mean(axis=0)
+        self.domain_centroid = centroid / np.linalg.norm(centroid)
+        return self.domain_centroid
+    
     # 保存向量存储到磁盘
     def save_vector_store(self):
         if not self.vector_store:
@@ -68,6 +157,9 @@ class VectorStoreManager:
         
         os.makedirs(self.persist_directory, exist_ok=True)
         
+        if self.domain_centroid is not None:
+            np.save(os.path.join(self.persist_directory, "domain_centroid.npy"), self.domain_centroid)
+        
         if self.store_type.lower() == "faiss":
             save_path = os.path.join(self.persist_directory, "faiss_index")
             self.vector_store.save_local(save_path)
@@ -75,12 +167,44 @@ class VectorStoreManager:
         elif self.store_type.lower() == "chroma":
             # Chroma会自动持久化
             print(f"Chroma向量存储已保存到: {self.persist_directory}")
+        self._record_index_size()
+    
+    # 索引中的文档块数
+    def index_size(self) -> int:
+        if not self.vector_store:
+            return 0
+        if self.store_type.lower() == "faiss":
+            return self.vector_store.index.ntotal
+        return len(self.vector_store.get(include=[])["ids"])
+    
+    # 更新索引大小指标（只统计保存/加载的正式索引，实验中的临时索引不计入）
+    def _record_index_size(self):
+        INDEX_DOCUMENTS.set(self.index_size(), store=self.store_type.lower())
+    
+    # 检查索引维度与共享Embedding服务的向量维度一致（本进程加载的模型在首次检索时才会暴露维度错误）
+    def _check_embedding_dimension(self):
+        expected = getattr(self.embeddings, "dimension", None)
+        if expected is None:
+            return
+        if self.store_type.lower() == "faiss":
+            actual = self.vector_store.index.d
+        elif self.domain_centroid is not None:
+            actual = len(self.domain_centroid)
+        else:
+            return
+        if actual != expected:
+            raise ValueError(f"索引向量维度为 {actual}，Embedding服务的向量维度为 {expected}，请使用建索引时的模型或重建索引")
     
     # 从磁盘加载向量存储 Returns:向量存储对象，如果不存在则返回None
     def load_vector_store(self) -> Optional[VectorStore]:
+        centroid_path = os.path.join(self.persist_directory, "domain_centroid.npy")
+        if os.path.exists(centroid_path):
+            self.domain_centroid = np.load(centroid_path)
+        
         if self.store_type.lower() == "faiss":
             save_path = os.path.join(self.persist_directory, "faiss_index")
             if os.path.exists(save_path):
+                from langchain_community.vectorstores import FAISS
                 print(f"正在加载FAISS向量存储从: {save_path}")
                 self.vector_store = FAISS.load_local(
                     save_path, 
@@ -88,33 +212,154 @@ class VectorStoreManager:
                     allow_dangerous_deserialization=True
                 )
                 print("FAISS向量存储加载完成")
+                self._check_embedding_dimension()
+                self._record_index_size()
                 return self.vector_store
         elif self.store_type.lower() == "chroma":
             if os.path.exists(self.persist_directory):
+                from langchain_community.vectorstores import Chroma
                 print(f"正在加载Chroma向量存储从: {self.persist_directory}")
                 self.vector_store = Chroma(
                     persist_directory=self.persist_directory,
                     embedding_function=self.embeddings
                 )
                 print("Chroma向量存储加载完成")
+                self._check_embedding_dimension()
+                self._record_index_size()
                 return self.vector_store
         
         print("未找到已保存的向量存储")
         return None
     
-    # 相似度搜索 Args:query: 查询文本 k: 返回文档数量 Returns:相关文档列表
-    def similarity_search(self, query: str, k: int = None) -> List[Document]:
+    # 相似度搜索 Args:query: 查询文本 k: 返回文档数量 adaptive: 是否使用自适应k Returns:相关文档列表
+    def similarity_search(self, query: str, k: int = None, adaptive: bool = None) -> List[Document]:
         if not self.vector_store:
             raise ValueError("向量存储未初始化")
         
         k = k or Config.RETRIEVAL_K
+        adaptive = Config.ADAPTIVE_RETRIEVAL if adaptive is None else adaptive
+        if adaptive:
+            return self.adaptive_search(query, max_k=k)
+        
+        start = time.perf_counter()
         results = self.vector_store.similarity_search(query, k=k)
+        VECTOR_SEARCH_SECONDS.observe(time.perf_counter() - start, store=self.store_type.lower())
+        return results
+    
+    # 带相关性分数的相似度搜索 Args:query: 查询文本 k: 返回文档数量 Returns:(文档, 相关性分数)列表，按分数降序
+    def similarity_search_with_scores(self, query: str, k: int = None) -> List[Tuple[Document, float]]:
+        if not self.vector_store:
+            raise ValueError("向量存储未初始化")
+        
+        k = k or Config.RETRIEVAL_K
+        start = time.perf_counter()
+        results = self.vector_store.similarity_search_with_relevance_scores(query, k=k)
+        VECTOR_SEARCH_SECONDS.observe(time.perf_counter() - start, store=self.store_type.lower())
+        return results
+    
+    # 用已有的查询向量做带相关性分数的搜索 Args:embedding: 查询向量 k: 返回文档数量 Returns:(文档, 相关性分数)列表
+    def similarity_search_with_scores_by_vector(self, embedding: List[float], k: int = None) -> List[Tuple[Document, float]]:
+        if not self.vector_store:
+            raise ValueError("向量存储未初始化")
+        
+        relevance_fn = self._relevance_fn()
+        k = k or Config.RETRIEVAL_K
+        start = time.perf_counter()
+        # 只使用公开接口：索引搜索和取回文档在同一次调用中完成，两者合并计为vector_search
+        with span("vector_search", k=k):
+            if self.store_type.lower() == "faiss":
+                results = self.vector_store.similarity_search_with_score_by_vector(embedding, k=k)
+            elif self.store_type.lower() == "chroma":
+                # 方法名虽然带relevance_scores，返回的仍是距离
+                results = self.vector_store.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+            else:
+                raise ValueError(f"不支持的向量存储类型: {self.store_type}")
+        VECTOR_SEARCH_SECONDS.observe(time.perf_counter() - start, store=self.store_type.lower())
+        
+        # 距离换算为与similarity_search_with_scores一致的相关性分数
+        return [(doc, relevance_fn(float(score))) for doc, score in results]
+    
+    # 当前索引的距离换算函数（FAISS读取公开的distance_strategy，Chroma使用建库时的默认距离）
+    def _relevance_fn(self):
+        if self.store_type.lower() == "faiss":
+            strategy = self.vector_store.distance_strategy
+            strategy = getattr(strategy, "value", strategy)
+        else:
+            strategy = CHROMA_DISTANCE
+        
+        relevance_fn = RELEVANCE_FUNCTIONS.get(str(strategy).lower())
+        if relevance_fn is None:
+            raise ValueError(f"不支持的距离策略: {strategy}")
+        return relevance_fn
+    
+    # 自适应k检索：按分数下限或相对落差截断 Args:query: 查询文本 min_k/max_k: 返回数量上下限 score_threshold: 绝对分数下限 score_drop: 相对最高分的最大落差比例 embedding: 已有的查询向量（避免重复向量化） Returns:相关文档列表
+    def adaptive_search(self,
+                        query: str,
+                        min_k: int = None,
+                        max_k: int = None,
+                        score_threshold: float = None,
+                        score_drop: float = None,
+                        embedding: List[float] = None) -> List[Document]:
+        min_k = min_k or Config.ADAPTIVE_MIN_K
+        max_k = max(max_k or Config.RETRIEVAL_K, min_k)
+        score_threshold = Config.ADAPTIVE_SCORE_THRESHOLD if score_threshold is None else score_threshold
+        score_drop = Config.ADAPTIVE_SCORE_DROP if score_drop is None else score_drop
+        
+        if embedding is not None:
+            scored_docs = self.similarity_search_with_scores_by_vector(embedding, k=max_k)
+        else:
+            scored_docs = self.similarity_search_with_scores(query, k=max_k)
+        if not scored_docs:
+            self.k_distribution[0] += 1
+            return []
+        
+        top_score = scored_docs[0][1]
+        results = []
+        for doc, score in scored_docs:
+            # 下限以内的文档无条件保留，之后遇到低分或明显落差即停止
+            if len(results) >= min_k:
+                if score < score_threshold or score < top_score * (1 - score_drop):
+                    break
+            
+            # 复制文档再写入分数，避免修改向量库中的原始文档
+            results.append(Document(
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "relevance_score": score}
+            ))
+        
+        self.k_distribution[len(results)] += 1
+        print(f"自适应检索: k={len(results)} (最高分 {top_score:.3f})")
         return results
     
-    # 获取检索器 Args:k: 返回文档数量 Returns:检索器对象
-    def get_retriever(self, k: int = None):
+    # 打印自适应检索的k分布
+    def log_k_distribution(self):
+        total = sum(self.k_distribution.values())
+        if not total:
+            print("暂无自适应检索记录")
+            return
+        
+        print(f"自适应检索k分布（共 {total} 次查询）:")
+        for k in sorted(self.k_distribution):
+            count = self.k_distribution[k]
+            print(f"  k={k}: {count} 次 ({count / total:.1%})")
+    
+    # 获取检索器 Args:k: 返回文档数量（自适应模式下为上限） adaptive: 是否使用自适应k Returns:检索器对象
+    def get_retriever(self, k: int = None, adaptive: bool = None):
         if not self.vector_store:
             raise ValueError("向量存储未初始化")
         
         k = k or Config.RETRIEVAL_K
+        adaptive = Config.ADAPTIVE_RETRIEVAL if adaptive is None else adaptive
+        if adaptive:
+            return AdaptiveRetriever(vector_store_manager=self, max_k=k)
+        
         return self.vector_store.as_retriever(search_kwargs={"k": k})
+
+
+# 自适应k检索器：包装VectorStoreManager.adaptive_search，可直接替换普通检索器
+class AdaptiveRetriever(BaseRetriever):
+    vector_store_manager: Any
+    max_k: int
+    
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        return self.vector_store_manager.adaptive_search(query, max_k=self.max_k)
@@ -0,0 +1,87 @@
+"""
+启动预热 - 应用启动时在后台线程加载索引和Embedding模型、跑几次假查询（分词器初始化、首次推理），
+可选预先建立LLM连接，使部署后的第一个问题与稳定状态的延迟一致
+"""
+import threading
+import time
+from typing import Any, Dict
+from config import Config
+
+
+# 预热用的查询（覆盖中英文，触发分词器和不同长度输入的首次推理）
+WARMUP_QUERIES = [
+    "如何通过中央显示屏进行副驾驶员座椅设置？",
+    "电池容量是多少？",
+    "How do I open the tailgate?",
+]
+
+_lock = threading.Lock()
+_thread = None
+_status: Dict[str, Any] = {"state": "idle", "step": "", "seconds": 0.0, "error": None}
+
+
+def _set_status(**kwargs):
+    with _lock:
+        _status.update(kwargs)
+
+
+def _run(include_llm: bool):
+    start = time.perf_counter()
+    try:
+        # 延迟导入：调用方（Streamlit主页）本身不需要加载这些模块
+        from resource_registry import get_vector_store_manager
+        from token_counter import count_tokens_batch
+
+        _set_status(step="加载索引和Embedding模型")
+        vector_store_manager = get_vector_store_manager()
+        if vector_store_manager is None:
+            raise RuntimeError("未找到向量存储，请先运行: python init_kb.py")
+
+        _set_status(step="初始化分词器")
+        count_tokens_batch(WARMUP_QUERIES)
+
+        _set_status(step="预热查询")
+        for query in WARMUP_QUERIES:
+            embedding = vector_store_manager.embeddings.embed_query(query)
+            vector_store_manager.similarity_search_with_scores_by_vector(embedding, k=Config.RETRIEVAL_K)
+
+        if include_llm:
+            from llm_factory import get_chat_model, warm_connection
+            _set_status(step="建立LLM连接")
+            get_chat_model()
+            warm_connection()
+
+        _set_status(state="ready", step="", seconds=time.perf_counter() - start)
+        print(f"🔥 预热完成，用时 {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        _set_status(state="failed", seconds=time.perf_counter() - start, error=str(e))
+        print(f"预热失败: {e}")
+
+
+# 在后台线程启动预热（每个进程只启动一次，Streamlit重新运行脚本时不会重复） Args:include_llm: 是否预先建立LLM连接，默认Config.WARMUP_LLM
+def start_warmup(include_llm: bool = None):
+    global _thread
+    if not Config.WARMUP:
+        return
+
+    include_llm = Config.WARMUP_LLM if include_llm is None else include_llm
+    with _lock:
+        if _thread is not None:
+            return
+        _status.update(state="running", step="启动中")
+        _thread = threading.Thread(target=_run, args=(include_llm,), name="warmup", daemon=True)
+        _thread.start()
+
+
+# 预热状态 Returns:state（idle/running/ready/failed）、当前步骤、耗时、错误信息
+def warmup_status() -> Dict[str, Any]:
+    with _lock:
+        return dict(_status)
+
+
+# 等待预热完成 Args:timeout: 最长等待秒数 Returns:是否已就绪
+def wait_until_ready(timeout: float = None) -> bool:
+    thread = _thread
+    if thread is not None:
+        thread.join(timeout)
+    return warmup_status()["state"] == "ready"
@@ -0,0 +1,62 @@
+"""
+预热状态组件 - app.py 和 app_gemini.py（及实验页面）共用的侧边栏预热状态徽章
+预热进行中时用轮询片段自动刷新，结束后不再轮询
+"""
+import streamlit as st
+from warmup import warmup_status
+
+
+# 徽章样式（app_gemini.py 的页面样式中已有同名类，app.py 依赖这里注入）
+BADGE_CSS = """
+<style>
+    .status-badge {
+        display: inline-block;
+        padding: 0.25rem 0.75rem;
+        border-radius: 12px;
+        font-size: 0.8rem;
+        font-weight: 500;
+    }
+    .status-success {
+        background-color: rgba(46, 160, 67, 0.2);
+        color: #3fb950;
+    }
+    .status-warning {
+        background-color: rgba(187, 128, 9, 0.2);
+        color: #d29922;
+    }
+    .status-info {
+        background-color: rgba(56, 139, 253, 0.2);
+        color: #58a6ff;
+    }
+</style>
+"""
+
+
+def warmup_badge(status):
+    """预热状态徽章HTML"""
+    if status["state"] == "ready":
+        return f'<span class="status-badge status-success">🟢 已就绪（预热 {status["seconds"]:.1f}s）</span>'
+    if status["state"] == "running":
+        return f'<span class="status-badge status-warning">🟡 预热中：{status["step"]}</span>'
+    if status["state"] == "failed":
+        return f'<span class="status-badge status-warning">🔴 预热失败：{status["error"]}</span>'
+    return '<span class="status-badge status-info">⚪ 未预热（首次提问时加载）</span>'
+
+
+@st.fragment(run_every=2)
+def poll_warmup_status():
+    """预热进行中时每2秒刷新，结束后整页重新运行一次，之后不再轮询"""
+    status = warmup_status()
+    if status["state"] != "running":
+        st.rerun()
+    st.markdown(warmup_badge(status), unsafe_allow_html=True)
+
+
+def display_warmup_status():
+    """预热状态（只在预热进行中时使用轮询片段）"""
+    st.markdown(BADGE_CSS, unsafe_allow_html=True)
+    status = warmup_status()
+    if status["state"] == "running":
+        poll_warmup_status()
+    else:
+        st.markdown(warmup_badge(status), unsafe_allow_html=True)